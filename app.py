@@ -21,6 +21,11 @@ from components.functions import (
 from components.gestao_recebimentos import *
 from components.importacao import *
 from components.contas import *
+from components.transacao import recuperar_transacoes
+from components.esquemas import migracao_pendente as migracao_esquemas_pendente
+from components.particoes import pendentes as particoes_pendentes
+from components.wal import recuperar as recuperar_wal
+from components.tarefas import podar as podar_tarefas
 from modules import (
     prestacao_servicos,
     recebimentos,
@@ -30,7 +35,21 @@ from modules import (
     edicao,
     configuracoes)
 
-inicializar_movimentacao_contas()
+@st.cache_resource(show_spinner=False)
+def inicializar_dados():
+    """Recuperação dos dados: uma vez por processo do servidor, não a cada rerun."""
+    recuperar_transacoes()
+    # As migrações regravam os pickles versionados em data/: são passos explícitos
+    if particoes_pendentes():
+        print("Tabelas ainda em pickle único; para particionar: python -m components.particoes --migrar")
+    if migracao_esquemas_pendente():
+        print("Arquivos no formato antigo; para compactar: python -m components.esquemas --migrar")
+    recuperar_wal()
+    podar_tarefas()
+    inicializar_movimentacao_contas()
+    return True
+
+inicializar_dados()
 
 # Configuração da página
 st.set_page_config(
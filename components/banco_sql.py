@@ -0,0 +1,380 @@
+"""
+Backend SQLite opcional para os recebimentos pendentes e as transações de cartão.
+
+Com SANTASAUDE_BACKEND=sqlite as tabelas abaixo deixam de ser pickles e passam a
+ser tabelas em data/santasaude.db, com índices em id_pendencia, id_unico,
+status, data_operacao e indice_arquivo. O restante do sistema continua usando
+os mesmos caminhos 'data/*.pkl' através de components.repositorio, e as baixas
+viram UPDATEs pontuais (ver Transacao.atualizar) em vez de ler e regravar a
+tabela inteira.
+
+Migração dos pickles existentes:
+    SANTASAUDE_BACKEND=sqlite python -m components.banco_sql --migrar
+"""
+import os
+import sys
+import json
+import sqlite3
+import threading
+from datetime import datetime, date
+import numpy as np
+import pandas as pd
+from components import esquemas
+
+CAMINHO_BANCO = 'data/santasaude.db'
+
+# 'pickle' (padrão) ou 'sqlite'
+BACKEND = os.environ.get('SANTASAUDE_BACKEND', 'pickle').strip().lower()
+
+# Caminho lógico (usado pelo resto do sistema) -> tabela no banco
+TABELAS = {
+    'data/recebimentos_pendentes.pkl': 'recebimentos_pendentes',
+    'data/credito_mulvi.pkl': 'credito_mulvi',
+    'data/credito_getnet.pkl': 'credito_getnet',
+}
+
+COLUNAS_INDEXADAS = ['id_pendencia', 'id_unico', 'status', 'data_operacao', 'indice_arquivo']
+
+# Coluna que guarda o rótulo do índice do DataFrame (índice original do arquivo)
+COLUNA_INDICE = '_indice'
+
+# Limite de parâmetros por comando (SQLite antigo aceita no máximo 999)
+TAMANHO_LOTE = 500
+
+_local = threading.local()
+_cache = {}   # tabela -> (versao, DataFrame)
+_trava_cache = threading.Lock()
+
+
+def ativo():
+    return BACKEND == 'sqlite'
+
+
+def _tabela(caminho):
+    alvo = os.path.abspath(caminho)
+    for logico, tabela in TABELAS.items():
+        if os.path.abspath(logico) == alvo:
+            return tabela
+    return None
+
+
+def gerencia(caminho):
+    """Indica se o caminho é armazenado no banco (backend ativo e tabela mapeada)."""
+    return ativo() and _tabela(caminho) is not None
+
+
+def _q(nome):
+    """Identificador entre aspas (as colunas do cartão têm espaços e acentos)."""
+    return '"' + str(nome).replace('"', '""') + '"'
+
+
+def conexao():
+    """Conexão da thread atual, em autocommit (as transações são explícitas)."""
+    con = getattr(_local, 'con', None)
+    if con is None:
+        os.makedirs(os.path.dirname(CAMINHO_BANCO) or '.', exist_ok=True)
+        con = sqlite3.connect(CAMINHO_BANCO, timeout=30, isolation_level=None, check_same_thread=False)
+        con.execute('PRAGMA journal_mode=WAL')
+        con.execute('PRAGMA synchronous=FULL')
+        con.execute('CREATE TABLE IF NOT EXISTS _metadados ('
+                    'tabela TEXT PRIMARY KEY, dtypes TEXT NOT NULL, versao INTEGER NOT NULL DEFAULT 0)')
+        con.execute('CREATE TABLE IF NOT EXISTS _transacoes ('
+                    'id TEXT PRIMARY KEY, pid INTEGER, entradas TEXT NOT NULL)')
+        _local.con = con
+    return con
+
+
+# ========== CONVERSÃO DE VALORES ==========
+
+def _valor_sql(v):
+    if v is None:
+        return None
+    if isinstance(v, (pd.Timestamp, datetime)):
+        return None if pd.isna(v) else v.isoformat(sep=' ')
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, (bool, np.bool_)):
+        return int(v)
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and np.isnan(v):
+        return None
+    if isinstance(v, (int, float, str, bytes)):
+        return v
+    try:
+        if pd.isna(v):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return str(v)
+
+
+def _tipo_sql(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return ''
+
+
+def _dtype_de_valor(v):
+    if isinstance(v, (pd.Timestamp, datetime, date)):
+        return 'datetime64[ns]'
+    if isinstance(v, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(v, (float, np.floating)):
+        return 'float64'
+    return 'object'
+
+
+def _restaurar_tipos(df, dtypes):
+    for coluna, dtype in dtypes.items():
+        if coluna not in df.columns:
+            continue
+        try:
+            if dtype.startswith('datetime64'):
+                df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
+            elif dtype == 'bool':
+                df[coluna] = df[coluna].fillna(0).astype(bool)
+            elif dtype.lower().startswith(('int', 'uint', 'float')):
+                df[coluna] = pd.to_numeric(df[coluna], errors='coerce').astype(dtype)
+            elif dtype == 'category':
+                df[coluna] = df[coluna].astype('category')
+        except (ValueError, TypeError):
+            # ex.: inteiro com nulos; fica como float
+            pass
+    return df
+
+
+# ========== METADADOS ==========
+
+def _metadados(con, tabela):
+    linha = con.execute('SELECT dtypes, versao FROM _metadados WHERE tabela = ?', (tabela,)).fetchone()
+    if linha is None:
+        return None, None
+    return json.loads(linha[0]), linha[1]
+
+
+def _colunas(con, tabela):
+    return [linha[1] for linha in con.execute(f'PRAGMA table_info({_q(tabela)})')]
+
+
+def _incrementar_versao(con, tabela):
+    con.execute('UPDATE _metadados SET versao = versao + 1 WHERE tabela = ?', (tabela,))
+
+
+def _criar_indices(con, tabela, colunas):
+    for coluna in [COLUNA_INDICE] + COLUNAS_INDEXADAS:
+        if coluna in colunas:
+            con.execute(f'CREATE INDEX IF NOT EXISTS {_q(f"ix_{tabela}_{coluna}")} '
+                        f'ON {_q(tabela)} ({_q(coluna)})')
+
+
+# ========== LEITURA ==========
+
+def existe(caminho):
+    tabela = _tabela(caminho)
+    return _metadados(conexao(), tabela)[0] is not None
+
+
+def ler(caminho):
+    """Lê a tabela inteira como DataFrame (com o índice original restaurado)."""
+    tabela = _tabela(caminho)
+    con = conexao()
+    dtypes, versao = _metadados(con, tabela)
+    if dtypes is None:
+        raise FileNotFoundError(caminho)
+
+    with _trava_cache:
+        item = _cache.get(tabela)
+        if item is not None and item[0] == versao:
+            return item[1].copy()
+
+    df = pd.read_sql_query(f'SELECT * FROM {_q(tabela)} ORDER BY rowid', con)
+    df = _como_dataframe_original(df, dtypes)
+    with _trava_cache:
+        _cache[tabela] = (versao, df)
+    return df.copy()
+
+
+def _como_dataframe_original(df, dtypes):
+    df = _restaurar_tipos(df, dtypes)
+    if COLUNA_INDICE in df.columns:
+        df = df.set_index(COLUNA_INDICE)
+        df.index.name = None
+    return df
+
+
+def selecionar(caminho, coluna, valores):
+    """
+    Retorna só as linhas em que coluna está em valores, usando o índice do banco.
+    coluna=None seleciona pelo rótulo do índice (índice original do arquivo).
+    """
+    tabela = _tabela(caminho)
+    con = conexao()
+    dtypes, _ = _metadados(con, tabela)
+    if dtypes is None:
+        raise FileNotFoundError(caminho)
+    coluna = COLUNA_INDICE if coluna is None else coluna
+    valores = [_valor_sql(v) for v in valores]
+    if coluna not in _colunas(con, tabela):
+        return _como_dataframe_original(pd.DataFrame(columns=_colunas(con, tabela)), dtypes)
+
+    partes = []
+    for i in range(0, len(valores), TAMANHO_LOTE):
+        lote = valores[i:i + TAMANHO_LOTE]
+        marcadores = ', '.join('?' * len(lote))
+        partes.append(pd.read_sql_query(
+            f'SELECT * FROM {_q(tabela)} WHERE {_q(coluna)} IN ({marcadores}) ORDER BY rowid', con, params=lote))
+    if not partes:
+        partes = [pd.DataFrame(columns=_colunas(con, tabela))]
+    return _como_dataframe_original(pd.concat(partes, ignore_index=True), dtypes)
+
+
+# ========== GRAVAÇÃO ==========
+# As funções com parâmetro `con` rodam dentro de uma transação aberta pelo
+# chamador (Transacao); sem ele abrem e confirmam a própria transação.
+
+def _em_transacao(funcao, con):
+    if con is not None:
+        return funcao(con)
+    con = conexao()
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        resultado = funcao(con)
+        con.execute('COMMIT')
+        return resultado
+    except Exception:
+        con.execute('ROLLBACK')
+        raise
+
+
+def gravar(df, caminho, con=None):
+    """Substitui a tabela inteira pelo DataFrame (importações, migração)."""
+    tabela = _tabela(caminho)
+
+    def _gravar(con):
+        dados = df.copy()
+        dados.insert(0, COLUNA_INDICE, df.index)
+        dados.columns = [str(c) for c in dados.columns]
+        dtypes = {c: str(dados[c].dtype) for c in dados.columns if c != COLUNA_INDICE}
+
+        con.execute(f'DROP TABLE IF EXISTS {_q(tabela)}')
+        definicao = ', '.join(f'{_q(c)} {_tipo_sql(dados[c].dtype)}'.strip() for c in dados.columns)
+        con.execute(f'CREATE TABLE {_q(tabela)} ({definicao})')
+        if len(dados):
+            colunas = [[_valor_sql(v) for v in dados[c].tolist()] for c in dados.columns]
+            marcadores = ', '.join('?' * len(dados.columns))
+            con.executemany(f'INSERT INTO {_q(tabela)} VALUES ({marcadores})', zip(*colunas))
+        _criar_indices(con, tabela, list(dados.columns))
+        con.execute('INSERT INTO _metadados (tabela, dtypes, versao) VALUES (?, ?, 1) '
+                    'ON CONFLICT(tabela) DO UPDATE SET dtypes = excluded.dtypes, versao = versao + 1',
+                    (tabela, json.dumps(dtypes)))
+
+    _em_transacao(_gravar, con)
+
+
+def atualizar(caminho, coluna, chaves, valores, padroes=None, con=None):
+    """
+    UPDATE pontual: define `valores` ({coluna: valor}) nas linhas em que
+    `coluna` (None = índice original) é uma das `chaves`.
+    Colunas inexistentes são criadas com o valor de `padroes` (ou nulo).
+
+    Returns:
+        int: linhas alteradas.
+    """
+    tabela = _tabela(caminho)
+    padroes = padroes or {}
+
+    def _atualizar(con):
+        dtypes, _ = _metadados(con, tabela)
+        if dtypes is None:
+            raise FileNotFoundError(caminho)
+        existentes = _colunas(con, tabela)
+        for nome, valor in valores.items():
+            if nome in existentes:
+                continue
+            padrao = padroes.get(nome)
+            if padrao is None:
+                con.execute(f'ALTER TABLE {_q(tabela)} ADD COLUMN {_q(nome)}')
+            else:
+                con.execute(f'ALTER TABLE {_q(tabela)} ADD COLUMN {_q(nome)} DEFAULT {_literal(padrao)}')
+            dtypes[nome] = _dtype_de_valor(valor if padrao is None else padrao)
+            con.execute('UPDATE _metadados SET dtypes = ? WHERE tabela = ?', (json.dumps(dtypes), tabela))
+            if nome in COLUNAS_INDEXADAS:
+                _criar_indices(con, tabela, [nome])
+
+        chave = COLUNA_INDICE if coluna is None else coluna
+        atribuicoes = ', '.join(f'{_q(c)} = ?' for c in valores)
+        parametros = [_valor_sql(v) for v in valores.values()]
+        cursor = con.executemany(
+            f'UPDATE {_q(tabela)} SET {atribuicoes} WHERE {_q(chave)} = ?',
+            [parametros + [_valor_sql(k)] for k in chaves])
+        _incrementar_versao(con, tabela)
+        return cursor.rowcount
+
+    return _em_transacao(_atualizar, con)
+
+
+def _literal(valor):
+    valor = _valor_sql(valor)
+    if isinstance(valor, str):
+        return "'" + valor.replace("'", "''") + "'"
+    return 'NULL' if valor is None else str(valor)
+
+
+def apagar(caminho, con=None):
+    tabela = _tabela(caminho)
+
+    def _apagar(con):
+        con.execute(f'DROP TABLE IF EXISTS {_q(tabela)}')
+        con.execute('DELETE FROM _metadados WHERE tabela = ?', (tabela,))
+
+    _em_transacao(_apagar, con)
+    with _trava_cache:
+        _cache.pop(tabela, None)
+
+
+# ========== DIÁRIO DAS TRANSAÇÕES MISTAS (BANCO + ARQUIVOS) ==========
+
+def registrar_diario(con, id_transacao, entradas):
+    con.execute('INSERT INTO _transacoes (id, pid, entradas) VALUES (?, ?, ?)',
+                (id_transacao, os.getpid(), json.dumps(entradas)))
+
+
+def concluir_diario(id_transacao):
+    conexao().execute('DELETE FROM _transacoes WHERE id = ?', (id_transacao,))
+
+
+def diarios_pendentes():
+    """[(id, pid, entradas)] das transações cujo commit no banco ocorreu mas os arquivos não."""
+    if not os.path.exists(CAMINHO_BANCO):
+        return []
+    linhas = conexao().execute('SELECT id, pid, entradas FROM _transacoes ORDER BY id').fetchall()
+    return [(i, pid, json.loads(e)) for i, pid, e in linhas]
+
+
+def migrar():
+    """Copia para o banco os pickles existentes das tabelas gerenciadas."""
+    from components import particoes
+
+    migradas = []
+    for caminho, tabela in TABELAS.items():
+        if existe(caminho):
+            continue
+        if os.path.exists(caminho):
+            # Pickles já migrados por components.esquemas estão em centavos/categorias
+            gravar(esquemas.expandir(pd.read_pickle(caminho)), caminho)
+            migradas.append(tabela)
+        elif caminho in particoes.TABELAS and particoes.existe(caminho):
+            gravar(particoes.ler(caminho), caminho)
+            migradas.append(tabela)
+    return migradas
+
+
+if __name__ == "__main__":
+    if '--migrar' in sys.argv:
+        tabelas = migrar()
+        print(f"✅ Tabelas migradas: {', '.join(tabelas) if tabelas else 'nenhuma'}")
+    else:
+        print("Uso: SANTASAUDE_BACKEND=sqlite python -m components.banco_sql --migrar")
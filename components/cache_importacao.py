@@ -0,0 +1,163 @@
+"""
+Cache em disco dos arquivos de importação já processados.
+
+Reenviar a mesma planilha ou o mesmo PDF (após um rerun ou depois de resolver
+conflitos) não processa o arquivo de novo: a chave é o SHA-256 dos bytes
+enviados + o tipo da fonte + a versão dos processadores, e o valor é o
+DataFrame processado em pickle. Ao mudar a lógica de um processador, aumente
+VERSAO_PROCESSADORES em components.importacao para invalidar o cache.
+
+O tamanho total é limitado (LIMITE_BYTES); quando passa do limite, as
+entradas usadas há mais tempo são apagadas (LRU pela data de modificação,
+atualizada a cada acerto). estatisticas() resume entradas, bytes e acertos.
+"""
+import os
+import json
+import time
+import hashlib
+import pickle
+from components import travas
+
+PASTA_CACHE = 'data/cache_importacao'
+CAMINHO_ESTATISTICAS = os.path.join(PASTA_CACHE, '_estatisticas.json')
+
+# Tamanho máximo do cache em disco (padrão: 256 MB)
+LIMITE_BYTES = int(os.environ.get('SANTASAUDE_LIMITE_CACHE_IMPORTACAO', str(256 * 1024 * 1024)))
+
+
+def chave(conteudo, tipo, versao):
+    """Chave da entrada: hash do conteúdo + tipo da fonte + versão dos processadores."""
+    return f"{hashlib.sha256(conteudo).hexdigest()}_{tipo}_v{versao}"
+
+
+def _caminho(chave_entrada):
+    return os.path.join(PASTA_CACHE, f"{chave_entrada}.pkl")
+
+
+def _entradas():
+    if not os.path.isdir(PASTA_CACHE):
+        return []
+    return [os.path.join(PASTA_CACHE, n) for n in os.listdir(PASTA_CACHE) if n.endswith('.pkl')]
+
+
+def _contar(campo):
+    """Soma 1 ao contador persistido (acertos/faltas), compartilhado entre processos."""
+    os.makedirs(PASTA_CACHE, exist_ok=True)
+    with travas.travar(CAMINHO_ESTATISTICAS):
+        contadores = _ler_contadores()
+        contadores[campo] = contadores.get(campo, 0) + 1
+        tmp = f"{CAMINHO_ESTATISTICAS}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(contadores, f)
+        os.replace(tmp, CAMINHO_ESTATISTICAS)
+
+
+def _ler_contadores():
+    try:
+        with open(CAMINHO_ESTATISTICAS, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def obter(chave_entrada):
+    """DataFrame processado da entrada, ou None se não estiver no cache."""
+    caminho = _caminho(chave_entrada)
+    try:
+        with open(caminho, 'rb') as f:
+            df = pickle.load(f)
+    except FileNotFoundError:
+        _contar('faltas')
+        return None
+    except Exception as e:
+        # Entrada corrompida (ex.: gravação interrompida): descarta e processa de novo
+        print(f"Entrada inválida no cache de importação {caminho}: {e}")
+        _remover(caminho)
+        _contar('faltas')
+        return None
+    # Marca como usada agora (LRU)
+    try:
+        os.utime(caminho)
+    except OSError:
+        pass
+    _contar('acertos')
+    return df
+
+
+def guardar(chave_entrada, df):
+    """Grava a entrada (temporário + rename) e apaga as menos usadas se passar do limite."""
+    os.makedirs(PASTA_CACHE, exist_ok=True)
+    caminho = _caminho(chave_entrada)
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, caminho)
+    podar()
+
+
+def _remover(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def podar(limite=None):
+    """Apaga as entradas usadas há mais tempo até o cache caber no limite. Retorna quantas saíram."""
+    limite = LIMITE_BYTES if limite is None else limite
+    entradas = []
+    for caminho in _entradas():
+        try:
+            st = os.stat(caminho)
+        except FileNotFoundError:
+            continue
+        entradas.append((st.st_mtime, st.st_size, caminho))
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    removidas = 0
+    for _, tamanho, caminho in sorted(entradas):
+        if total <= limite:
+            break
+        _remover(caminho)
+        total -= tamanho
+        removidas += 1
+    return removidas
+
+
+def limpar():
+    """Apaga todas as entradas (os contadores continuam)."""
+    return podar(limite=0)
+
+
+def estatisticas():
+    """
+    Returns:
+        dict: entradas, bytes, limite_bytes, acertos, faltas, taxa_acerto e
+        ultimo_uso (timestamp da entrada usada mais recentemente, ou None).
+    """
+    entradas = []
+    for caminho in _entradas():
+        try:
+            entradas.append(os.stat(caminho))
+        except FileNotFoundError:
+            continue
+    contadores = _ler_contadores()
+    acertos = contadores.get('acertos', 0)
+    faltas = contadores.get('faltas', 0)
+    return {
+        'entradas': len(entradas),
+        'bytes': sum(st.st_size for st in entradas),
+        'limite_bytes': LIMITE_BYTES,
+        'acertos': acertos,
+        'faltas': faltas,
+        'taxa_acerto': acertos / (acertos + faltas) if acertos + faltas else 0.0,
+        'ultimo_uso': max((st.st_mtime for st in entradas), default=None),
+    }
+
+
+if __name__ == "__main__":
+    e = estatisticas()
+    print(f"{e['entradas']} entrada(s), {e['bytes'] / 1024 / 1024:.1f} de "
+          f"{e['limite_bytes'] / 1024 / 1024:.0f} MB; acertos {e['acertos']}, faltas {e['faltas']}"
+          f" ({e['taxa_acerto']:.0%})")
+    if e['ultimo_uso']:
+        print(f"Último uso: {time.strftime('%d/%m/%Y %H:%M', time.localtime(e['ultimo_uso']))}")
@@ -1,41 +1,211 @@
 """
 Módulo centralizado para gestão de contas bancárias e saldos.
+
+Os saldos ficam materializados em data/saldos_contas.pkl e são atualizados
+incrementalmente a cada gravação no ledger, de modo que exibir os cards de saldo
+não exige reler todo o histórico de movimentações.
+
+Uso pela linha de comando:
+    python -m components.contas --verificar     # compara a visão com o histórico
+    python -m components.contas --reconstruir   # refaz a visão a partir do histórico
 """
-import pandas as pd
 import os
+import sys
+import pickle
+from components import ledger
+from components import travas
+from components import esquemas
 
 # Lista oficial de contas do sistema
 CONTAS_SISTEMA = [
-    "DINHEIRO", 
-    "SANTANDER", 
-    "BANESE", 
+    "DINHEIRO",
+    "SANTANDER",
+    "BANESE",
     "C6",
-    "CAIXA", 
-    "BNB", 
-    "MERCADO PAGO", 
+    "CAIXA",
+    "BNB",
+    "MERCADO PAGO",
     "CONTA PIX"
 ]
 
+CAMINHO_SALDOS = 'data/saldos_contas.pkl'
+
+# Diferença máxima aceita entre a visão e o recálculo (arredondamento de float)
+TOLERANCIA_SALDO = 0.005
+
 def obter_lista_contas():
     """Retorna a lista oficial de contas do sistema."""
     return CONTAS_SISTEMA.copy()
 
-def calcular_saldos():
-    """Calcula os saldos atuais a partir do arquivo de movimentação já tratado."""
-    
+# ========== VISÃO MATERIALIZADA DE SALDOS ==========
+
+def _somar_por_conta(df):
+    """
+    Soma a coluna 'pago' por conta, ignorando valores não numéricos.
+    No formato compacto (components.esquemas) soma os centavos inteiros com a
+    conta categórica, o que é bem mais rápido e sem erro de arredondamento.
+    """
+    if df.empty or 'conta' not in df.columns or 'pago' not in df.columns:
+        return {}
+    valores, em_centavos = esquemas.em_reais(df, 'pago')
+    somas = valores.groupby(df['conta'], observed=True).sum()
+    if em_centavos:
+        somas = somas / 100
+    return {conta: float(valor) for conta, valor in somas.items()}
+
+def _somar_partes(partes):
+    """Soma por conta várias partes do ledger, cada uma no seu formato."""
+    saldos = {}
+    for parte in partes:
+        for conta, valor in _somar_por_conta(parte).items():
+            saldos[conta] = saldos.get(conta, 0.0) + valor
+    return saldos
+
+def _carregar_visao():
+    """Retorna a visão salva ou None se não existir / estiver corrompida."""
+    if not os.path.exists(CAMINHO_SALDOS):
+        return None
+    try:
+        with open(CAMINHO_SALDOS, 'rb') as f:
+            visao = pickle.load(f)
+        if not {'saldos', 'segmentos', 'versao_base'} <= set(visao):
+            return None
+        return visao
+    except Exception:
+        return None
+
+def _salvar_visao(visao):
+    os.makedirs(os.path.dirname(CAMINHO_SALDOS) or '.', exist_ok=True)
+    tmp = f"{CAMINHO_SALDOS}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(visao, f)
+    os.replace(tmp, CAMINHO_SALDOS)
+
+def reconstruir_saldos(df=None, segmentos=None):
+    """
+    Recalcula a visão de saldos reprocessando todo o histórico do ledger.
+
+    Args:
+        df (DataFrame): histórico já carregado (opcional, evita reler o ledger).
+        segmentos (list): segmentos contidos em df; obrigatório quando df é informado.
+
+    Returns:
+        dict: saldos por conta.
+    """
+    if df is None:
+        # Partes lidas no formato compacto e somadas separadamente (sem concat)
+        with travas.travar(ledger.CAMINHO_BASE, exclusiva=False):
+            versao_base = ledger.versao_base()
+            segmentos = ledger.segmentos()
+            partes = [ledger.ler_base(compacto=True)]
+            partes += [ledger.ler_segmento(nome, compacto=True) for nome in segmentos]
+        saldos = _somar_partes(partes)
+    else:
+        versao_base = ledger.versao_base()
+        saldos = _somar_por_conta(df)
+
+    visao = {
+        'saldos': saldos,
+        'segmentos': set(segmentos or []),
+        'versao_base': versao_base,
+    }
+    _salvar_visao(visao)
+    return dict(visao['saldos'])
+
+def aplicar_movimentacoes_saldos(df_novos, segmento):
+    """
+    Soma as movimentações de um segmento recém-gravado na visão de saldos.
+    Chamado pelo ledger a cada append.
+    """
+    visao = _carregar_visao()
+    if visao is None or visao['versao_base'] != ledger.versao_base():
+        reconstruir_saldos()
+        return
+    if segmento in visao['segmentos']:
+        return
+
+    for conta, valor in _somar_por_conta(df_novos).items():
+        visao['saldos'][conta] = visao['saldos'].get(conta, 0.0) + valor
+    visao['segmentos'].add(segmento)
+    _salvar_visao(visao)
+
+def substituir_movimentacoes_saldos(partes_antes, partes_depois, versao_base_anterior, renomeados):
+    """
+    Ajusta a visão de saldos a uma edição de linhas já gravadas
+    (ledger.atualizar_linhas): soma a diferença entre as partes antes e depois da
+    edição e acompanha a nova versão da base e os novos nomes dos segmentos.
+    """
+    visao = _carregar_visao()
+    if visao is None or visao['versao_base'] != versao_base_anterior \
+            or not set(renomeados) <= visao['segmentos']:
+        # Visão já estava defasada: refaz do zero (a trava do ledger é reentrante)
+        reconstruir_saldos()
+        return
+
+    for conta, valor in _somar_partes(partes_depois).items():
+        visao['saldos'][conta] = visao['saldos'].get(conta, 0.0) + valor
+    for conta, valor in _somar_partes(partes_antes).items():
+        visao['saldos'][conta] = visao['saldos'].get(conta, 0.0) - valor
+    visao['segmentos'] = (visao['segmentos'] - set(renomeados)) | set(renomeados.values())
+    visao['versao_base'] = ledger.versao_base()
+    _salvar_visao(visao)
+
+def _sincronizar_visao():
+    """
+    Garante que a visão reflete o ledger. Se algum segmento foi gravado sem
+    atualizar a visão (queda no meio da operação), aplica apenas esse segmento.
+    """
+    visao = _carregar_visao()
+    if visao is None or visao['versao_base'] != ledger.versao_base():
+        return reconstruir_saldos()
+
+    segmentos = ledger.segmentos()
+    faltantes = [s for s in segmentos if s not in visao['segmentos']]
+    if not faltantes and len(visao['segmentos']) == len(segmentos):
+        return dict(visao['saldos'])
+    if any(s not in segmentos for s in visao['segmentos']):
+        # Segmentos sumiram sem a base mudar: estado inesperado, refaz do zero
+        return reconstruir_saldos()
+
     try:
-        df = pd.read_pickle('data/movimentacao_contas.pkl')
+        df_faltantes = ledger.ler_segmentos(faltantes)
     except FileNotFoundError:
-        return {conta: 0 for conta in CONTAS_SISTEMA}
-    
-    # Agrupa diretamente pela coluna 'conta'
-    saldos_atuais = df.groupby('conta')['pago'].sum().to_dict()
-    
+        # Compactados enquanto isso: a base mudou, então refaz do zero
+        return reconstruir_saldos()
+    for conta, valor in _somar_por_conta(df_faltantes).items():
+        visao['saldos'][conta] = visao['saldos'].get(conta, 0.0) + valor
+    visao['segmentos'].update(faltantes)
+    _salvar_visao(visao)
+    return dict(visao['saldos'])
+
+def verificar_saldos():
+    """
+    Compara a visão materializada com o recálculo completo do histórico.
+
+    Returns:
+        tuple: (ok: bool, diferencas: dict conta -> (visao, recalculado))
+    """
+    saldos_visao = _sincronizar_visao()
+    saldos_reais = _somar_por_conta(ledger.scan(colunas=['conta', 'pago']))
+
+    diferencas = {}
+    for conta in set(saldos_visao) | set(saldos_reais):
+        v = saldos_visao.get(conta, 0.0)
+        r = saldos_reais.get(conta, 0.0)
+        if abs(v - r) > TOLERANCIA_SALDO:
+            diferencas[conta] = (v, r)
+    return not diferencas, diferencas
+
+def calcular_saldos():
+    """Retorna os saldos atuais a partir da visão materializada."""
+
+    saldos_atuais = _sincronizar_visao()
+
     # Garante que todas as contas existam no dicionário
     for conta in CONTAS_SISTEMA:
         if conta not in saldos_atuais:
             saldos_atuais[conta] = 0
-    
+
     return saldos_atuais
 
 def obter_saldo_conta(nome_conta):
@@ -45,4 +215,22 @@ def obter_saldo_conta(nome_conta):
 
 def validar_conta(nome_conta):
     """Verifica se o nome da conta é válido."""
-    return nome_conta in CONTAS_SISTEMA
\ No newline at end of file
+    return nome_conta in CONTAS_SISTEMA
+
+if __name__ == "__main__":
+    if '--reconstruir' in sys.argv:
+        saldos = reconstruir_saldos()
+        print("✅ Visão de saldos reconstruída:")
+        for conta, saldo in sorted(saldos.items()):
+            print(f"  {conta}: R$ {saldo:,.2f}")
+    elif '--verificar' in sys.argv:
+        ok, diferencas = verificar_saldos()
+        if ok:
+            print("✅ Visão de saldos confere com o histórico.")
+        else:
+            print("❌ Divergências encontradas (visão x recalculado):")
+            for conta, (v, r) in sorted(diferencas.items()):
+                print(f"  {conta}: R$ {v:,.2f} x R$ {r:,.2f}")
+            sys.exit(1)
+    else:
+        print("Uso: python -m components.contas --verificar | --reconstruir")
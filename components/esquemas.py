@@ -0,0 +1,322 @@
+"""
+Registro central dos esquemas das tabelas em data/*.pkl.
+
+Os DataFrames eram gravados com colunas object para valores repetidos (conta,
+forma_pagamento, convenio, origem, status...) e dinheiro em float. Na gravação,
+compactar() aplica o esquema da tabela:
+
+- colunas de baixa cardinalidade viram category;
+- colunas de dinheiro viram centavos inteiros (Int64), quando a conversão é exata;
+- colunas de data com objetos datetime viram datetime64.
+
+O DataFrame compactado leva em df.attrs['esquema'] o que foi convertido, e
+expandir() desfaz a conversão para quem lê (repositorio.ler_tabela), de modo que
+o restante do sistema continua vendo floats e strings comuns.
+
+Migração dos arquivos existentes (passo explícito; até lá os arquivos no formato
+antigo são compactados só na leitura, em memória):
+    python -m components.esquemas --migrar
+"""
+import os
+import sys
+import glob
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+PASTA_DADOS = 'data'
+
+# Incrementar quando o registro mudar, para que migrar() reprocesse os arquivos
+VERSAO_ESQUEMA = 1
+CAMINHO_MARCADOR = os.path.join(PASTA_DADOS, '.versao_esquema')
+
+# Uma coluna só vira category se tiver no máximo esta fração de valores distintos
+FRACAO_MAX_CATEGORIAS = 0.5
+
+# Maior valor (em reais) convertido para centavos sem perda de precisão
+LIMITE_CENTAVOS = 2 ** 50 / 100
+
+# Colunas comuns a quase todas as tabelas
+_CATEGORIAS_COMUNS = ['origem', 'status', 'convenio', 'forma_pagamento', 'unidade']
+_DATAS_COMUNS = ['data_cadastro', 'data_importacao']
+
+ESQUEMAS = {
+    'movimentacao_contas': {
+        'categorias': _CATEGORIAS_COMUNS + ['conta', 'tipo', 'categoria_pagamento',
+                                            'subcategoria_pagamento', 'medico'],
+        'dinheiro': ['pago', 'total', 'a_pagar', 'desconto'],
+        'datas': _DATAS_COMUNS,
+    },
+    'movimento_clinica': {
+        'categorias': _CATEGORIAS_COMUNS + ['medico', 'servicos'],
+        'dinheiro': ['pago', 'subtotal', 'total', 'repasse_medico', 'a_pagar'],
+        'datas': _DATAS_COMUNS,
+    },
+    'movimento_laboratorio': {
+        'categorias': _CATEGORIAS_COMUNS + ['atendente'],
+        'dinheiro': ['total', 'desconto', 'acrescimo', 'pago', 'a_pagar'],
+        'datas': _DATAS_COMUNS,
+    },
+    'recebimentos_pendentes': {
+        'categorias': _CATEGORIAS_COMUNS + ['origem_recebimento', 'forma_pagamento2', 'maquina'],
+        'dinheiro': ['valor_pendente', 'valor_residual', 'valor_parcial'],
+        'datas': ['data_operacao', 'data_baixa'],
+    },
+    'credito_mulvi': {
+        'categorias': _CATEGORIAS_COMUNS + ['Bandeira', 'Tipo_Transação', 'maquina'],
+        'dinheiro': ['ValorBruto', 'ValorLiquido'],
+        'datas': ['Data_Lançamento', 'Data_Transação', 'data_importacao'],
+    },
+    'credito_getnet': {
+        'categorias': _CATEGORIAS_COMUNS + ['cartoes', 'descricao_lancamento', 'maquina'],
+        'dinheiro': ['valor_bruto', 'valor_taxa', 'valor_liquido'],
+        'datas': ['data_venda', 'data_prevista_1_pagamento', 'data_importacao'],
+    },
+    'convenio_detalhado': {
+        'categorias': _CATEGORIAS_COMUNS + ['Sexo', 'Nome do Usuário'],
+        'dinheiro': ['valor', 'Valor R$', 'Valor Final'],
+        'datas': _DATAS_COMUNS,
+    },
+    'convenio_ipes': {
+        'categorias': _CATEGORIAS_COMUNS + ['status_conciliacao', 'tabela'],
+        'dinheiro': ['valor', 'valor_exec'],
+        'datas': _DATAS_COMUNS,
+    },
+    'ipes_consolidado': {
+        'categorias': _CATEGORIAS_COMUNS + ['status_conciliacao', 'origem_dados',
+                                            'tipo_procedimento', 'medico'],
+        'dinheiro': ['valor'],
+        'datas': _DATAS_COMUNS + ['data_consolidacao'],
+    },
+    'inconsistencias_ipes': {
+        'categorias': _CATEGORIAS_COMUNS,
+        'dinheiro': ['valor_sistema', 'valor_ipes'],
+        'datas': ['data', 'data_exportacao'],
+    },
+    'procedimentos': {
+        'categorias': [],
+        'dinheiro': [],
+        'datas': [],
+    },
+}
+
+
+def nome_tabela(caminho):
+    """
+    Nome da tabela no registro a partir do caminho do arquivo.
+    Segmentos do ledger (data/<tabela>_segmentos/*.pkl) e partições mensais
+    (data/<tabela>_particoes/*.pkl) usam o esquema da tabela; arquivos auxiliares
+    dessas pastas (como '_manifesto.pkl') não têm esquema.
+    """
+    pasta, arquivo = os.path.split(os.path.abspath(caminho))
+    pasta = os.path.basename(pasta)
+    for sufixo in ('_segmentos', '_particoes'):
+        if pasta.endswith(sufixo):
+            if arquivo.startswith('_'):
+                return os.path.splitext(arquivo)[0]
+            return pasta[:-len(sufixo)]
+    return os.path.splitext(arquivo)[0]
+
+
+def esquema(caminho):
+    """Esquema registrado para o arquivo ou None."""
+    return ESQUEMAS.get(nome_tabela(caminho))
+
+
+def compacto(df):
+    return isinstance(df, pd.DataFrame) and 'esquema' in df.attrs
+
+
+# ========== CONVERSÕES ==========
+
+def _so_textos(serie):
+    valores = serie.dropna()
+    return valores.map(type).eq(str).all()
+
+
+def _para_categoria(serie):
+    if serie.dtype != object or serie.empty or not _so_textos(serie):
+        return None
+    if serie.nunique(dropna=True) > FRACAO_MAX_CATEGORIAS * len(serie):
+        return None
+    return serie.astype('category')
+
+
+def _para_centavos(serie):
+    if not (pd.api.types.is_float_dtype(serie.dtype) or pd.api.types.is_integer_dtype(serie.dtype)):
+        return None
+    if pd.api.types.is_extension_array_dtype(serie.dtype):
+        return None
+    valores = serie.to_numpy(dtype='float64')
+    validos = valores[~np.isnan(valores)]
+    if validos.size and (not np.isfinite(validos).all() or np.abs(validos).max() > LIMITE_CENTAVOS):
+        return None
+    centavos = np.round(validos * 100)
+    # Só converte se não perder nada (ex.: taxas com mais de duas casas ficam em float)
+    if not np.array_equal(centavos / 100, validos):
+        return None
+    resultado = pd.Series(np.round(valores * 100), index=serie.index, name=serie.name)
+    return resultado.astype('Int64')
+
+
+def _para_datetime(serie):
+    if serie.dtype != object or serie.empty:
+        return None
+    valores = serie.dropna()
+    # Só objetos datetime; strings e date puros ficam como estão
+    if valores.empty or not valores.map(lambda v: isinstance(v, datetime)).all():
+        return None
+    try:
+        return pd.to_datetime(serie)
+    except (ValueError, TypeError):
+        return None
+
+
+def compactar(df, caminho):
+    """
+    Aplica o esquema da tabela de caminho ao DataFrame (para gravação/cache).
+    Retorna o próprio df se não houver esquema ou se ele já estiver compacto.
+    """
+    definicao = esquema(caminho)
+    if definicao is None or not isinstance(df, pd.DataFrame) or compacto(df):
+        return df
+
+    df = df.copy()
+    convertidas = {'tabela': nome_tabela(caminho), 'versao': VERSAO_ESQUEMA,
+                   'categorias': [], 'centavos': {}}
+    for coluna in definicao['datas']:
+        if coluna in df.columns:
+            nova = _para_datetime(df[coluna])
+            if nova is not None:
+                df[coluna] = nova
+    for coluna in definicao['dinheiro']:
+        if coluna in df.columns:
+            nova = _para_centavos(df[coluna])
+            if nova is not None:
+                convertidas['centavos'][coluna] = str(df[coluna].dtype)
+                df[coluna] = nova
+    for coluna in definicao['categorias']:
+        if coluna in df.columns:
+            nova = _para_categoria(df[coluna])
+            if nova is not None:
+                convertidas['categorias'].append(coluna)
+                df[coluna] = nova
+    df.attrs['esquema'] = convertidas
+    return df
+
+
+def expandir(df):
+    """
+    Desfaz compactar(): centavos voltam a reais e categorias a object, para que
+    os chamadores possam atribuir valores novos livremente.
+    """
+    if not compacto(df):
+        return df
+    convertidas = df.attrs['esquema']
+    df = df.copy()
+    for coluna, dtype in convertidas['centavos'].items():
+        if coluna in df.columns and pd.api.types.is_integer_dtype(df[coluna].dtype):
+            valores = df[coluna].to_numpy(dtype='float64', na_value=np.nan) / 100
+            serie = pd.Series(valores, index=df.index, name=coluna)
+            if dtype.startswith(('int', 'uint')) and not np.isnan(valores).any():
+                serie = serie.astype(dtype)
+            df[coluna] = serie
+    for coluna in convertidas['categorias']:
+        if coluna in df.columns and isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype(object)
+    del df.attrs['esquema']
+    return df
+
+
+def em_reais(df, coluna):
+    """
+    Valores numéricos da coluna em reais, sem expandir o DataFrame inteiro.
+
+    Returns:
+        tuple: (Series, em_centavos) — se em_centavos, a Series está em centavos
+        inteiros (some antes e divida por 100 no fim, sem erro de arredondamento).
+    """
+    if compacto(df) and coluna in df.attrs['esquema']['centavos'] \
+            and pd.api.types.is_integer_dtype(df[coluna].dtype):
+        return df[coluna].fillna(0).astype('int64'), True
+    return pd.to_numeric(df[coluna], errors='coerce').fillna(0.0), False
+
+
+# ========== MIGRAÇÃO ==========
+
+def _arquivos():
+    caminhos = glob.glob(os.path.join(PASTA_DADOS, '*.pkl'))
+    caminhos += glob.glob(os.path.join(PASTA_DADOS, '*_segmentos', '*.pkl'))
+    caminhos += glob.glob(os.path.join(PASTA_DADOS, '*_particoes', '*.pkl'))
+    return sorted(c for c in caminhos if esquema(c) is not None)
+
+
+def migracao_pendente():
+    try:
+        with open(CAMINHO_MARCADOR, 'r') as f:
+            return f.read().strip() != str(VERSAO_ESQUEMA)
+    except FileNotFoundError:
+        return True
+
+
+def migrar(forcar=False):
+    """
+    Regrava no formato compacto os arquivos existentes que ainda não estão nele.
+
+    Returns:
+        list: arquivos migrados.
+    """
+    from components import repositorio
+    from components import banco_sql
+    from components import ledger
+    from components import particoes
+    from components import travas
+
+    if not forcar and not migracao_pendente():
+        return []
+
+    migrados = []
+    falhas = 0
+    # Trava do ledger: nenhuma compactação apaga segmentos durante a migração
+    with travas.travar(ledger.CAMINHO_BASE):
+        for caminho in _arquivos():
+            # O pickle único de uma tabela particionada é dividido (e compactado) por
+            # particoes.migrar, que o renomeia para .pre_particoes; regravá-lo aqui
+            # criaria as partições e deixaria o original para trás
+            if banco_sql.gerencia(caminho) or particoes.particionavel(caminho):
+                continue
+            try:
+                df = pd.read_pickle(caminho)
+                if compacto(df) and df.attrs['esquema'].get('versao') == VERSAO_ESQUEMA:
+                    continue
+                df = compactar(expandir(df), caminho)
+                # Segmentos e partições são protegidos pela trava da tabela, não pela própria
+                pasta = os.path.basename(os.path.dirname(os.path.abspath(caminho)))
+                avulso = not pasta.endswith(('_segmentos', '_particoes'))
+                repositorio.salvar_tabela(df, caminho, versionar=avulso)
+                migrados.append(caminho)
+            except Exception as e:
+                # O arquivo continua legível no formato antigo; a migração pode ser refeita
+                print(f"Erro ao migrar {caminho}: {e}")
+                falhas += 1
+
+    if migrados:
+        from components.contas import reconstruir_saldos
+        reconstruir_saldos()
+
+    if falhas:
+        return migrados
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    with open(CAMINHO_MARCADOR, 'w') as f:
+        f.write(str(VERSAO_ESQUEMA))
+    return migrados
+
+
+if __name__ == "__main__":
+    if '--migrar' in sys.argv:
+        arquivos = migrar(forcar=True)
+        print(f"✅ Arquivos migrados: {len(arquivos)}")
+        for caminho in arquivos:
+            print(f"  {caminho}")
+    else:
+        print("Uso: python -m components.esquemas --migrar")
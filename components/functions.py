@@ -1,12 +1,12 @@
 # components/functions.py
 
 import io
-import os
 import base64
 import requests
 import streamlit as st
 import pandas as pd
 from datetime import date, datetime
+from components import ledger
 
 def atualizar_csv_github_df(df, token, repo, path, mensagem, branch="main"):
     import time
@@ -184,55 +184,24 @@ def carregar_movimentacao_contas():
     Carrega o DataFrame de movimentação de contas a partir do arquivo pickle.
     Retorna um DataFrame vazio se o arquivo não existir ou se ocorrer um erro.
     """
-    caminho_arquivo = 'data/movimentacao_contas.pkl'
     try:
-        if os.path.exists(caminho_arquivo):
-            df = pd.read_pickle(caminho_arquivo)
-            # Garante que a coluna de data está no formato correto para ordenação
-            if 'data_cadastro' in df.columns:
-                df['data_cadastro'] = pd.to_datetime(df['data_cadastro'], errors='coerce')
-            return df
-        else:
-            # Retorna um DataFrame vazio com as colunas esperadas para evitar erros
-            return pd.DataFrame()
+        df = ledger.scan()
+        # Garante que a coluna de data está no formato correto para ordenação
+        if 'data_cadastro' in df.columns:
+            df['data_cadastro'] = pd.to_datetime(df['data_cadastro'], errors='coerce')
+        return df
     except Exception as e:
         st.error(f"Erro ao carregar o arquivo movimentacao_contas.pkl: {e}")
         return pd.DataFrame()
 
 def calcular_saldos_contas():
     """
-    Calcula os saldos de todas as contas baseado no arquivo movimentacao_contas.pkl
-    Considera ENTRADA como positivo e SAIDA como negativo
+    Retorna os saldos de todas as contas a partir da visão materializada
+    (components.contas), sem reler o histórico de movimentações.
+    Os valores de 'pago' já são gravados com sinal (saídas negativas).
     """
-    df = carregar_movimentacao_contas()
-    
-    if df.empty or 'conta' not in df.columns:
-        return {}
-    
-    saldos = {}
-    
-    # Agrupa por conta e calcula o saldo
-    for conta in df['conta'].dropna().unique():
-        df_conta = df[df['conta'] == conta]
-        
-        saldo_total = 0
-        for _, row in df_conta.iterrows():
-            valor = float(row.get('pago', 0))
-            tipo = row.get('tipo', '')
-            
-            # CORREÇÃO: Se tem coluna 'tipo', usa ela para determinar se soma ou subtrai
-            if 'tipo' in df.columns and pd.notna(row.get('tipo')):
-                if tipo == 'ENTRADA':
-                    saldo_total += valor
-                elif tipo == 'SAIDA':
-                    saldo_total -= valor
-            else:
-                # Fallback: se não tem coluna tipo, assume que valores positivos são entrada
-                saldo_total += valor
-        
-        saldos[conta] = saldo_total
-    
-    return saldos
+    from components.contas import calcular_saldos
+    return calcular_saldos()
 
 def limpar_form_transferencia():
     """Limpa os campos do formulário de transferência"""
@@ -253,17 +222,6 @@ def registrar_transferencia(data, conta_origem, conta_destino, valor, motivo, de
     movimentacao_contas.pkl. A saída é registrada com valor negativo.
     """
     try:
-        caminho_arquivo = 'data/movimentacao_contas.pkl'
-        
-        if os.path.exists(caminho_arquivo):
-            df = pd.read_pickle(caminho_arquivo)
-        else:
-            df = pd.DataFrame(columns=[
-                'data_cadastro', 'tipo', 'categoria_pagamento', 'subcategoria_pagamento', 
-                'pago', 'conta', 'descricao', 'observacoes', 'id_transferencia',
-                'paciente', 'medico', 'forma_pagamento', 'convenio', 'servicos', 'origem'
-            ])
-
         id_transferencia = f"transf_{int(datetime.now().timestamp())}"
 
         colunas_nulas = {
@@ -317,9 +275,7 @@ def registrar_transferencia(data, conta_origem, conta_destino, valor, motivo, de
             }
             registros_a_adicionar.append(taxa_registro)
 
-        novos_registros = pd.DataFrame(registros_a_adicionar)
-        df_atualizado = pd.concat([df, novos_registros], ignore_index=True)
-        df_atualizado.to_pickle(caminho_arquivo)
+        ledger.append(registros_a_adicionar)
         
         return True
 
@@ -358,16 +314,12 @@ def registrar_saida(data, categoria, subcategoria, valor, conta_origem, observac
     Returns:
         bool: True se a operação foi bem-sucedida, False caso contrário.
     """
-    caminho_arquivo = 'data/movimentacao_contas.pkl'
-
     try:
-        # --- 1. Carregar o DataFrame de movimentações ---
-        if os.path.exists(caminho_arquivo):
-            df_movimentacao = pd.read_pickle(caminho_arquivo)
-        else:
+        # --- 1. Verificar se o histórico de movimentações existe ---
+        if not ledger.existe():
             # Se o arquivo não existe, a operação não pode continuar, pois não há contas para debitar.
             # A função inicializar_movimentacao_contas() deve ser chamada em outro lugar.
-            print(f"ERRO: Arquivo '{caminho_arquivo}' não encontrado. Execute a inicialização primeiro.")
+            print(f"ERRO: Arquivo '{ledger.CAMINHO_BASE}' não encontrado. Execute a inicialização primeiro.")
             return False
 
         # --- 2. Preparar o novo registro de pagamento ---
@@ -389,18 +341,8 @@ def registrar_saida(data, categoria, subcategoria, valor, conta_origem, observac
             'observacoes': observacoes
         }
         
-        df_novo_pagamento = pd.DataFrame([novo_pagamento])
-
-        # --- 3. Garantir que todas as colunas existam no DataFrame principal ---
-        for col in df_novo_pagamento.columns:
-            if col not in df_movimentacao.columns:
-                df_movimentacao[col] = pd.NA # Adiciona a coluna com valores nulos se não existir
-
-        # --- 4. Adicionar o pagamento ao histórico e salvar ---
-        df_atualizado = pd.concat([df_movimentacao, df_novo_pagamento], ignore_index=True)
-        
-        # Salva o arquivo atualizado
-        df_atualizado.to_pickle(caminho_arquivo)
+        # --- 3. Anexar o pagamento ao histórico (sem reescrever o arquivo inteiro) ---
+        ledger.append(novo_pagamento)
         
         print(f"Pagamento de R${valor:.2f} registrado com sucesso na conta '{conta_origem}'.")
         return True
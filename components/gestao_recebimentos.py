@@ -1,21 +1,21 @@
 import pandas as pd
-import pickle
 import os
 from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
-from components.importacao import carregar_dados_atendimentos
-from components.functions import salvar_dados
+from components import ledger
+from components import repositorio
+from components.transacao import Transacao, com_retentativa, ConflitoVersao
 
 CAMINHO_PENDENTES = 'data/recebimentos_pendentes.pkl'
-CAMINHO_MOVIMENTACAO = 'data/movimentacao_contas.pkl'
+CAMINHO_MOVIMENTACAO = ledger.CAMINHO_BASE
 CAMINHO_IPES_CONSOLIDADO = 'data/ipes_consolidado.pkl'
 
 # ========== FUNÇÕES DE LEITURA DE DADOS ==========
 
 def obter_recebimentos_pendentes():
     """Carrega TODOS os recebimentos pendentes do arquivo pkl."""
-    if os.path.exists(CAMINHO_PENDENTES):
-        return pd.read_pickle(CAMINHO_PENDENTES)
+    if repositorio.existe(CAMINHO_PENDENTES):
+        return repositorio.ler_tabela(CAMINHO_PENDENTES)
     return pd.DataFrame()
 
 def obter_recebimentos_convenios_outros():
@@ -72,7 +72,7 @@ def obter_recebimentos_ipes():
     Usado na aba IPES.
     """
     if os.path.exists(CAMINHO_IPES_CONSOLIDADO):
-        df = pd.read_pickle(CAMINHO_IPES_CONSOLIDADO)
+        df = repositorio.ler_tabela(CAMINHO_IPES_CONSOLIDADO)
     else:
         df = pd.DataFrame()
 
@@ -91,11 +91,11 @@ def obter_dados_cartao(tipo_cartao):
     """
     try:
         caminho_arquivo = f'data/credito_{tipo_cartao.lower()}.pkl'
-        if not os.path.exists(caminho_arquivo):
+        if not repositorio.existe(caminho_arquivo):
             return pd.DataFrame()
 
         # Carrega o arquivo original diretamente
-        df_original = pd.read_pickle(caminho_arquivo)
+        df_original = repositorio.ler_tabela(caminho_arquivo)
         if df_original.empty:
             return pd.DataFrame()
 
@@ -125,16 +125,18 @@ def obter_dados_cartao(tipo_cartao):
         print(f"Erro fatal em obter_dados_cartao: {e}")
         return pd.DataFrame()
 
-def obter_dados_ipes():
+def obter_dados_ipes(inicio=None, fim=None):
     """
     Obtém dados de pagamentos IPES com status pendente, preservando o índice original.
+    inicio/fim restringem o período pela data de cadastro.
     """
     try:
         caminho_arquivo = 'data/convenio_ipes.pkl' 
-        if not os.path.exists(caminho_arquivo):
+        if not repositorio.existe(caminho_arquivo):
             return pd.DataFrame()
 
-        df_original = pd.read_pickle(caminho_arquivo)
+        # Com período, só os meses do intervalo são lidos (tabela particionada)
+        df_original = repositorio.ler_periodo(caminho_arquivo, inicio, fim)
         if df_original.empty:
             return df_original
 
@@ -156,29 +158,23 @@ def obter_dados_ipes():
 
 # ========== FUNÇÕES DE PROCESSAMENTO ==========
 
+@com_retentativa
 def registrar_baixa_convenio(ids_pendentes, data_recebimento, conta_destino, valor_baixado=None):
     """
     Registra baixa de convênios (usado na aba GERAL).
     Cria UMA entrada de movimentação para o valor baixado, mas baixa todos os recebimentos selecionados.
     """
     try:
-        # Carrega arquivo de pendentes
-        df_pendentes = pd.read_pickle(CAMINHO_PENDENTES)
+        tx = Transacao()
 
-        # Filtra recebimentos selecionados
-        recebimentos_baixados = df_pendentes[df_pendentes['id_pendencia'].isin(ids_pendentes)]
+        # Carrega apenas os recebimentos selecionados (consulta indexada no backend SQLite)
+        recebimentos_baixados = tx.selecionar(CAMINHO_PENDENTES, 'id_pendencia', ids_pendentes)
 
         if recebimentos_baixados.empty:
             return False, f"Nenhum recebimento encontrado com os IDs: {ids_pendentes}"
 
         print(f"Encontrados {len(recebimentos_baixados)} recebimentos para baixar")
 
-        # Carrega arquivo de movimentação
-        if os.path.exists(CAMINHO_MOVIMENTACAO):
-            df_movimentacao = pd.read_pickle(CAMINHO_MOVIMENTACAO)
-        else:
-            df_movimentacao = pd.DataFrame()
-
         # Calcula valor total dos recebimentos selecionados
         valor_total = recebimentos_baixados['valor_pendente'].sum()
         valor_para_conta = valor_baixado if valor_baixado is not None else valor_total
@@ -199,30 +195,23 @@ def registrar_baixa_convenio(ids_pendentes, data_recebimento, conta_destino, val
             'desconto': 0
         }
 
-        # Adiciona a nova entrada ao DataFrame de movimentação
-        df_nova_entrada = pd.DataFrame([nova_entrada])
-        if not df_movimentacao.empty:
-            df_movimentacao = pd.concat([df_movimentacao, df_nova_entrada], ignore_index=True)
-        else:
-            df_movimentacao = df_nova_entrada
-
-        # Salva movimentação atualizada
-        df_movimentacao.to_pickle(CAMINHO_MOVIMENTACAO)
-        print(f"Movimentação salva com {len(df_movimentacao)} registros totais")
-
-        # Atualiza status para 'baixado'
-        df_pendentes.loc[df_pendentes['id_pendencia'].isin(ids_pendentes), 'status'] = 'baixado'
-        df_pendentes.to_pickle(CAMINHO_PENDENTES)
-        print(f"Status atualizado para 'baixado' em {len(ids_pendentes)} registros")
+        # Atualiza status para 'baixado'; movimentação e pendentes são gravados juntos (ou nenhum dos dois)
+        with tx:
+            tx.atualizar(CAMINHO_PENDENTES, 'id_pendencia', ids_pendentes, {'status': 'baixado'})
+            tx.anexar_ledger(nova_entrada)
+        print(f"Movimentação registrada e status atualizado para 'baixado' em {len(ids_pendentes)} registros")
 
         return True, f"✅ Baixa registrada! {len(recebimentos_baixados)} recebimento(s) - Valor baixado: R$ {valor_para_conta:,.2f}"
 
+    except ConflitoVersao:
+        raise
     except Exception as e:
         print(f"ERRO na baixa: {str(e)}")
         import traceback
         traceback.print_exc()
         return False, f"Erro ao registrar baixa: {str(e)}"
 
+@com_retentativa
 def registrar_conciliacao_cartao(ids_pendentes, indices_cartao, tipo_cartao, conta_destino, baixa_parcial=False, valores_parciais=[], parcela_antiga=False):
     """
     Registra conciliação entre recebimentos e transações de cartão.
@@ -234,41 +223,29 @@ def registrar_conciliacao_cartao(ids_pendentes, indices_cartao, tipo_cartao, con
         print(f"Índices do arquivo recebidos: {indices_cartao}")
         print(f"Parcela antiga: {parcela_antiga}")
         
-        # Carrega arquivos
-        df_pendentes = pd.read_pickle(CAMINHO_PENDENTES)
+        # A transação guarda a versão lida de cada arquivo
+        tx = Transacao()
         
         caminho_cartao = f'data/credito_{tipo_cartao.lower()}.pkl'
-        if not os.path.exists(caminho_cartao):
+        if not repositorio.existe(caminho_cartao):
             return False, f"Arquivo de cartão {tipo_cartao} não encontrado."
         
-        df_cartao = pd.read_pickle(caminho_cartao)
-        print(f"Total de transações no arquivo {tipo_cartao}: {len(df_cartao)}")
-        
-        # Adiciona status se não existir
-        if 'status' not in df_cartao.columns:
-            df_cartao['status'] = 'pendente'
-        
-        print(f"Transações pendentes: {len(df_cartao[df_cartao['status'] == 'pendente'])}")
-        
-        if os.path.exists(CAMINHO_MOVIMENTACAO):
-            df_movimentacao = pd.read_pickle(CAMINHO_MOVIMENTACAO)
-        else:
-            df_movimentacao = pd.DataFrame()
-        
-        # Filtra dados selecionados
+        # Filtra dados selecionados (consultas indexadas no backend SQLite)
         if not parcela_antiga:
-            recebimentos = df_pendentes[df_pendentes['id_pendencia'].isin(ids_pendentes)]
+            recebimentos = tx.selecionar(CAMINHO_PENDENTES, 'id_pendencia', ids_pendentes)
         else:
             recebimentos = pd.DataFrame()  # Para parcelas antigas, não há recebimentos
         
-        # Usa loc com os índices do arquivo original
+        # Seleciona pelos índices do arquivo original
         try:
-            transacoes = df_cartao.loc[indices_cartao]
-            print(f"Transações selecionadas: {len(transacoes)}")
-                                
-        except Exception as e:
+            indices_cartao = [int(i) for i in indices_cartao]
+        except (TypeError, ValueError) as e:
             print(f"Erro ao selecionar transações: {e}")
-            return False, f"Erro ao selecionar transações: índices inválidos"
+            return False, "Erro ao selecionar transações: índices inválidos"
+        transacoes = tx.selecionar(caminho_cartao, None, indices_cartao)
+        print(f"Transações selecionadas: {len(transacoes)}")
+        if len(transacoes) < len(set(indices_cartao)):
+            return False, "Erro ao selecionar transações: índices inválidos"
         
         # NOVO: Verificação ajustada para parcelas antigas
         if (not parcela_antiga and recebimentos.empty) or transacoes.empty:
@@ -356,63 +333,30 @@ def registrar_conciliacao_cartao(ids_pendentes, indices_cartao, tipo_cartao, con
             novas_movimentacoes.append(pd.DataFrame([entrada_taxa]))
             print(f"  Taxa debitada da conta {conta_destino}: R$ {abs(taxa):.2f}")
         
-        # Atualiza movimentação
-        df_movimentacao = pd.concat([df_movimentacao] + novas_movimentacoes, ignore_index=True)
-        df_movimentacao.to_pickle(CAMINHO_MOVIMENTACAO)
-        
-        if not parcela_antiga:
-            # Processar baixa parcial ou total apenas se não for parcela antiga
-            if baixa_parcial and valores_parciais:
-                for i, id_pend in enumerate(ids_pendentes):
-                    idx = df_pendentes[df_pendentes['id_pendencia'] == id_pend].index[0]
-                    valor_parcial = valores_parciais[i] if i < len(valores_parciais) else 0.0
-                    df_pendentes.loc[idx, 'valor_residual'] -= valor_parcial
-                    if df_pendentes.loc[idx, 'valor_residual'] <= 0:
-                        df_pendentes.loc[idx, 'status'] = 'baixado'
-            else:
-                df_pendentes.loc[df_pendentes['id_pendencia'].isin(ids_pendentes), 'status'] = 'baixado'
-                
-        df_pendentes.to_pickle(CAMINHO_PENDENTES)
-        
-        # CORREÇÃO CRÍTICA: Atualiza status das transações usando iloc
-        
-        print(f"Atualizando status das transações nos índices: {indices_cartao}")
-
-        # Carrega o arquivo original NOVAMENTE para garantir que não há dados em cache
-        df_cartao_para_salvar = pd.read_pickle(caminho_cartao)
-
-        # Adiciona a coluna 'status' se ela não existir no arquivo original
-        if 'status' not in df_cartao_para_salvar.columns:
-            df_cartao_para_salvar['status'] = 'pendente'
-
-        # Garante coluna 'indice_arquivo' com valores derivados do index atual (sempre em int)
-        if 'indice_arquivo' not in df_cartao_para_salvar.columns:
-            df_cartao_para_salvar['indice_arquivo'] = df_cartao_para_salvar.index.astype('int64')
-        else:
-            # normaliza tipo por precaução
-            df_cartao_para_salvar['indice_arquivo'] = df_cartao_para_salvar['indice_arquivo'].astype('int64')
-
-        # Marca linhas comparando valores inteiros (robusto a diferenças de index labels)
-        for original_idx in indices_cartao:
-            try:
-                oid = int(original_idx)
-            except:
-                print(f"  AVISO: índice recebido inválido: {original_idx}. Pulando.")
-                continue
-            mask = df_cartao_para_salvar['indice_arquivo'] == oid
-            if mask.any():
-                df_cartao_para_salvar.loc[mask, 'status'] = 'baixado'
-                print(f"  Índice original {oid} marcado como 'baixado' (via 'indice_arquivo').")
-            else:
-                # fallback: comparar com label do índice
-                if oid in df_cartao_para_salvar.index:
-                    df_cartao_para_salvar.loc[oid, 'status'] = 'baixado'
-                    print(f"  Índice {oid} marcado por label do índice como 'baixado' (fallback).")
+        # Ledger, pendentes e arquivo do cartão são gravados juntos (ou nenhum deles)
+        with tx:
+            if not parcela_antiga:
+                # Processar baixa parcial ou total apenas se não for parcela antiga
+                if baixa_parcial and valores_parciais:
+                    for i, id_pend in enumerate(ids_pendentes):
+                        linha = recebimentos[recebimentos['id_pendencia'] == id_pend]
+                        if linha.empty:
+                            continue
+                        valor_parcial = valores_parciais[i] if i < len(valores_parciais) else 0.0
+                        valor_residual = linha['valor_residual'].iloc[0] - valor_parcial
+                        alteracoes = {'valor_residual': valor_residual}
+                        if valor_residual <= 0:
+                            alteracoes['status'] = 'baixado'
+                        tx.atualizar(CAMINHO_PENDENTES, 'id_pendencia', [id_pend], alteracoes)
                 else:
-                    print(f"  AVISO: Índice original {oid} não encontrado. Ignorando.")
+                    tx.atualizar(CAMINHO_PENDENTES, 'id_pendencia', ids_pendentes, {'status': 'baixado'})
 
-        # Salva o DataFrame modificado
-        df_cartao_para_salvar.to_pickle(caminho_cartao)
+            # Marca as transações pelo índice original do arquivo
+            print(f"Atualizando status das transações nos índices: {indices_cartao}")
+            tx.atualizar(caminho_cartao, None, indices_cartao, {'status': 'baixado'},
+                         padroes={'status': 'pendente'})
+
+            tx.anexar_ledger(novas_movimentacoes)
         
         print(f"\n✅ Conciliação concluída com sucesso")
         print(f"=== FIM CONCILIAÇÃO ===\n")
@@ -424,12 +368,15 @@ def registrar_conciliacao_cartao(ids_pendentes, indices_cartao, tipo_cartao, con
             msg += f", Taxa: R$ {abs(taxa):.2f}"
         return True, msg
         
+    except ConflitoVersao:
+        raise
     except Exception as e:
         import traceback
         print(f"\n❌ ERRO na conciliação: {str(e)}")
         traceback.print_exc()
         return False, f"Erro na conciliação: {str(e)}"
 
+@com_retentativa
 def registrar_conciliacao_ipes(ids_pendentes, indices_ipes, conta_destino, valor_pago=None):
     """
     Registra conciliação entre recebimentos e pagamentos IPES.
@@ -440,24 +387,20 @@ def registrar_conciliacao_ipes(ids_pendentes, indices_ipes, conta_destino, valor
         print(f"IDs pendentes recebidos: {ids_pendentes}")
         print(f"Índices do arquivo IPES recebidos: {indices_ipes}")
 
-        # Carrega arquivos
+        # Carrega arquivos (a transação guarda a versão lida de cada um)
+        tx = Transacao()
         if os.path.exists(CAMINHO_IPES_CONSOLIDADO):
-            df_ipes_consol = pd.read_pickle(CAMINHO_IPES_CONSOLIDADO)
+            df_ipes_consol = tx.ler(CAMINHO_IPES_CONSOLIDADO)
         else:
             df_ipes_consol = pd.DataFrame()
 
         # NOVO: Carrega também o arquivo convenio_ipes.pkl para atualizar status
         caminho_ipes_pag = 'data/convenio_ipes.pkl'
-        if os.path.exists(caminho_ipes_pag):
-            df_ipes_pag = pd.read_pickle(caminho_ipes_pag)
+        if repositorio.existe(caminho_ipes_pag):
+            df_ipes_pag = tx.ler(caminho_ipes_pag)
         else:
             df_ipes_pag = pd.DataFrame()
 
-        if os.path.exists(CAMINHO_MOVIMENTACAO):
-            df_movimentacao = pd.read_pickle(CAMINHO_MOVIMENTACAO)
-        else:
-            df_movimentacao = pd.DataFrame()
-
         if df_ipes_consol.empty:
             return False, "Arquivo ipes_consolidado vazio ou não encontrado."
 
@@ -520,11 +463,6 @@ def registrar_conciliacao_ipes(ids_pendentes, indices_ipes, conta_destino, valor
             'observacoes': ''
         }])
 
-        # Atualiza movimentação
-        df_movimentacao = pd.concat([df_movimentacao, nova_entrada], ignore_index=True)
-        os.makedirs(os.path.dirname(CAMINHO_MOVIMENTACAO) or '.', exist_ok=True)
-        df_movimentacao.to_pickle(CAMINHO_MOVIMENTACAO)
-
         # CORREÇÃO PRINCIPAL: Atualiza status_conciliacao baseado em data/paciente dos recebimentos selecionados
         recebimentos_grouped = recebimentos.groupby(['data_cadastro', 'paciente']).size().reset_index()
         
@@ -561,10 +499,10 @@ def registrar_conciliacao_ipes(ids_pendentes, indices_ipes, conta_destino, valor
                                 df_ipes_pag.loc[mask_idx, 'status_conciliacao'] = 'baixado'
                                 print(f"  Índice {idx} atualizado via indice_arquivo")
                         else:
-                            # Fallback: usa índice direto
-                            if idx < len(df_ipes_pag):
-                                df_ipes_pag.iloc[idx, df_ipes_pag.columns.get_loc('status_conciliacao')] = 'baixado'
-                                print(f"  Índice {idx} atualizado via iloc")
+                            # Fallback: usa o rótulo do índice (preservado entre as partições mensais)
+                            if idx in df_ipes_pag.index:
+                                df_ipes_pag.loc[idx, 'status_conciliacao'] = 'baixado'
+                                print(f"  Índice {idx} atualizado via rótulo do índice")
                     except Exception as e:
                         print(f"  Erro ao atualizar índice {idx}: {e}")
             
@@ -598,21 +536,25 @@ def registrar_conciliacao_ipes(ids_pendentes, indices_ipes, conta_destino, valor
                     except Exception as e:
                         print(f"Erro no método 2 para {paciente_grupo}: {e}")
 
-        # Salva consolidado atualizado
-        df_ipes_consol.to_pickle(CAMINHO_IPES_CONSOLIDADO)
+        # Ledger, consolidado, convenio_ipes.pkl e diferenças são gravados juntos (ou nenhum deles)
+        with tx:
+            tx.anexar_ledger(nova_entrada)
+            tx.gravar(df_ipes_consol, CAMINHO_IPES_CONSOLIDADO)
 
-        # NOVO: Salva também o arquivo convenio_ipes.pkl atualizado
-        if not df_ipes_pag.empty:
-            df_ipes_pag.to_pickle(caminho_ipes_pag)
-            print("Arquivo convenio_ipes.pkl atualizado com novos status")
+            # NOVO: Salva também o arquivo convenio_ipes.pkl atualizado
+            if not df_ipes_pag.empty:
+                tx.gravar(df_ipes_pag, caminho_ipes_pag)
+                print("Arquivo convenio_ipes.pkl atualizado com novos status")
 
-        # Salva diferença se houver
-        if abs(float(valor_pago) - float(valor_pendente)) > 0.01:
-            salvar_diferenca_baixa_ipes(data_recebimento, float(valor_pendente), float(valor_pago))
+            # Salva diferença se houver
+            if abs(float(valor_pago) - float(valor_pendente)) > 0.01:
+                salvar_diferenca_baixa_ipes(data_recebimento, float(valor_pendente), float(valor_pago), transacao=tx)
 
         print("✅ Conciliação IPES concluída com sucesso!")
         return True, f"Conciliação IPES realizada! Valor recebido: R$ {valor_pago:,.2f}"
 
+    except ConflitoVersao:
+        raise
     except Exception as e:
         import traceback
         print(f"\n❌ ERRO na conciliação IPES: {str(e)}")
@@ -629,7 +571,7 @@ def salvar_diferenca_baixa(data_baixa, valor_original, valor_baixado):
     if not os.path.exists(caminho_arquivo):
         df_diferencas = pd.DataFrame(columns=['data_baixa', 'valor_original', 'valor_baixado', 'diferenca'])
     else:
-        df_diferencas = pd.read_pickle(caminho_arquivo)
+        df_diferencas = repositorio.ler_tabela(caminho_arquivo)
     
     # Adiciona nova linha
     diferenca = valor_baixado - valor_original
@@ -642,17 +584,20 @@ def salvar_diferenca_baixa(data_baixa, valor_original, valor_baixado):
     df_diferencas = pd.concat([df_diferencas, pd.DataFrame([nova_linha])], ignore_index=True)
     
     # Salva
-    df_diferencas.to_pickle(caminho_arquivo)
+    repositorio.salvar_tabela(df_diferencas, caminho_arquivo)
 
-def salvar_diferenca_baixa_ipes(data_baixa, valor_original, valor_baixado):
+def salvar_diferenca_baixa_ipes(data_baixa, valor_original, valor_baixado, transacao=None):
     """
     Salva diferença de baixa IPES em arquivo pkl.
+    Se uma transação for informada, a gravação fica preparada nela.
     """
     caminho_arquivo = 'data/diferencas_baixa_ipes.pkl'
     if not os.path.exists(caminho_arquivo):
         df_diferencas = pd.DataFrame(columns=['data_baixa', 'valor_original', 'valor_baixado', 'diferenca'])
+    elif transacao is not None:
+        df_diferencas = transacao.ler(caminho_arquivo)
     else:
-        df_diferencas = pd.read_pickle(caminho_arquivo)
+        df_diferencas = repositorio.ler_tabela(caminho_arquivo)
     diferenca = valor_baixado - valor_original
     nova_linha = {
         'data_baixa': data_baixa,
@@ -661,7 +606,10 @@ def salvar_diferenca_baixa_ipes(data_baixa, valor_original, valor_baixado):
         'diferenca': diferenca
     }
     df_diferencas = pd.concat([df_diferencas, pd.DataFrame([nova_linha])], ignore_index=True)
-    df_diferencas.to_pickle(caminho_arquivo)
+    if transacao is not None:
+        transacao.gravar(df_diferencas, caminho_arquivo)
+    else:
+        repositorio.salvar_tabela(df_diferencas, caminho_arquivo)
 
 # ========== FUNÇÕES AUXILIARES ==========
 
@@ -794,6 +742,7 @@ def calcular_prazo_medio(parcelas_detalhe):
     soma_dias_ponderados = sum(p["dias_antecipacao"] for p in parcelas_detalhe)
     return round(soma_dias_ponderados / len(parcelas_detalhe))
 
+@com_retentativa
 def registrar_antecipacao_cartao(
     ids_rec, 
     indices_trans_arquivo, 
@@ -818,81 +767,48 @@ def registrar_antecipacao_cartao(
         
         data_atual = datetime.now()
         
-        # Carrega arquivos
-        df_pendentes = pd.read_pickle(CAMINHO_PENDENTES)
+        # A transação guarda a versão lida de cada arquivo
+        tx = Transacao()
         
         caminho_cartao = f'data/credito_{cartao.lower()}.pkl'
-        if not os.path.exists(caminho_cartao):
+        if not repositorio.existe(caminho_cartao):
             return False, f"Arquivo de cartão {cartao} não encontrado."
         
-        df_cartao = pd.read_pickle(caminho_cartao)
-        print(f"Total de transações no arquivo {cartao}: {len(df_cartao)}")
-        
-        # Adiciona status se não existir
-        if 'status' not in df_cartao.columns:
-            df_cartao['status'] = 'pendente'
-        
-        print(f"Transações pendentes: {len(df_cartao[df_cartao['status'] == 'pendente'])}")
-        
-        if os.path.exists(CAMINHO_MOVIMENTACAO):
-            df_movimentacao = pd.read_pickle(CAMINHO_MOVIMENTACAO)
-        else:
-            df_movimentacao = pd.DataFrame()
+        # Só os recebimentos selecionados (consulta indexada no backend SQLite)
+        recebimentos = tx.selecionar(CAMINHO_PENDENTES, 'id_pendencia', ids_rec or [])
         
         # 1. Processa recebimentos (se não for parcela antiga)
         if not parcela_antiga and ids_rec:
             for i, id_rec in enumerate(ids_rec):
-                mask = df_pendentes['id_pendencia'] == id_rec
-                if mask.any():
-                    if baixa_parcial and valores_parciais:
-                        valor_baixado = valores_parciais[i]
-                        valor_residual = df_pendentes.loc[mask, 'valor_pendente'].iloc[0] - valor_baixado
-                        
-                        if valor_residual > 0.01:
-                            df_pendentes.loc[mask, 'valor_pendente'] = valor_residual
-                        else:
-                            df_pendentes.loc[mask, 'status'] = 'baixado'
-                            df_pendentes.loc[mask, 'data_baixa'] = data_atual
+                linha = recebimentos[recebimentos['id_pendencia'] == id_rec]
+                if linha.empty:
+                    continue
+                if baixa_parcial and valores_parciais:
+                    valor_baixado = valores_parciais[i]
+                    valor_residual = linha['valor_pendente'].iloc[0] - valor_baixado
+                    
+                    if valor_residual > 0.01:
+                        alteracoes = {'valor_pendente': valor_residual}
                     else:
-                        df_pendentes.loc[mask, 'status'] = 'baixado'
-                        df_pendentes.loc[mask, 'data_baixa'] = data_atual
-            
-            # Salva recebimentos atualizados
-            df_pendentes.to_pickle(CAMINHO_PENDENTES)
+                        alteracoes = {'status': 'baixado', 'data_baixa': data_atual}
+                else:
+                    alteracoes = {'status': 'baixado', 'data_baixa': data_atual}
+                tx.atualizar(CAMINHO_PENDENTES, 'id_pendencia', [id_rec], alteracoes)
         
-        # 2. Marca transações como processadas usando a mesma lógica da conciliação
+        # 2. Marca transações como processadas pelo índice original do arquivo
+        # ('indice_arquivo' de obter_dados_cartao), como na conciliação
         print(f"Atualizando status das transações nos índices: {indices_trans_arquivo}")
+        tx.atualizar(caminho_cartao, None, [int(i) for i in indices_trans_arquivo],
+                     {'status': 'processado', 'data_processamento': data_atual},
+                     padroes={'status': 'pendente'})
 
-        # Carrega o arquivo original NOVAMENTE para garantir que não há dados em cache
-        df_cartao_para_salvar = pd.read_pickle(caminho_cartao)
-
-        # Adiciona a coluna 'status' se ela não existir no arquivo original
-        if 'status' not in df_cartao_para_salvar.columns:
-            df_cartao_para_salvar['status'] = 'pendente'
-
-        # Reseta os índices para garantir que sejam 0,1,2,... (padrão)
-        df_cartao_para_salvar = df_cartao_para_salvar.reset_index(drop=True)
-
-        for idx in indices_trans_arquivo:
-            # Verifica se o índice é válido
-            if idx < len(df_cartao_para_salvar):
-                # Usa .loc para definir o valor baseado no índice
-                df_cartao_para_salvar.loc[idx, 'status'] = 'processado'
-                df_cartao_para_salvar.loc[idx, 'data_processamento'] = data_atual
-                print(f"  Índice {idx} do arquivo original marcado como 'processado'.")
-            else:
-                print(f"  AVISO: Índice {idx} está fora do alcance do arquivo original. Ignorando.")
-
-        # Salva o DataFrame modificado
-        df_cartao_para_salvar.to_pickle(caminho_cartao)
-        
         # 3. Registra movimentações na conta
         novas_movimentacoes = []
         
         # ENTRADA 1: Valor Bruto recebido (entrada positiva)
         entrada_bruto = {
             'data_cadastro': pd.to_datetime(data_atual),
-            'paciente': 'ANTECIPAÇÃO CARTÃO' if parcela_antiga else ', '.join(df_pendentes[df_pendentes['id_pendencia'].isin(ids_rec)]['paciente'].unique()[:3]) + ('...' if len(df_pendentes[df_pendentes['id_pendencia'].isin(ids_rec)]['paciente'].unique()) > 3 else ''),
+            'paciente': 'ANTECIPAÇÃO CARTÃO' if parcela_antiga else ', '.join(recebimentos['paciente'].unique()[:3]) + ('...' if len(recebimentos['paciente'].unique()) > 3 else ''),
             'medico': '',
             'forma_pagamento': f'ANTECIPAÇÃO CARTÃO {cartao.upper()}',
             'convenio': f'Cartão {cartao.upper()}',
@@ -945,15 +861,17 @@ def registrar_antecipacao_cartao(
             novas_movimentacoes.append(pd.DataFrame([entrada_taxa_antecipacao]))
             print(f"  Taxa antecipação debitada da conta {conta_destino}: R$ {abs(taxa_antecipacao_total):.2f}")
         
-        # Atualiza movimentação
-        df_movimentacao = pd.concat([df_movimentacao] + novas_movimentacoes, ignore_index=True)
-        df_movimentacao.to_pickle(CAMINHO_MOVIMENTACAO)
+        # Pendentes, arquivo do cartão e ledger são gravados juntos (ou nenhum deles)
+        with tx:
+            tx.anexar_ledger(novas_movimentacoes)
         
         print(f"\n✅ Antecipação concluída com sucesso")
         print(f"=== FIM ANTECIPAÇÃO ===\n")
         
         return True, f"Antecipação {cartao} registrada com sucesso! Valor líquido: R$ {valor_liquido_final:,.2f}"
         
+    except ConflitoVersao:
+        raise
     except Exception as e:
         import traceback
         print(f"\n❌ ERRO na antecipação: {str(e)}")
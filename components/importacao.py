@@ -1,93 +1,116 @@
 import pandas as pd
+import numpy as np
 import pickle
 import os
+import io
 from datetime import datetime
 import re
-from components.pdf_parser import *
+from components import pdf_parser
+from components import ledger
+from components import repositorio
+from components import particoes
+from components import valores
+from components import planilhas
+from components import cache_importacao
+from components import tarefas
+from components.transacao import Transacao, com_retentativa, ConflitoVersao
 import streamlit as st
-import random
-import string
 
-def gerar_id_aleatorio(tamanho=3):
-    """Gera uma string alfanumérica aleatória."""
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=tamanho))
+def gerar_ids_unicos(chave):
+    """
+    id_unico determinístico para cada linha a partir da chave (data, código,
+    valor, origem...), calculado para a coluna inteira de uma vez.
 
+    Linhas com a mesma chave no mesmo arquivo são numeradas pela ordem em que
+    aparecem, e o sufixo é um hash da chave com essa ocorrência. Reimportar o
+    mesmo arquivo gera os mesmos ids, o que permite reconhecer linhas já gravadas.
+    """
+    chave = chave.astype(str)
+    ocorrencia = chave.groupby(chave, sort=False).cumcount()
+    hashes = pd.util.hash_pandas_object(chave + '#' + ocorrencia.astype(str), index=False)
+    sufixo = (hashes.to_numpy() % np.uint64(10**10)).astype(str)
+    return chave + '_' + pd.Series(sufixo, index=chave.index).str.zfill(10)
 
-def processar_movimento_clinica(arquivo):
-    """Processa o novo formato de arquivo de movimento da clínica."""
-    try:
-        # Lê o arquivo Excel, considerando o cabeçalho na linha 8 (índice 7)
-        df = pd.read_excel(arquivo, header=7)
 
-        # Substitui '-' por NaN para evitar erros de conversão e exclusão de linhas
-        df.replace('-', pd.NA, inplace=True)
-        
-        # Remove linhas de rodapé que são totalmente vazias ou contêm totais
-        df = df.dropna(how='all')
-        df = df[~df['Código'].astype(str).str.contains('Total', na=False)]
+# id_unico gravado antes de gerar_ids_unicos: chave + '_' + 3 caracteres aleatórios
+RX_ID_LEGADO = r'_[a-z0-9]{3}$'
 
-        # Mapeamento de colunas para o novo formato
-        colunas_mapeamento = {
-            'Data Pagamento': 'data',
-            'Descrição': 'descricao',
-            'Forma Pagamento': 'forma_pagamento',
-            'Valor Pago': 'pago',
-            'Código': 'codigo',
-            'Data Cad.': 'data_cadastro',
-            'Nome': 'paciente',
-            'Médico': 'medico',
-            'Unidade': 'unidade',
-            'Convênio': 'convenio',
-            'Serviços': 'servicos',
-            'Total Serviços': 'subtotal',
-            'Total Pago': 'total',
-            'Repassse Médico': 'repasse_medico',
-            'A Pagar': 'a_pagar'
-        }
-        
-        # Renomeia colunas
-        colunas_existentes = {k: v for k, v in colunas_mapeamento.items() if k in df.columns}
-        df = df.rename(columns=colunas_existentes)
-        
-        # Função para converter valores monetários em string para float
-        def converter_valor(valor):
-            if pd.isna(valor) or valor == '':
-                return 0.0
-            # Se o valor já for numérico, retorna como float
-            if isinstance(valor, (int, float)):
-                return float(valor)
-            
-            # Converte para string, remove 'R$', espaços, separador de milhar '.' e troca vírgula ',' por ponto '.'
-            valor_str = str(valor).replace('R$', '').strip().replace('.', '').replace(',', '.')
-            try:
-                return float(valor_str)
-            except (ValueError, TypeError):
-                return 0.0
 
-        # Lista de colunas monetárias a serem convertidas
-        colunas_monetarias = ['pago', 'subtotal', 'total', 'repasse_medico', 'a_pagar']
-        
-        for col in colunas_monetarias:
-            if col in df.columns:
-                df[col] = df[col].apply(converter_valor)
+def adotar_ids_legados(ids_novos, ids_gravados):
+    """
+    ids_novos (de gerar_ids_unicos) trocando pelo id gravado os que correspondem
+    a linhas importadas antes dos ids determinísticos.
+
+    Os ids antigos têm a mesma chave, mas o sufixo aleatório nunca coincide com o
+    novo. A correspondência é pela chave e pela ocorrência dela (como em
+    gerar_ids_unicos); a linha nova fica com o id antigo, a reimportação atualiza
+    a linha gravada em vez de duplicá-la e as referências ao id (recebimentos
+    pendentes, consolidado IPES) continuam valendo.
+    """
+    gravados = pd.Series(ids_gravados, dtype=object).dropna().astype(str)
+    legados = pd.Series(gravados[gravados.str.contains(RX_ID_LEGADO)].unique(), dtype=object)
+    if legados.empty or ids_novos.empty:
+        return ids_novos
+    chave_legado = legados.str[:-4]
+    mapa = pd.Series(legados.to_numpy(), index=pd.MultiIndex.from_arrays(
+        [chave_legado, chave_legado.groupby(chave_legado, sort=False).cumcount()]))
+
+    chave = ids_novos.str[:-11]
+    adotados = mapa.reindex(pd.MultiIndex.from_arrays(
+        [chave, chave.groupby(chave, sort=False).cumcount()])).to_numpy()
+    return ids_novos.where(pd.isna(adotados), adotados)
+
+
+def _ids_gravados(caminho, df_novo):
+    """id_unico das linhas gravadas no período de df_novo (tabelas particionadas: só os meses dele)."""
+    coluna = particoes.coluna_particao(caminho) if particoes.gerencia(caminho) else None
+    inicio = fim = None
+    if coluna in df_novo.columns:
+        datas = pd.to_datetime(df_novo[coluna], errors='coerce')
+        if datas.notna().all():
+            inicio, fim = datas.min(), datas.max()
+    atual = repositorio.ler_periodo(caminho, inicio, fim)
+    return atual['id_unico'] if 'id_unico' in atual.columns else pd.Series(dtype=object)
+
+
+# Mapeamento de colunas do movimento da clínica para o novo formato
+COLUNAS_CLINICA = {
+    'Data Pagamento': 'data',
+    'Descrição': 'descricao',
+    'Forma Pagamento': 'forma_pagamento',
+    'Valor Pago': 'pago',
+    'Código': 'codigo',
+    'Data Cad.': 'data_cadastro',
+    'Nome': 'paciente',
+    'Médico': 'medico',
+    'Unidade': 'unidade',
+    'Convênio': 'convenio',
+    'Serviços': 'servicos',
+    'Total Serviços': 'subtotal',
+    'Total Pago': 'total',
+    'Repassse Médico': 'repasse_medico',
+    'A Pagar': 'a_pagar'
+}
+
+
+def processar_movimento_clinica(arquivo):
+    """Processa o novo formato de arquivo de movimento da clínica."""
+    try:
+        # Lê o arquivo Excel em blocos; o cabeçalho é detectado (normalmente a linha 8, índice 7)
+        df = planilhas.ler_excel(arquivo, cabecalho=7, colunas_esperadas=COLUNAS_CLINICA, fonte='clinica',
+                                 tratar_bloco=_tratar_bloco_clinica)
 
-        # Converte as colunas de data para o formato datetime
-        if 'data' in df.columns:
-            df['data'] = pd.to_datetime(df['data'], dayfirst=True, errors='coerce')
-        if 'data_cadastro' in df.columns:
-            df['data_cadastro'] = pd.to_datetime(df['data_cadastro'], dayfirst=True, errors='coerce')
-                
         # Adiciona identificadores
         df['origem'] = 'clinica'
         df['data_importacao'] = datetime.now()
 
         # GERAÇÃO DE ID ÚNICO
-        df['id_unico'] = (
+        df['id_unico'] = gerar_ids_unicos(
             pd.to_datetime(df['data_cadastro']).dt.strftime('%Y%m%d') + '_' +
             df['codigo'].astype(str) + '_' +
             df['subtotal'].astype(str) + '_' +
             df['origem']
-        ).apply(lambda x: x + '_' + gerar_id_aleatorio())
+        )
               
         return df
         
@@ -95,6 +118,34 @@ def processar_movimento_clinica(arquivo):
         raise Exception(f"Erro ao processar movimento clínica: {str(e)}")
 
 
+def _tratar_bloco_clinica(df):
+    """Rodapés, mapeamento de colunas, valores e datas de um bloco do movimento da clínica."""
+    # Substitui '-' por NaN para evitar erros de conversão e exclusão de linhas
+    df = df.replace('-', pd.NA)
+
+    # Remove linhas de rodapé que são totalmente vazias ou contêm totais
+    df = df.dropna(how='all')
+    df = df[~df['Código'].astype(str).str.contains('Total', na=False)]
+
+    # Renomeia colunas (mapeamento em COLUNAS_CLINICA)
+    colunas_existentes = {k: v for k, v in COLUNAS_CLINICA.items() if k in df.columns}
+    df = df.rename(columns=colunas_existentes)
+    
+    # Lista de colunas monetárias a serem convertidas (inválidos e vazios viram 0.0)
+    colunas_monetarias = ['pago', 'subtotal', 'total', 'repasse_medico', 'a_pagar']
+    
+    for col in colunas_monetarias:
+        if col in df.columns:
+            df[col] = valores.reais(df[col])
+
+    # Converte as colunas de data para o formato datetime
+    if 'data' in df.columns:
+        df['data'] = pd.to_datetime(df['data'], dayfirst=True, errors='coerce')
+    if 'data_cadastro' in df.columns:
+        df['data_cadastro'] = pd.to_datetime(df['data_cadastro'], dayfirst=True, errors='coerce')
+    return df
+
+
 def processar_movimento_laboratorio(arquivo):
     """Processa arquivo de movimento do laboratório"""
     try:
@@ -132,26 +183,9 @@ def processar_movimento_laboratorio(arquivo):
         # Converte colunas monetárias do laboratório (formato "R$ 37,60")
         colunas_monetarias = ['subtotal', 'acrescimo', 'desconto', 'total', 'pago', 'a_pagar']
         
-        def converter_valor_laboratorio(valor):
-            """Converte valores do formato 'R$ 37,60' para float 37.60"""
-            if pd.isna(valor) or valor == '':
-                return 0.0
-            
-            # Converte para string se não for
-            valor_str = str(valor)
-            
-            # Remove 'R$', espaços e converte vírgula para ponto
-            valor_limpo = re.sub(r'[R$\s]', '', valor_str)
-            valor_limpo = valor_limpo.replace(',', '.')
-            
-            try:
-                return float(valor_limpo)
-            except ValueError:
-                return 0.0
-        
         for col in colunas_monetarias:
             if col in df.columns:
-                df[col] = df[col].apply(converter_valor_laboratorio)
+                df[col] = valores.reais(df[col])
         
         # Converte data
         if 'data_cadastro' in df.columns:
@@ -170,107 +204,44 @@ def processar_movimento_laboratorio(arquivo):
         )
 
         # GERAÇÃO DE ID ÚNICO
-        df['id_unico'] = (
+        df['id_unico'] = gerar_ids_unicos(
             pd.to_datetime(df['data_cadastro']).dt.strftime('%Y%m%d') + '_' +
             df['codigo'].astype(str) + '_' +
             df['total'].astype(str) + '_' +
             df['origem']
-        ).apply(lambda x: x + '_' + gerar_id_aleatorio())
+        )
         
         return df
         
     except Exception as e:
         raise Exception(f"Erro ao processar movimento laboratório: {str(e)}")
 
+# Mapeamento de colunas do relatório de convênios detalhado
+COLUNAS_CONVENIOS = {
+    'Data': 'data_cadastro',
+    'Documento': 'documento',
+    'Empresa': 'empresa',
+    'Código': 'codigo',
+    'Exame': 'exame',
+    'Descrição Exame': 'descricao',
+    'Código Exame': 'codigo_exame',
+    'Paciente': 'paciente',
+    'Data Nascimento': 'data_nascimento',
+    'Endereço': 'endereco',
+    'Valor': 'valor',
+    'Unidade': 'unidade',
+    'Local': 'local',
+    'Convênio': 'convenio',
+    'Matricula': 'matricula'
+}
+
+
 def processar_convenios_detalhados(arquivo):
     """Processa arquivo de convênios detalhados"""
     try:
-        # Lê o arquivo Excel
-        df = pd.read_excel(arquivo, header=5)
-        
-        # Mapeamento de colunas
-        colunas_mapeamento = {
-            'Data': 'data_cadastro',
-            'Documento': 'documento',
-            'Empresa': 'empresa',
-            'Código': 'codigo',
-            'Exame': 'exame',
-            'Descrição Exame': 'descricao',
-            'Código Exame': 'codigo_exame',
-            'Paciente': 'paciente',
-            'Data Nascimento': 'data_nascimento',
-            'Endereço': 'endereco',
-            'Valor': 'valor',
-            'Unidade': 'unidade',
-            'Local': 'local',
-            'Convênio': 'convenio',
-            'Matricula': 'matricula'           
-            
-        }
-        
-
-        # Renomeia colunas
-        colunas_existentes = {k: v for k, v in colunas_mapeamento.items() if k in df.columns}
-        df = df.rename(columns=colunas_existentes)
-
-        df = df[df['convenio']=='IPES']
-        
-        # Trata campo codigo_exame: remove pontos e converte para int
-        if 'codigo_exame' in df.columns:
-            def tratar_codigo_exame(valor):
-                """Remove pontos e converte para int, substituindo NaN por 0"""
-                if pd.isna(valor) or valor == '':
-                    return 0
-                
-                # Converte para string e remove pontos
-                valor_str = str(valor).replace('.', '')
-                
-                try:
-                    return int(valor_str)
-                except ValueError:
-                    return 0
-            
-            df['codigo_exame'] = df['codigo_exame'].apply(tratar_codigo_exame)
-
-
-        # Converte coluna de valor (formato com vírgula para separador decimal)
-        def converter_valor_convenio(valor):
-            """Converte valores do formato '123,45' para float 123.45"""
-            if pd.isna(valor) or valor == '':
-                return 0.0
-            
-            # Converte para string se não for
-            valor_str = str(valor)
-            
-            # Se já é um número (float/int), retorna convertido
-            try:
-                if ',' not in valor_str and '.' not in valor_str:
-                    return float(valor_str)
-                elif ',' in valor_str and '.' not in valor_str:
-                    # Formato brasileiro: vírgula como separador decimal
-                    return float(valor_str.replace(',', '.'))
-                elif '.' in valor_str and ',' not in valor_str:
-                    # Formato americano: ponto como separador decimal
-                    return float(valor_str)
-                else:
-                    # Formato com milhares e decimais (ex: 1.234,56 ou 1,234.56)
-                    if valor_str.rfind(',') > valor_str.rfind('.'):
-                        # Formato brasileiro: 1.234,56
-                        valor_limpo = valor_str.replace('.', '').replace(',', '.')
-                    else:
-                        # Formato americano: 1,234.56
-                        valor_limpo = valor_str.replace(',', '')
-                    return float(valor_limpo)
-            except ValueError:
-                return 0.0
-        
-        if 'valor' in df.columns:
-            df['valor'] = df['valor'].apply(converter_valor_convenio)
-        
-        # Converte data
-        if 'data_cadastro' in df.columns:
-            df['data_cadastro'] = pd.to_datetime(df['data_cadastro'], dayfirst=True, errors='coerce')
-            df = df.dropna(subset=['data_cadastro'])
+        # Lê o arquivo Excel em blocos; só as linhas IPES tratadas ficam em memória
+        df = planilhas.ler_excel(arquivo, cabecalho=5, colunas_esperadas=COLUNAS_CONVENIOS,
+                                 fonte='convenio_detalhado', tratar_bloco=_tratar_bloco_convenios)
 
         # Adiciona identificadores
         df['origem'] = 'convenios'
@@ -285,21 +256,177 @@ def processar_convenios_detalhados(arquivo):
             )
 
         # GERAÇÃO DE ID ÚNICO
-        df['id_unico'] = (
+        df['id_unico'] = gerar_ids_unicos(
             pd.to_datetime(df['data_cadastro']).dt.strftime('%Y%m%d') + '_' +
             df['codigo'].astype(str) + '_' +
             df['valor'].astype(str) + '_' +
             df['origem']
-        ).apply(lambda x: x + '_' + gerar_id_aleatorio())
+        )
         
         return df
         
     except Exception as e:
         raise Exception(f"Erro ao processar convênios detalhados: {str(e)}")
 
-def processar_arquivos(arquivo_clinica, arquivo_laboratorio, arquivo_convenio_detalhado, arquivo_convenio_pdf, arquivo_mulvi=None, arquivo_getnet=None):
+
+def _tratar_bloco_convenios(df):
+    """Mapeamento de colunas, filtro IPES, códigos, valores e datas de um bloco de convênios."""
+    # Renomeia colunas (mapeamento em COLUNAS_CONVENIOS)
+    colunas_existentes = {k: v for k, v in COLUNAS_CONVENIOS.items() if k in df.columns}
+    df = df.rename(columns=colunas_existentes)
+
+    df = df[df['convenio']=='IPES']
+    
+    # Trata campo codigo_exame: remove pontos e converte para int (inválidos viram 0)
+    if 'codigo_exame' in df.columns:
+        df['codigo_exame'] = valores.inteiros(df['codigo_exame'])
+
+    # Converte coluna de valor ('123,45', '1.234,56' ou '1,234.56')
+    if 'valor' in df.columns:
+        df['valor'] = valores.reais(df['valor'])
+    
+    # Converte data
+    if 'data_cadastro' in df.columns:
+        df['data_cadastro'] = pd.to_datetime(df['data_cadastro'], dayfirst=True, errors='coerce')
+        df = df.dropna(subset=['data_cadastro'])
+    return df
+
+
+# Fontes da importação: tipo -> (chave no resultado, processador, prefixo da mensagem de erro).
+# Processadores que devolvem (df, mensagem) sinalizam erro com df None; os demais lançam exceção.
+# Nomes com módulo ('pdf_parser.x') são procurados no módulo importado aqui.
+FONTES_IMPORTACAO = {
+    'clinica': ('dados_clinica', 'processar_movimento_clinica', None),
+    'laboratorio': ('dados_laboratorio', 'processar_movimento_laboratorio', None),
+    'convenio_detalhado': ('dados_convenio_detalhado', 'processar_convenios_detalhados', None),
+    'ipes': ('dados_convenios', 'pdf_parser.processar_pdf_convenio_ipes', 'Erro no PDF de convênio'),
+    'mulvi': ('dados_mulvi', 'processar_cartao_credito', 'Erro no arquivo MULVI'),
+    'getnet': ('dados_getnet', 'processar_cartao_detalhado_getnet', 'Erro no arquivo GETNET'),
+}
+
+# Versão dos processadores: aumente ao mudar a leitura de qualquer fonte para
+# invalidar os resultados guardados em components.cache_importacao
+VERSAO_PROCESSADORES = 3
+
+# Processos usados para ler os arquivos em paralelo (0 = um por arquivo, até o nº de CPUs)
+PROCESSOS_IMPORTACAO = int(os.environ.get('SANTASAUDE_PROCESSOS_IMPORTACAO', '0'))
+
+
+def _processar_fonte(tipo, nome, conteudo):
+    """
+    Executa o processador de uma fonte (em um processo do pool).
+    O arquivo chega como bytes, pois o upload do Streamlit não vai para outro processo.
+
+    Returns:
+        tuple: (tipo, DataFrame ou None, mensagem de erro ou None).
+    """
+    import io
+
+    _, processador, prefixo = FONTES_IMPORTACAO[tipo]
+    arquivo = io.BytesIO(conteudo)
+    arquivo.name = nome
+    try:
+        modulo, _, nome = processador.rpartition('.')
+        funcao = getattr(globals()[modulo], nome) if modulo else globals()[nome]
+        retorno = funcao(arquivo)
+    except Exception as e:
+        return tipo, None, str(e)
+    if prefixo is None:
+        return tipo, retorno, None
+    df, mensagem = retorno
+    if df is None:
+        return tipo, None, f"{prefixo}: {mensagem}"
+    return tipo, df, None
+
+
+def _etapa(progresso, nome, fracao=None):
+    """Informa a etapa à tarefa em segundo plano (components.tarefas), se houver uma."""
+    if progresso is not None:
+        progresso.etapa(nome, fracao)
+
+
+def _inicializar_processo_importacao():
+    """
+    Os processos do pool de importação já rodam em paralelo entre si: neles a
+    extração do PDF IPES lê as páginas em sequência, sem abrir outro pool.
+    """
+    pdf_parser.PROCESSOS_PDF = 1
+
+
+def _processar_fontes(arquivos, progresso=None):
+    """
+    Processa as fontes {tipo: arquivo} em paralelo e devolve {tipo: (df, erro)}.
+    Arquivos já processados antes (mesmo conteúdo) vêm do cache de importação.
+    Se o pool de processos não puder ser usado, processa uma fonte por vez.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
+    resultados = {}
+    pendentes = []
+    chaves = {}
+    for tipo, arquivo in arquivos.items():
+        if hasattr(arquivo, 'getvalue'):
+            conteudo = arquivo.getvalue()
+        else:
+            with open(arquivo, 'rb') as f:
+                conteudo = f.read()
+        chaves[tipo] = cache_importacao.chave(conteudo, tipo, VERSAO_PROCESSADORES)
+        df = cache_importacao.obter(chaves[tipo])
+        if df is not None:
+            # Mesmo conteúdo: só a data desta importação muda
+            df['data_importacao'] = datetime.now()
+            resultados[tipo] = (df, None)
+            continue
+        pendentes.append((tipo, getattr(arquivo, 'name', str(arquivo)), conteudo))
+
+    total = len(arquivos)
+    prontos = total - len(pendentes)
+    _etapa(progresso, f"Processando arquivos ({prontos}/{total})", 0.9 * prontos / total if total else 0.9)
+
+    processados = None
+    processos = PROCESSOS_IMPORTACAO or min(len(pendentes), os.cpu_count() or 1)
+    if len(pendentes) > 1 and processos > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=processos,
+                                     initializer=_inicializar_processo_importacao) as pool:
+                futuros = [pool.submit(_processar_fonte, *tarefa) for tarefa in pendentes]
+                processados = []
+                try:
+                    for futuro in as_completed(futuros):
+                        processados.append(futuro.result())
+                        _etapa(progresso, f"Processando arquivos ({prontos + len(processados)}/{total})",
+                               0.9 * (prontos + len(processados)) / total)
+                except BaseException:
+                    # Cancelamento: descarta as fontes que ainda não começaram
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+        except (BrokenProcessPool, OSError, NotImplementedError) as e:
+            print(f"Importação em paralelo indisponível ({e}); processando um arquivo por vez.")
+            processados = None
+    if processados is None:
+        processados = []
+        for t in pendentes:
+            processados.append(_processar_fonte(*t))
+            _etapa(progresso, f"Processando arquivos ({prontos + len(processados)}/{total})",
+                   0.9 * (prontos + len(processados)) / total)
+
+    for tipo, df, erro in processados:
+        if erro is None and df is not None:
+            try:
+                cache_importacao.guardar(chaves[tipo], df)
+            except Exception as e:
+                # Sem cache a importação continua; o arquivo só será processado de novo
+                print(f"Erro ao guardar {tipo} no cache de importação: {e}")
+        resultados[tipo] = (df, erro)
+    return resultados
+
+
+def processar_arquivos(arquivo_clinica, arquivo_laboratorio, arquivo_convenio_detalhado, arquivo_convenio_pdf, arquivo_mulvi=None, arquivo_getnet=None, progresso=None):
     """
     Processa todos os arquivos de importação e JÁ VERIFICA OS CONFLITOS.
+    Os arquivos são independentes e lidos ao mesmo tempo, um processo por arquivo.
+    `progresso` (components.tarefas.Progresso) recebe as etapas quando roda em segundo plano.
     """
     resultado = {
         'sucesso': False,
@@ -310,40 +437,33 @@ def processar_arquivos(arquivo_clinica, arquivo_laboratorio, arquivo_convenio_de
         'dados_mulvi': None,
         'dados_getnet': None,
         'erro': None,
+        'erros': {},  # Erro de cada fonte que falhou
         'conflitos': {}  # Adicionado para armazenar conflitos
     }
     
     try:
-        # --- PASSO 1: PROCESSAR TODOS OS ARQUIVOS ---
-        if arquivo_clinica is not None:
-            resultado['dados_clinica'] = processar_movimento_clinica(arquivo_clinica)
-        if arquivo_laboratorio is not None:
-            resultado['dados_laboratorio'] = processar_movimento_laboratorio(arquivo_laboratorio)
-        if arquivo_convenio_detalhado is not None:
-            resultado['dados_convenio_detalhado'] = processar_convenios_detalhados(arquivo_convenio_detalhado)
-        if arquivo_convenio_pdf:
-            df_convenio_ipes, msg_convenio = processar_pdf_convenio_ipes(arquivo_convenio_pdf)
-            if df_convenio_ipes is not None:
-                resultado['dados_convenios'] = df_convenio_ipes
-            else:
-                resultado['erro'] = f"Erro no PDF de convênio: {msg_convenio}"
-                return resultado
-        if arquivo_mulvi:
-            df_mulvi, msg_mulvi = processar_cartao_credito(arquivo_mulvi)
-            if df_mulvi is not None:
-                resultado['dados_mulvi'] = df_mulvi
-            else:
-                resultado['erro'] = f"Erro no arquivo MULVI: {msg_mulvi}"
-                return resultado
-        if arquivo_getnet:
-            df_getnet, msg_getnet = processar_cartao_detalhado_getnet(arquivo_getnet)
-            if df_getnet is not None:
-                resultado['dados_getnet'] = df_getnet
+        # --- PASSO 1: PROCESSAR TODOS OS ARQUIVOS (EM PARALELO) ---
+        arquivos = {
+            'clinica': arquivo_clinica,
+            'laboratorio': arquivo_laboratorio,
+            'convenio_detalhado': arquivo_convenio_detalhado,
+            'ipes': arquivo_convenio_pdf,
+            'mulvi': arquivo_mulvi,
+            'getnet': arquivo_getnet
+        }
+        arquivos = {tipo: arquivo for tipo, arquivo in arquivos.items() if arquivo}
+        for tipo, (df, erro) in _processar_fontes(arquivos, progresso).items():
+            if erro is not None:
+                resultado['erros'][tipo] = erro
             else:
-                resultado['erro'] = f"Erro no arquivo GETNET: {msg_getnet}"
-                return resultado
+                resultado[FONTES_IMPORTACAO[tipo][0]] = df
+        if resultado['erros']:
+            # Mesma ordem das fontes na tela de importação
+            resultado['erro'] = ' | '.join(resultado['erros'][t] for t in FONTES_IMPORTACAO if t in resultado['erros'])
+            return resultado
 
         # --- PASSO 2: VERIFICAR CONFLITOS IMEDIATAMENTE APÓS O PROCESSAMENTO ---
+        _etapa(progresso, "Verificando datas já importadas", 0.95)
         dados_para_verificar = {
             'clinica': resultado['dados_clinica'],
             'laboratorio': resultado['dados_laboratorio'],
@@ -362,9 +482,14 @@ def processar_arquivos(arquivo_clinica, arquivo_laboratorio, arquivo_convenio_de
         resultado['erro'] = str(e)
         return resultado
 
-def salvar_importacao(df_clinica, df_laboratorio, df_convenio_detalhado, df_convenio_ipes, df_mulvi=None, df_getnet=None):
+# Colunas que a reimportação não sobrescreve (alteradas pelo sistema depois da importação)
+COLUNAS_PRESERVADAS_IMPORTACAO = ('data_importacao', 'status')
+
+
+def salvar_importacao(df_clinica, df_laboratorio, df_convenio_detalhado, df_convenio_ipes, df_mulvi=None, df_getnet=None, progresso=None):
     """
     Salva os dados processados. A verificação de conflitos já foi feita antes.
+    `progresso` (components.tarefas.Progresso) recebe as etapas quando roda em segundo plano.
     """
     resultado = {
         'sucesso': False,
@@ -373,6 +498,7 @@ def salvar_importacao(df_clinica, df_laboratorio, df_convenio_detalhado, df_conv
         'getnet_linhas': 0,
         'erro': None,
         'debitos_registrados': 0,
+        'mesclagem': {},  # tipo -> linhas inseridas/atualizadas/ignoradas
         'consolidacao_ipes': None # Novo campo para retorno do DataFrame consolidado IPES
     }
     try:
@@ -387,29 +513,26 @@ def salvar_importacao(df_clinica, df_laboratorio, df_convenio_detalhado, df_conv
             'getnet': {'df': df_getnet, 'path': 'data/credito_getnet.pkl'}
         }
 
-        for tipo, info in mapa_dados.items():
+        for i, (tipo, info) in enumerate(mapa_dados.items()):
             df_novo = info['df']
             if df_novo is None or df_novo.empty:
                 continue
+            _etapa(progresso, f"Gravando {tipo.replace('_', ' ')}", 0.6 * i / len(mapa_dados))
             
-            caminho = info['path']
-            if os.path.exists(caminho):
-                dados_existentes = pd.read_pickle(caminho)
-                dados_combinados = pd.concat([dados_existentes, df_novo], ignore_index=True)
-            else:
-                dados_combinados = df_novo
-            
-            dados_combinados.to_pickle(caminho)
-            resultado[f'{tipo}_linhas'] = len(df_novo)
+            # Linhas gravadas com o id aleatório antigo: a reimportação usa o id delas
+            if 'id_unico' in df_novo.columns:
+                df_novo['id_unico'] = adotar_ids_legados(df_novo['id_unico'], _ids_gravados(info['path'], df_novo))
+
+            # Upsert por id_unico: só os meses das linhas recebidas são lidos e
+            # reimportar o mesmo arquivo não grava nada
+            contagem = repositorio.mesclar_tabela(df_novo, info['path'], chave='id_unico',
+                                                  preservar=COLUNAS_PRESERVADAS_IMPORTACAO)
+            resultado['mesclagem'][tipo] = contagem
+            resultado[f'{tipo}_linhas'] = contagem['inseridas'] + contagem['atualizadas']
+
+        # --- Bloco 2: Anexar movimentações ao ledger (movimentacao_contas) ---
+        _etapa(progresso, "Registrando movimentações nas contas", 0.6)
 
-        # --- Bloco 2: Atualizar movimentacao_contas.pkl ---
-        
-        caminho_movimentacao = 'data/movimentacao_contas.pkl'
-        if os.path.exists(caminho_movimentacao):
-            df_movimentacao_contas = pd.read_pickle(caminho_movimentacao)
-        else:
-            df_movimentacao_contas = pd.DataFrame()
-        
         # NOVO: Mapeamento atualizado para débito automático
         mapeamento_contas = {
             'Dinheiro': 'DINHEIRO', 
@@ -475,13 +598,15 @@ def salvar_importacao(df_clinica, df_laboratorio, df_convenio_detalhado, df_conv
         
         if novas_movimentacoes:
             df_para_add = pd.concat(novas_movimentacoes, ignore_index=True)
-            df_atualizado = pd.concat([df_movimentacao_contas, df_para_add], ignore_index=True)
-            mask_saldo_inicial = df_atualizado['servicos'] == 'SALDO INICIAL'
-            df_saldos = df_atualizado[mask_saldo_inicial]
-            df_trans = df_atualizado[~mask_saldo_inicial]
-            df_trans.drop_duplicates(subset=['data_cadastro','paciente','servicos','pago'], keep='last', inplace=True)
-            df_final = pd.concat([df_saldos, df_trans], ignore_index=True)
-            df_final.to_pickle(caminho_movimentacao)
+            df_para_add = df_para_add.drop_duplicates(subset=ledger.COLUNAS_CHAVE, keep='last')
+
+            # Descarta apenas as linhas novas que já constam no ledger, pelo índice de
+            # chaves do ledger (sem ler o histórico). Linhas 'SALDO INICIAL' do ledger
+            # não contam como repetição.
+            repetidas = np.isin(ledger.hash_chaves(df_para_add), ledger.chaves())
+            df_para_add = df_para_add[~repetidas | (df_para_add['servicos'] == 'SALDO INICIAL').to_numpy()]
+
+            ledger.append(df_para_add)
         
         # --- NOVO: Bloco 3: Atualizar consolidação IPES se dados relevantes foram importados ---
         dados_ipes_importados = (
@@ -490,8 +615,10 @@ def salvar_importacao(df_clinica, df_laboratorio, df_convenio_detalhado, df_conv
         )
         
         if dados_ipes_importados:
+            _etapa(progresso, "Atualizando consolidação IPES", 0.8)
             try:
-                sucesso_consolidacao, msg_consolidacao = atualizar_consolidacao_ipes()
+                sucesso_consolidacao, msg_consolidacao = atualizar_consolidacao_ipes(
+                    df_clinica, df_convenio_detalhado)
                 resultado['consolidacao_ipes'] = {
                     'sucesso': sucesso_consolidacao,
                     'mensagem': msg_consolidacao
@@ -509,62 +636,85 @@ def salvar_importacao(df_clinica, df_laboratorio, df_convenio_detalhado, df_conv
         resultado['erro'] = str(e)
         return resultado
 
+# Último número da forma de pagamento = quantidade de parcelas
+_RE_PARCELAS = re.compile(r'(\d+)\s*$')
+
+COLUNAS_FORMA_PAGAMENTO = ['forma_pagamento2', 'maquina', 'n_parcelas']
+
+
+def _parse_forma_pagamento(s):
+    """
+    Retorna (forma_pagamento2, maquina, n_parcelas).
+    Ex: 'Cartão de crédito GETNET 6' -> ('Cartão de crédito', 'GETNET', 6)
+    MODIFICADO: Não processa mais débito.
+    """
+    if pd.isna(s):
+        return (s, '', 1)
+    txt = str(s).strip()
+    low = txt.lower()
+    
+    # MODIFICADO: Só processa crédito, débito é ignorado
+    if 'crédito' in low or 'credito' in low:
+        forma2 = 'Cartão de crédito'
+    elif 'cart' in low and 'débito' not in low and 'debito' not in low:
+        forma2 = 'Cartão de crédito'  # default para compatibilidade
+    else:
+        forma2 = txt
+    
+    # Detecta máquina
+    maquina = ''
+    if 'getnet' in txt.upper():
+        maquina = 'GETNET'
+    elif 'mulvi' in txt.upper() or 'mulvipay' in txt.upper() or 'mulvi' in txt.lower():
+        maquina = 'MULVI'
+    # Extrai último número como parcelas, se houver
+    m = _RE_PARCELAS.search(txt)
+    n = int(m.group(1)) if m else 1
+    return (forma2, maquina, n)
+
+
+def _parse_formas_pagamento(serie):
+    """
+    _parse_forma_pagamento para a coluna inteira: cada forma de pagamento distinta
+    é analisada uma única vez e o resultado é distribuído pelas linhas.
+
+    Returns:
+        DataFrame: forma_pagamento2, maquina e n_parcelas, com o índice da série.
+    """
+    codigos, unicos = pd.factorize(serie)
+    analisados = [_parse_forma_pagamento(v) for v in unicos]
+    # Código -1 (vazio) aponta para a última posição: o resultado de um valor nulo
+    analisados.append((np.nan, '', 1))
+    forma2, maquina, parcelas = (np.array(c, dtype=object) for c in zip(*analisados))
+    return pd.DataFrame({
+        'forma_pagamento2': forma2[codigos],
+        'maquina': maquina[codigos],
+        'n_parcelas': parcelas[codigos].astype('int64'),
+    }, index=serie.index)
+
+
+@com_retentativa
 def atualizar_recebimentos_pendentes():
     """
     Atualiza recebimentos pendentes de forma incremental usando id_unico.
     Preserva o status de pendências existentes.
     MODIFICADO: Exclui débitos (que agora são registrados automaticamente nas contas).
+    Se outro usuário gravar os pendentes ao mesmo tempo, o merge é refeito (@com_retentativa).
     """
     try:
         caminho_pendentes = 'data/recebimentos_pendentes.pkl'
+        tx = Transacao()
         
         # Carrega dados de origem
         df_clinica = carregar_dados_atendimentos('clinica')
         df_laboratorio = carregar_dados_atendimentos('laboratorio') 
 
         # Carrega pendentes existentes
-        df_pendentes_existente = pd.read_pickle(caminho_pendentes) if os.path.exists(caminho_pendentes) else pd.DataFrame()
+        df_pendentes_existente = tx.ler(caminho_pendentes) if repositorio.existe(caminho_pendentes) else pd.DataFrame()
 
         # Gera a lista de TODAS as pendências potenciais a partir dos arquivos de origem
         pendencias_potenciais = []
         
-        # --- Helper: parse forma_pagamento para extrair máquina e parcelas ---
-        def _parse_forma_pagamento(s):
-            """
-            Retorna (forma_pagamento2, maquina, n_parcelas).
-            Ex: 'Cartão de crédito GETNET 6' -> ('Cartão de crédito', 'GETNET', 6)
-            MODIFICADO: Não processa mais débito.
-            """
-            if pd.isna(s):
-                return (s, '', 1)
-            txt = str(s).strip()
-            low = txt.lower()
-            
-            # MODIFICADO: Só processa crédito, débito é ignorado
-            if 'crédito' in low or 'credito' in low:
-                forma2 = 'Cartão de crédito'
-            elif 'cart' in low and 'débito' not in low and 'debito' not in low:
-                forma2 = 'Cartão de crédito'  # default para compatibilidade
-            else:
-                forma2 = txt
-            
-            # Detecta máquina
-            maquina = ''
-            if 'getnet' in txt.upper():
-                maquina = 'GETNET'
-            elif 'mulvi' in txt.upper() or 'mulvipay' in txt.upper() or 'mulvi' in txt.lower():
-                maquina = 'MULVI'
-            # Extrai último número como parcelas, se houver
-            n = 1
-            import re
-            m = re.search(r'(\d+)\s*$', txt)
-            if m:
-                try:
-                    n = int(m.group(1))
-                except:
-                    n = 1
-            return (forma2, maquina, n)
-        
         # Processa Clínica
         if not df_clinica.empty and 'forma_pagamento' in df_clinica.columns:
             # MODIFICADO: Exclui débito (apenas crédito vira pendência)
@@ -577,7 +727,7 @@ def atualizar_recebimentos_pendentes():
                 # Origem_recebimento mantém o valor original informado
                 df_pend_clinica['origem_recebimento'] = df_pend_clinica['forma_pagamento']
                 # Novas colunas: forma_pagamento2, maquina, n_parcelas
-                parsed = df_pend_clinica['forma_pagamento'].apply(lambda s: pd.Series(_parse_forma_pagamento(s), index=['forma_pagamento2','maquina','n_parcelas']))
+                parsed = _parse_formas_pagamento(df_pend_clinica['forma_pagamento'])
                 df_pend_clinica = pd.concat([df_pend_clinica, parsed], axis=1)
                 pendencias_potenciais.append(df_pend_clinica[['id_unico', 'data_operacao', 'paciente', 'origem_recebimento', 'valor_pendente', 'origem', 'forma_pagamento', 'forma_pagamento2', 'maquina', 'n_parcelas']])
 
@@ -604,14 +754,17 @@ def atualizar_recebimentos_pendentes():
             df_pend_lab = df_laboratorio[cond_lab].copy()
             if not df_pend_lab.empty:
                 # Para crédito usa 'pago', para convênios usa a_pagar
-                df_pend_lab['valor_pendente'] = df_pend_lab.apply(
-                    lambda r: r['pago'] if 'Cartão' in str(r.get('forma_pagamento','')) and 'crédito' in str(r.get('forma_pagamento','')).lower()
-                    else r.get('a_pagar', 0), axis=1
-                )
+                forma_texto = df_pend_lab['forma_pagamento'].astype(object).astype(str)
+                credito = forma_texto.str.contains('Cartão', regex=False) & \
+                    forma_texto.str.lower().str.contains('crédito', regex=False)
+                a_pagar = df_pend_lab['a_pagar'] if 'a_pagar' in df_pend_lab.columns else 0
+                df_pend_lab['valor_pendente'] = df_pend_lab['pago'].where(credito, a_pagar)
                 df_pend_lab.rename(columns={'data_cadastro': 'data_operacao'}, inplace=True)
-                df_pend_lab['origem_recebimento'] = df_pend_lab.apply(lambda r: r['convenio'] if pd.isna(r.get('forma_pagamento')) or str(r.get('forma_pagamento')).strip() in ['-',''] else r.get('forma_pagamento'), axis=1)
+                sem_forma = df_pend_lab['forma_pagamento'].isna() | forma_texto.str.strip().isin(['-', ''])
+                df_pend_lab['origem_recebimento'] = df_pend_lab['forma_pagamento'].astype(object).where(
+                    ~sem_forma, df_pend_lab['convenio'].astype(object))
                 # Parse forma_pagamento para máquina e parcelas
-                parsed_lab = df_pend_lab['origem_recebimento'].apply(lambda s: pd.Series(_parse_forma_pagamento(s), index=['forma_pagamento2','maquina','n_parcelas']))
+                parsed_lab = _parse_formas_pagamento(df_pend_lab['origem_recebimento'])
                 df_pend_lab = pd.concat([df_pend_lab, parsed_lab], axis=1)
                 pendencias_potenciais.append(df_pend_lab[['id_unico', 'data_operacao', 'paciente', 'origem_recebimento', 'valor_pendente', 'origem', 'forma_pagamento', 'forma_pagamento2', 'maquina', 'n_parcelas']])
 
@@ -644,17 +797,23 @@ def atualizar_recebimentos_pendentes():
 
         # Concatena e salva
         df_final = pd.concat([df_pendentes_existente, df_novos_pendentes], ignore_index=True)
-        df_final.to_pickle(caminho_pendentes)
+        with tx:
+            tx.gravar(df_final, caminho_pendentes)
 
         return True, f"{len(df_novos_pendentes)} novos recebimentos pendentes foram criados."
 
+    except ConflitoVersao:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         return False, f"Erro ao atualizar recebimentos pendentes: {str(e)}"
     
-def carregar_dados_atendimentos(tipo):
-    """Carrega dados de atendimentos salvos (inclui cartões)."""
+def carregar_dados_atendimentos(tipo, inicio=None, fim=None):
+    """
+    Carrega dados de atendimentos salvos (inclui cartões).
+    Com inicio/fim lê apenas o período (pela coluna de data da partição).
+    """
     import streamlit as st
     try:
         arquivo_map = {
@@ -673,8 +832,10 @@ def carregar_dados_atendimentos(tipo):
         
         caminho = arquivo_map.get(tipo)
         
-        if caminho and os.path.exists(caminho):
-            df = pd.read_pickle(caminho)
+        if caminho and repositorio.existe(caminho):
+            if inicio is not None or fim is not None:
+                return repositorio.ler_periodo(caminho, inicio, fim)
+            df = repositorio.ler_tabela(caminho)
             return df
         else:
             return pd.DataFrame()
@@ -687,14 +848,14 @@ def inicializar_movimentacao_contas():
     - Cria com saldos iniciais e novas colunas se não existir.
     - Adiciona as novas colunas se o arquivo existir mas não as contiver.
     """
-    caminho_arquivo = 'data/movimentacao_contas.pkl'
+    caminho_arquivo = ledger.CAMINHO_BASE
     colunas_desejadas = [
         'data_cadastro', 'paciente', 'medico', 'forma_pagamento', 'convenio', 
         'servicos', 'origem', 'pago', 'conta', 'categoria_pagamento', 
         'subcategoria_pagamento', 'observacoes'
     ]
 
-    if not os.path.exists(caminho_arquivo):
+    if not ledger.existe():
         os.makedirs('data', exist_ok=True)
         
         saldos_iniciais = {
@@ -712,20 +873,20 @@ def inicializar_movimentacao_contas():
             })
         
         df_inicial = pd.DataFrame(dados_iniciais, columns=colunas_desejadas)
-        df_inicial.to_pickle(caminho_arquivo)
+        ledger.reescrever(df_inicial)
         print(f"Arquivo '{caminho_arquivo}' criado com saldos iniciais e novas colunas.")
     else:
         # LÓGICA DE MIGRAÇÃO: Verifica se o arquivo existente precisa ser atualizado
-        df_existente = pd.read_pickle(caminho_arquivo)
-        colunas_para_adicionar = False
-        
-        for col in ['categoria_pagamento', 'subcategoria_pagamento', 'observacoes']:
-            if col not in df_existente.columns:
+        # (só os nomes das colunas; o histórico inteiro só é lido se faltar alguma)
+        colunas_existentes = set(ledger.colunas())
+        faltantes = [col for col in ['categoria_pagamento', 'subcategoria_pagamento', 'observacoes']
+                     if col not in colunas_existentes]
+
+        if faltantes:
+            df_existente = ledger.scan()
+            for col in faltantes:
                 df_existente[col] = '' # Adiciona a coluna com valor padrão
-                colunas_para_adicionar = True
-        
-        if colunas_para_adicionar:
-            df_existente.to_pickle(caminho_arquivo)
+            ledger.reescrever(df_existente)
             print(f"Arquivo '{caminho_arquivo}' atualizado com novas colunas.")
 
     return False
@@ -734,19 +895,26 @@ def verificar_conflitos_de_data(dados_processados):
     """
     Verifica se alguma data nos dados processados já existe nos arquivos .pkl salvos.
     Retorna um dicionário com os conflitos encontrados.
+    Consulta o índice de dias presentes do manifesto das partições, sem ler o histórico.
     """
     conflitos = {}
+    # Chaves iguais às de processar_arquivos (dados_para_verificar)
     mapa_arquivos = {
         'clinica': 'data/movimento_clinica.pkl',
         'laboratorio': 'data/movimento_laboratorio.pkl',
-        'convenios': 'data/convenios_detalhados.pkl'
+        'convenio_detalhado': 'data/convenio_detalhado.pkl',
+        'ipes': 'data/convenio_ipes.pkl',
+        'mulvi': 'data/credito_mulvi.pkl',
+        'getnet': 'data/credito_getnet.pkl'
     }
     mapa_coluna_data = {
         'clinica': 'data_cadastro',
         'laboratorio': 'data_cadastro',
-        'convenios': 'data_cadastro',
+        'convenio_detalhado': 'data_cadastro',
         'ipes': 'data_cadastro',
         'mulvi': 'Data_Lançamento',
+        # Não existe no GETNET processado: vendas de datas repetidas são normais
+        # nos relatórios de recebíveis, então o GETNET não é verificado
         'getnet': 'DATA DE VENCIMENTO'
     }
 
@@ -754,63 +922,36 @@ def verificar_conflitos_de_data(dados_processados):
         if df_novo is None or df_novo.empty:
             continue
 
-        # Usa a função centralizada para carregar os dados existentes
-        df_existente = carregar_dados_atendimentos(tipo)
         coluna_data = mapa_coluna_data.get(tipo)
+        if coluna_data not in df_novo.columns:
+            continue
+        datas_novas = pd.to_datetime(df_novo[coluna_data], errors='coerce').dropna()
+        if datas_novas.empty:
+            continue
 
-        if not df_existente.empty and coluna_data in df_existente.columns and coluna_data in df_novo.columns:
-            # Garante que ambas as colunas de data sejam do mesmo tipo para comparação
-            datas_existentes = pd.to_datetime(df_existente[coluna_data]).dt.date
-            datas_novas = pd.to_datetime(df_novo[coluna_data]).dt.date
-            
-            # Encontra as datas em comum
-            datas_conflitantes = set(datas_novas).intersection(set(datas_existentes))
-            
-            if datas_conflitantes:
-                # Formata as datas para exibição
-                conflitos[tipo] = sorted([d.strftime('%d/%m/%Y') for d in datas_conflitantes])
+        # Custo proporcional aos dias distintos do arquivo novo
+        datas_conflitantes = repositorio.datas_presentes(
+            mapa_arquivos[tipo], datas_novas.dt.normalize().unique(), coluna_data
+        )
+        
+        if datas_conflitantes:
+            # Formata as datas para exibição
+            conflitos[tipo] = sorted([d.strftime('%d/%m/%Y') for d in datas_conflitantes])
     
     return conflitos
 
+# Colunas que identificam o cabeçalho do relatório MULVI
+COLUNAS_MULVI = ['Data_Lançamento', 'Data_Transação', 'Tipo_Transação', 'Bandeira', 'NSU',
+                 'ValorBruto', 'ValorLiquido']
+
+
 def processar_cartao_credito(arquivo):
     """Processa arquivo de movimentação do cartão de crédito com regras específicas"""
     try:
-        # Lê o arquivo Excel com cabeçalho na linha 1
-        df = pd.read_excel(arquivo, header=1)
-        
-        # Remove as duas últimas linhas (sempre ignoradas)
-        df = df.iloc[:-2]
-        
-        # Remove linhas vazias
-        df = df.dropna(how='all')
-        
-        # Filtro 1: Remove linhas com 'Aluguel' no Tipo_Transação (case insensitive)
-        if 'Tipo_Transação' in df.columns:
-            df = df[~df['Tipo_Transação'].str.contains('aluguel', case=False, na=False)]
-        
-        # NOVO FILTRO: Remove linhas com 'DÉBITO' no Tipo_Transação
-        if 'Tipo_Transação' in df.columns:
-            df = df[~df['Tipo_Transação'].str.contains('DÉBITO', case=False, na=False)]
-        
-        # Filtro 2: Remove linhas com ValorBruto negativo (que começam com '-R$')
-        if 'ValorBruto' in df.columns:
-            df = df[~df['ValorBruto'].astype(str).str.contains(r'^\-R\$', na=False)]
-        
-        # Conversão de datas
-        for col_data in ['Data_Lançamento', 'Data_Transação']:
-            if col_data in df.columns:
-                df[col_data] = pd.to_datetime(df[col_data], format='%d/%m/%Y', errors='coerce').dt.date
-        
-        # Conversão de valores monetários
-        for col_valor in ['ValorBruto', 'ValorLiquido']:
-            if col_valor in df.columns:
-                df[col_valor] = (df[col_valor]
-                               .astype(str)
-                               .str.replace('R$', '', regex=False)
-                               .str.replace(' ', '', regex=False)
-                               .str.replace(',', '.', regex=False)
-                               .replace('nan', pd.NA))
-                df[col_valor] = pd.to_numeric(df[col_valor], errors='coerce')
+        # Lê o arquivo Excel em blocos, com cabeçalho detectado (normalmente a linha 1) e
+        # sem as duas últimas linhas (sempre ignoradas)
+        df = planilhas.ler_excel(arquivo, cabecalho=1, descartar_finais=2, colunas_esperadas=COLUNAS_MULVI,
+                                 fonte='mulvi', tratar_bloco=_tratar_bloco_mulvi)
         
         # Adiciona colunas padrão do sistema
         df['origem'] = 'cartao_credito_mulvi'
@@ -826,25 +967,55 @@ def processar_cartao_credito(arquivo):
             }).fillna(df['Bandeira'])
 
         # GERAÇÃO DE ID ÚNICO
-        df['id_unico'] = (
+        df['id_unico'] = gerar_ids_unicos(
             pd.to_datetime(df['Data_Lançamento']).dt.strftime('%Y%m%d') + '_' +
             df['NSU'].astype(str) + '_' +
             df['ValorLiquido'].astype(str) + '_' +
             df['origem'] + '_' +
             df['maquina'].astype(str)
-        ).apply(lambda x: x + '_' + gerar_id_aleatorio())
+        )
         
         return df, f"Cartão processado com sucesso! {len(df)} registros válidos."
         
     except Exception as e:
         return None, f"Erro ao processar cartão: {str(e)}"
 
+
+def _tratar_bloco_mulvi(df):
+    """Filtros, datas e valores de um bloco do arquivo do cartão MULVI."""
+    # Remove linhas vazias
+    df = df.dropna(how='all')
+
+    # Filtro 1: Remove linhas com 'Aluguel' no Tipo_Transação (case insensitive)
+    if 'Tipo_Transação' in df.columns:
+        df = df[~df['Tipo_Transação'].str.contains('aluguel', case=False, na=False)]
+    
+    # NOVO FILTRO: Remove linhas com 'DÉBITO' no Tipo_Transação
+    if 'Tipo_Transação' in df.columns:
+        df = df[~df['Tipo_Transação'].str.contains('DÉBITO', case=False, na=False)]
+    
+    # Filtro 2: Remove linhas com ValorBruto negativo (que começam com '-R$')
+    if 'ValorBruto' in df.columns:
+        df = df[~df['ValorBruto'].astype(str).str.contains(r'^\-R\$', na=False)]
+    
+    # Conversão de datas
+    for col_data in ['Data_Lançamento', 'Data_Transação']:
+        if col_data in df.columns:
+            df[col_data] = pd.to_datetime(df[col_data], format='%d/%m/%Y', errors='coerce').dt.date
+    
+    # Conversão de valores monetários
+    for col_valor in ['ValorBruto', 'ValorLiquido']:
+        if col_valor in df.columns:
+            df[col_valor] = valores.reais(df[col_valor], padrao=np.nan)
+    return df
+
+
 def processar_cartao_detalhado_getnet(arquivo):
     """
     Processa arquivo de cartão (GETNET) aba 'Detalhado'
     Regras:
-      - Ignora linhas 1-7 (header=7)
-      - Linha 8 = cabeçalho
+      - Cabeçalho detectado pelas colunas esperadas (normalmente a linha 8, header=7)
+      - Linhas acima do cabeçalho são ignoradas
       - Exclui qualquer linha em que a primeira coluna seja vazia
       - Mantém apenas colunas definidas
       - Converte valores (troca vírgula por ponto e trata negativos e tira R$, se houver)
@@ -859,53 +1030,51 @@ def processar_cartao_detalhado_getnet(arquivo):
     ]
     
     try:
-        df = pd.read_excel(arquivo, sheet_name='ANALITICO', header=7, dtype=str)
-        df = df.dropna(subset=['Cód. Estabelecimento'])
-        df = df.dropna(axis=1, how='all')
-        # Exclui linhas onde a primeira coluna seja vazia
-        primeira_col = df.columns[0]
-        df = df[df[primeira_col].notna()]
-        df = df[df[primeira_col].astype(str).str.strip() != '']
-        # Mantém somente colunas alvo existentes
-        cols_exist = [c for c in COLS_KEEP if c in df.columns]
-        df = df[cols_exist].copy()
-        df.columns = ['cartoes','data_venda','data_prevista_1_pagamento','descricao_lancamento','n_parcelas','valor_bruto','valor_taxa','valor_liquido']
-        if 'cartoes' in df.columns:
-            df = df[~df['cartoes'].str.contains('DÉBITO', case=False, na=False)]
-        # Tratamento de datas
-        if "data_venda" in df.columns:
-            df["data_venda"] = pd.to_datetime(df["data_venda"], dayfirst=True, errors='coerce').dt.date
-        if "data_prevista_1_pagamento" in df.columns:
-            df["data_prevista_1_pagamento"] = pd.to_datetime(df["data_prevista_1_pagamento"], dayfirst=True, errors='coerce').dt.date
-
-        # Conversão de valores monetários
-        for col_valor in ['valor_bruto', 'valor_taxa', 'valor_liquido']:
-            if col_valor in df.columns:
-                df[col_valor] = (df[col_valor]
-                               .astype(str)
-                               .str.replace('R$', '', regex=False)
-                               .str.replace(' ', '', regex=False)
-                               .str.replace(',', '.', regex=False)
-                               .replace('nan', pd.NA))
-                df[col_valor] = pd.to_numeric(df[col_valor], errors='coerce')
+        def tratar_bloco(df):
+            df = df.dropna(subset=['Cód. Estabelecimento'])
+            # Exclui linhas onde a primeira coluna seja vazia
+            # (colunas sem nome no cabeçalho são as vazias da planilha)
+            primeira_col = next((c for c in df.columns if not str(c).startswith('Unnamed:')), df.columns[0])
+            df = df[df[primeira_col].notna()]
+            df = df[df[primeira_col].astype(str).str.strip() != '']
+            # Mantém somente colunas alvo existentes
+            cols_exist = [c for c in COLS_KEEP if c in df.columns]
+            df = df[cols_exist].copy()
+            df.columns = ['cartoes','data_venda','data_prevista_1_pagamento','descricao_lancamento','n_parcelas','valor_bruto','valor_taxa','valor_liquido']
+            if 'cartoes' in df.columns:
+                df = df[~df['cartoes'].str.contains('DÉBITO', case=False, na=False)]
+            # Tratamento de datas
+            if "data_venda" in df.columns:
+                df["data_venda"] = pd.to_datetime(df["data_venda"], dayfirst=True, errors='coerce').dt.date
+            if "data_prevista_1_pagamento" in df.columns:
+                df["data_prevista_1_pagamento"] = pd.to_datetime(df["data_prevista_1_pagamento"], dayfirst=True, errors='coerce').dt.date
+
+            # Conversão de valores monetários
+            for col_valor in ['valor_bruto', 'valor_taxa', 'valor_liquido']:
+                if col_valor in df.columns:
+                    df[col_valor] = valores.reais(df[col_valor], padrao=np.nan)
+            return df
+
+        # Lê a aba em blocos como texto (dtype=str): n_parcelas entra no id_unico como '1', não 1.0
+        df = planilhas.ler_excel(arquivo, cabecalho=7, aba='ANALITICO', tratar_bloco=tratar_bloco,
+                                 como_texto=True, colunas_esperadas=COLS_KEEP + ['Cód. Estabelecimento'],
+                                 fonte='getnet')
 
         df['origem'] = 'cartao_getnet'
         df['data_importacao'] = datetime.now()
         df['status'] = 'pendente'
         # GERAÇÃO DE ID ÚNICO (adaptado para as novas colunas) - CORREÇÃO AQUI
         # Converte valores para string tratando NaN
-        def safe_str(value):
-            if pd.isna(value):
-                return 'nan'
-            return str(value)
+        def safe_str(serie):
+            return serie.where(serie.notna(), 'nan').astype(str)
 
-        df['id_unico'] = (
+        df['id_unico'] = gerar_ids_unicos(
             pd.to_datetime(df["data_prevista_1_pagamento"], errors='coerce').dt.strftime('%Y%m%d').fillna('00000000') + '_' +
-            df["valor_bruto"].apply(safe_str) + '_' +
-            df["n_parcelas"].apply(safe_str) + '_' +
-            df["valor_liquido"].apply(safe_str) + '_' +
+            safe_str(df["valor_bruto"]) + '_' +
+            safe_str(df["n_parcelas"]) + '_' +
+            safe_str(df["valor_liquido"]) + '_' +
             df['origem']
-        ).apply(lambda x: x + '_' + gerar_id_aleatorio())
+        )
         
         return df, f"Cartão GETNET detalhado processado: {len(df)} registros."
     except Exception as e:
@@ -922,6 +1091,7 @@ def excluir_dados_por_data(tipo, datas_para_excluir):
         mapa_info = {
             'clinica': {'path': 'data/movimento_clinica.pkl', 'col': 'data_cadastro'},
             'laboratorio': {'path': 'data/movimento_laboratorio.pkl', 'col': 'data_cadastro'},
+            'convenio_detalhado': {'path': 'data/convenio_detalhado.pkl', 'col': 'data_cadastro'},
             'ipes': {'path': 'data/convenio_ipes.pkl', 'col': 'data_cadastro'},
             'mulvi': {'path': 'data/credito_mulvi.pkl', 'col': 'Data_Lançamento'},
             'getnet': {'path': 'data/credito_getnet.pkl', 'col': 'DATA DE VENCIMENTO'}
@@ -934,44 +1104,189 @@ def excluir_dados_por_data(tipo, datas_para_excluir):
         caminho = info['path']
         coluna_data = info['col']
 
-        if not os.path.exists(caminho):
+        if not repositorio.existe(caminho):
             return True, "Arquivo não existe, nenhuma exclusão necessária."
 
-        df = pd.read_pickle(caminho)
-        if df.empty:
-            return True, "Arquivo vazio, nenhuma exclusão necessária."
-
-        if coluna_data not in df.columns:
+        # Em tabelas particionadas só os meses das datas informadas são regravados
+        try:
+            linhas_excluidas = repositorio.excluir_datas(caminho, coluna_data, datas_para_excluir)
+        except KeyError:
             return False, f"Coluna de data '{coluna_data}' não encontrada no arquivo."
-
-        # Converte a coluna de data do DataFrame para o tipo 'date' para uma comparação segura
-        df[coluna_data] = pd.to_datetime(df[coluna_data]).dt.date
         
-        # Garante que as datas para excluir também sejam do tipo 'date'
-        datas_formatadas = [pd.to_datetime(d).date() for d in datas_para_excluir]
+        return True, f"{linhas_excluidas} registros excluídos com sucesso."
 
-        # Filtra o DataFrame, mantendo apenas as linhas cuja data NÃO está na lista de exclusão
-        df_filtrado = df[~df[coluna_data].isin(datas_formatadas)]
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return False, f"Erro ao excluir dados: {str(e)}"
 
-        # Salva o dataframe modificado, sobrescrevendo o original
-        df_filtrado.to_pickle(caminho)
+CAMINHO_IPES_CONSOLIDADO = 'data/ipes_consolidado.pkl'
+
+# Colunas do consolidado definidas na primeira consolidação de cada linha e
+# mantidas depois (a conciliação altera o status)
+COLUNAS_MANTIDAS_IPES = ['id_pendencia', 'status_conciliacao', 'data_consolidacao']
+
+
+def _coluna(df, nome, padrao):
+    """Coluna do DataFrame ou uma coluna constante, como row.get(nome, padrao)."""
+    return df[nome] if nome in df.columns else pd.Series(padrao, index=df.index)
 
-        linhas_excluidas = len(df) - len(df_filtrado)
-        
-        return True, f"{linhas_excluidas} registros excluídos com sucesso."
+
+def _mapear_ipes(df_clinica, df_convenio_detalhado):
+    """
+    Linhas IPES no formato consolidado (sem id_pendencia e status), a partir das
+    linhas da clínica com convênio IPES e das linhas detalhadas do laboratório.
+    """
+    partes = []
+    if df_clinica is not None and not df_clinica.empty and 'convenio' in df_clinica.columns:
+        c = df_clinica[df_clinica['convenio'].astype(str).str.contains('IPES', case=False, na=False)]
+        if not c.empty:
+            partes.append(pd.DataFrame({
+                'data_cadastro': _coluna(c, 'data_cadastro', None),
+                'paciente': _coluna(c, 'paciente', ''),
+                'codigo': _coluna(c, 'codigo', ''),
+                'codigo_exame': 0,  # Clínica não tem código de exame específico
+                'descricao': _coluna(c, 'servicos', ''),
+                'medico': _coluna(c, 'medico', ''),
+                'unidade': _coluna(c, 'unidade', ''),
+                'valor': _coluna(c, 'subtotal', 0.0),  # Usa subtotal como valor
+                'origem_dados': 'clinica',
+                'convenio': 'IPES',
+                'tipo_procedimento': 'consulta_exame',
+            }))
+
+    # Já está filtrado para IPES na função processar_convenios_detalhados
+    if df_convenio_detalhado is not None and not df_convenio_detalhado.empty:
+        d = df_convenio_detalhado
+        partes.append(pd.DataFrame({
+            'data_cadastro': _coluna(d, 'data_cadastro', None),
+            'paciente': _coluna(d, 'paciente', ''),
+            'codigo': _coluna(d, 'codigo', ''),
+            'codigo_exame': _coluna(d, 'codigo_exame', 0),
+            'descricao': _coluna(d, 'descricao', ''),
+            'medico': '',  # Laboratório não tem médico específico
+            'unidade': _coluna(d, 'unidade', ''),
+            'valor': _coluna(d, 'valor', 0.0),
+            'origem_dados': 'laboratorio_detalhado',
+            'convenio': 'IPES',
+            'tipo_procedimento': 'exame_laboratorio',
+        }))
+
+    if not partes:
+        return pd.DataFrame()
+    # Colunas categóricas das tabelas de origem voltam a texto antes de juntar
+    df = pd.concat([p.astype({col: object for col in p.columns if isinstance(p[col].dtype, pd.CategoricalDtype)})
+                    for p in partes], ignore_index=True)
+    df['data_cadastro'] = pd.to_datetime(df['data_cadastro'], errors='coerce')
+    df = df.dropna(subset=['data_cadastro'])
+    if df.empty:
+        return df
+
+    # Cria indice_paciente para compatibilidade com funções existentes
+    df['indice_paciente'] = df['data_cadastro'].dt.strftime('%Y-%m-%d') + '_' + df['paciente'].astype(str)
+    df['id_unico'] = gerar_ids_unicos(
+        df['data_cadastro'].dt.strftime('%Y%m%d') + '_' +
+        df['codigo'].astype(str) + '_' +
+        df['codigo_exame'].astype(str) + '_' +
+        df['valor'].astype(str) + '_' +
+        df['origem_dados']
+    )
+    return df
+
+
+def _maior_id_pendencia(*dfs):
+    """Maior número PEND_###### já usado nos DataFrames informados."""
+    maior = 0
+    for df in dfs:
+        if df is None or df.empty or 'id_pendencia' not in df.columns:
+            continue
+        ids_num = pd.to_numeric(df['id_pendencia'].astype(str).str.replace(r'[^0-9]', '', regex=True),
+                                errors='coerce').dropna()
+        if not ids_num.empty:
+            maior = max(maior, int(ids_num.max()))
+    return maior
+
+
+def _pendentes_existentes():
+    caminho_pendentes = 'data/recebimentos_pendentes.pkl'
+    if not repositorio.existe(caminho_pendentes):
+        return None
+    try:
+        return repositorio.ler_tabela(caminho_pendentes)
+    except Exception:
+        return None
+
+
+def _completar_novas_ipes(df_novas, ultimo_id):
+    """Gera id_pendencia sequencial e os metadados das linhas que entram no consolidado."""
+    df_novas = df_novas.copy()
+    df_novas['id_pendencia'] = [f"PEND_{ultimo_id + i + 1:06d}" for i in range(len(df_novas))]
+    df_novas['data_consolidacao'] = datetime.now()
+    df_novas['origem'] = 'ipes_consolidado'
+    df_novas['status_conciliacao'] = 'pendente'
+    return df_novas
+
+
+def _mensagem_consolidacao(titulo, df):
+    registros_clinica = int((df['origem_dados'] == 'clinica').sum()) if not df.empty else 0
+    registros_lab = int((df['origem_dados'] == 'laboratorio_detalhado').sum()) if not df.empty else 0
+    return (
+        f"{titulo}\n"
+        f"• Total: {len(df)} registros\n"
+        f"• Clínica: {registros_clinica} registros\n"
+        f"• Laboratório: {registros_lab} registros\n"
+        f"• Arquivo salvo: {CAMINHO_IPES_CONSOLIDADO}"
+    )
+
+
+def consolidar_ipes_incremental(df_clinica=None, df_convenio_detalhado=None):
+    """
+    Acrescenta ao consolidado IPES só as linhas recém-importadas.
+
+    As linhas novas são mapeadas de uma vez (sem iterrows); as que já constam no
+    consolidado (mesmo id_unico, ou o id legado da mesma chave) são ignoradas, e as existentes mantêm id_pendencia
+    e status_conciliacao.
+
+    Returns:
+        tuple: (sucesso: bool, mensagem: str, df_novas: DataFrame ou None)
+    """
+    try:
+        df_mapeado = _mapear_ipes(df_clinica, df_convenio_detalhado)
+        if df_mapeado.empty:
+            return True, "Nenhum registro IPES novo para consolidar", df_mapeado
+
+        with Transacao() as tx:
+            existe = repositorio.existe(CAMINHO_IPES_CONSOLIDADO)
+            df_atual = tx.ler(CAMINHO_IPES_CONSOLIDADO) if existe else pd.DataFrame()
+            if not df_atual.empty and 'id_unico' in df_atual.columns:
+                df_mapeado['id_unico'] = adotar_ids_legados(df_mapeado['id_unico'], df_atual['id_unico'])
+                df_mapeado = df_mapeado[~df_mapeado['id_unico'].isin(df_atual['id_unico'])]
+            if df_mapeado.empty:
+                return True, "Nenhum registro IPES novo para consolidar", df_mapeado
+
+            ultimo_id = _maior_id_pendencia(df_atual, _pendentes_existentes())
+            df_novas = _completar_novas_ipes(
+                df_mapeado.sort_values(['data_cadastro', 'paciente', 'codigo_exame']), ultimo_id)
+            df_consolidado = pd.concat([df_atual, df_novas], ignore_index=True) if not df_atual.empty \
+                else df_novas.reset_index(drop=True)
+            tx.gravar(df_consolidado, CAMINHO_IPES_CONSOLIDADO)
+
+        return True, _mensagem_consolidacao("Consolidação incremental concluída!", df_novas), df_novas
 
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return False, f"Erro ao excluir dados: {str(e)}"
+        return False, f"Erro na consolidação: {str(e)}", None
+
 
 def consolidar_dados_ipes_completo():
     """
     Consolida dados do IPES extraindo transações da clínica (convenio = IPES) 
     e combinando com dados detalhados do laboratório.
     
-    Cria um arquivo unificado 'data/ipes_consolidado.pkl' com todas as transações IPES
-    para uso na conciliação automatizada.
+    Recria o arquivo 'data/ipes_consolidado.pkl' a partir de todas as linhas de
+    origem; linhas que já estavam no consolidado (mesmo id_unico) mantêm
+    id_pendencia e status_conciliacao. Para importações use consolidar_ipes_incremental.
     
     Returns:
         tuple: (sucesso: bool, mensagem: str, df_consolidado: DataFrame ou None)
@@ -979,132 +1294,50 @@ def consolidar_dados_ipes_completo():
     try:
         # Carrega dados da clínica
         try:
-            df_clinica = pd.read_pickle('data/movimento_clinica.pkl')
+            df_clinica = repositorio.ler_tabela('data/movimento_clinica.pkl')
         except:
             df_clinica = pd.DataFrame()
         
         # Carrega dados detalhados do laboratório
         try:
-            df_convenio_detalhado = pd.read_pickle('data/convenio_detalhado.pkl')
+            df_convenio_detalhado = repositorio.ler_tabela('data/convenio_detalhado.pkl')
         except:
             df_convenio_detalhado = pd.DataFrame()
         
         if df_clinica.empty and df_convenio_detalhado.empty:
             return False, "Nenhum dado encontrado nos arquivos de origem", None
         
-        dados_consolidados = []
-        
-        # --- PROCESSA DADOS DA CLÍNICA (CONVENIO = IPES) ---
-        if not df_clinica.empty and 'convenio' in df_clinica.columns:
-            # Filtra apenas registros do IPES
-            df_clinica_ipes = df_clinica[
-                df_clinica['convenio'].str.contains('IPES', case=False, na=False)
-            ].copy()
-            
-            if not df_clinica_ipes.empty:
-                # Mapeia colunas da clínica para o formato consolidado
-                for _, row in df_clinica_ipes.iterrows():
-                    dados_consolidados.append({
-                        'data_cadastro': row.get('data_cadastro'),
-                        'paciente': row.get('paciente', ''),
-                        'codigo': row.get('codigo', ''),
-                        'codigo_exame': 0,  # Clínica não tem código de exame específico
-                        'descricao': row.get('servicos', ''),
-                        'medico': row.get('medico', ''),
-                        'unidade': row.get('unidade', ''),
-                        'valor': row.get('subtotal', 0.0),  # Usa subtotal como valor
-                        'origem_dados': 'clinica',
-                        'convenio': 'IPES',
-                        'tipo_procedimento': 'consulta_exame'
-                    })
-        
-        # --- PROCESSA DADOS DETALHADOS DO LABORATÓRIO ---
-        if not df_convenio_detalhado.empty:
-            # Já está filtrado para IPES na função processar_convenios_detalhados
-            for _, row in df_convenio_detalhado.iterrows():
-                dados_consolidados.append({
-                    'data_cadastro': row.get('data_cadastro'),
-                    'paciente': row.get('paciente', ''),
-                    'codigo': row.get('codigo', ''),
-                    'codigo_exame': row.get('codigo_exame', 0),
-                    'descricao': row.get('descricao', ''),
-                    'medico': '',  # Laboratório não tem médico específico
-                    'unidade': row.get('unidade', ''),
-                    'valor': row.get('valor', 0.0),
-                    'origem_dados': 'laboratorio_detalhado',
-                    'convenio': 'IPES',
-                    'tipo_procedimento': 'exame_laboratorio'
-                })
-        
-        if not dados_consolidados:
+        df_consolidado = _mapear_ipes(df_clinica, df_convenio_detalhado)
+        if df_consolidado.empty:
             return False, "Nenhum dado do IPES encontrado para consolidação", None
-        
-        # Cria DataFrame consolidado
-        df_consolidado = pd.DataFrame(dados_consolidados)
-        
-        # Converte data_cadastro para datetime
-        df_consolidado['data_cadastro'] = pd.to_datetime(df_consolidado['data_cadastro'], errors='coerce')
-        
-        # Remove registros com data inválida
-        df_consolidado = df_consolidado.dropna(subset=['data_cadastro'])
-        
-        # Cria indice_paciente para compatibilidade com funções existentes
-        df_consolidado['indice_paciente'] = (
-            df_consolidado['data_cadastro'].dt.strftime('%Y-%m-%d') + '_' + 
-            df_consolidado['paciente'].astype(str)
-        )
-        
-        # NOVO: Gera ID de pendência sequencial PEND_###### para cada registro
-        # Verifica se já existem pendências para determinar o próximo número
-        max_id = 0
-        caminho_pendentes = 'data/recebimentos_pendentes.pkl'
-        if os.path.exists(caminho_pendentes):
-            try:
-                df_pendentes_existente = pd.read_pickle(caminho_pendentes)
-                if not df_pendentes_existente.empty and 'id_pendencia' in df_pendentes_existente.columns:
-                    ids_num = pd.to_numeric(df_pendentes_existente['id_pendencia'].astype(str).str.replace(r'[^0-9]', '', regex=True), errors='coerce').dropna()
-                    if not ids_num.empty:
-                        max_id = int(ids_num.max())
-            except Exception:
-                max_id = 0
-        
-        df_consolidado['id_pendencia'] = [f"PEND_{max_id + i + 1:06d}" for i in range(len(df_consolidado))]
-        
-        # Gera ID único para cada registro
-        df_consolidado['id_unico'] = (
-            df_consolidado['data_cadastro'].dt.strftime('%Y%m%d') + '_' +
-            df_consolidado['codigo'].astype(str) + '_' +
-            df_consolidado['codigo_exame'].astype(str) + '_' +
-            df_consolidado['valor'].astype(str) + '_' +
-            df_consolidado['origem_dados']
-        ).apply(lambda x: x + '_' + gerar_id_aleatorio())
-        
-        # Adiciona metadados
-        df_consolidado['data_consolidacao'] = datetime.now()
-        df_consolidado['origem'] = 'ipes_consolidado'
-        df_consolidado['status_conciliacao'] = 'pendente'
-        
-        # Ordena por data e paciente
-        df_consolidado = df_consolidado.sort_values(['data_cadastro', 'paciente', 'codigo_exame']).reset_index(drop=True)
-        
-        # Salva arquivo consolidado
-        os.makedirs('data', exist_ok=True)
-        df_consolidado.to_pickle('data/ipes_consolidado.pkl')
-        
-        # Estatísticas
-        total_registros = len(df_consolidado)
-        registros_clinica = len(df_consolidado[df_consolidado['origem_dados'] == 'clinica'])
-        registros_lab = len(df_consolidado[df_consolidado['origem_dados'] == 'laboratorio_detalhado'])
-        
-        mensagem = (
-            f"Consolidação concluída com sucesso!\n"
-            f"• Total: {total_registros} registros\n"
-            f"• Clínica: {registros_clinica} registros\n"
-            f"• Laboratório: {registros_lab} registros\n"
-            f"• Arquivo salvo: data/ipes_consolidado.pkl"
-        )
-        
-        return True, mensagem, df_consolidado
+
+        with Transacao() as tx:
+            existe = repositorio.existe(CAMINHO_IPES_CONSOLIDADO)
+            df_atual = tx.ler(CAMINHO_IPES_CONSOLIDADO) if existe else pd.DataFrame()
+
+            # Reaproveita ids e status das linhas já consolidadas
+            mantidas = [c for c in COLUNAS_MANTIDAS_IPES if c in df_atual.columns]
+            if mantidas and 'id_unico' in df_atual.columns:
+                df_consolidado['id_unico'] = adotar_ids_legados(df_consolidado['id_unico'], df_atual['id_unico'])
+                anteriores = df_atual.drop_duplicates('id_unico').set_index('id_unico')[mantidas]
+                df_consolidado = df_consolidado.join(anteriores, on='id_unico')
+            conhecidas = df_consolidado['id_pendencia'].notna() if 'id_pendencia' in df_consolidado.columns \
+                else pd.Series(False, index=df_consolidado.index)
+
+            ultimo_id = _maior_id_pendencia(df_atual, _pendentes_existentes())
+            df_novas = _completar_novas_ipes(
+                df_consolidado[~conhecidas].sort_values(['data_cadastro', 'paciente', 'codigo_exame']), ultimo_id)
+            df_existentes = df_consolidado[conhecidas].copy()
+            df_existentes['origem'] = 'ipes_consolidado'
+            df_existentes['status_conciliacao'] = _coluna(df_existentes, 'status_conciliacao', 'pendente') \
+                .astype(object).fillna('pendente')
+
+            # Ordena por data e paciente
+            df_consolidado = pd.concat([df_existentes, df_novas]) \
+                .sort_values(['data_cadastro', 'paciente', 'codigo_exame']).reset_index(drop=True)
+            tx.gravar(df_consolidado, CAMINHO_IPES_CONSOLIDADO)
+
+        return True, _mensagem_consolidacao("Consolidação concluída com sucesso!", df_consolidado), df_consolidado
         
     except Exception as e:
         import traceback
@@ -1120,10 +1353,10 @@ def obter_dados_ipes_consolidado():
         DataFrame: Dados consolidados do IPES
     """
     try:
-        caminho_arquivo = 'data/ipes_consolidado.pkl'
+        caminho_arquivo = CAMINHO_IPES_CONSOLIDADO
         
-        if os.path.exists(caminho_arquivo):
-            df = pd.read_pickle(caminho_arquivo)
+        if repositorio.existe(caminho_arquivo):
+            df = repositorio.ler_tabela(caminho_arquivo)
             return df
         else:
             # Se não existe, tenta criar automaticamente
@@ -1137,16 +1370,74 @@ def obter_dados_ipes_consolidado():
         print(f"Erro ao carregar dados consolidados IPES: {e}")
         return pd.DataFrame()
 
-def atualizar_consolidacao_ipes():
+def atualizar_consolidacao_ipes(df_clinica=None, df_convenio_detalhado=None):
     """
     Atualiza a consolidação dos dados IPES.
     Deve ser chamada sempre que novos dados da clínica ou laboratório forem importados.
+    Com as linhas importadas só elas são consolidadas; sem elas (ou sem consolidado
+    ainda) o consolidado é recriado a partir das tabelas de origem.
     
     Returns:
         tuple: (sucesso: bool, mensagem: str)
     """
     try:
-        sucesso, mensagem, _ = consolidar_dados_ipes_completo()
+        importadas = any(df is not None and not df.empty for df in (df_clinica, df_convenio_detalhado))
+        if importadas and repositorio.existe(CAMINHO_IPES_CONSOLIDADO):
+            sucesso, mensagem, _ = consolidar_ipes_incremental(df_clinica, df_convenio_detalhado)
+        else:
+            sucesso, mensagem, _ = consolidar_dados_ipes_completo()
         return sucesso, mensagem
     except Exception as e:
         return False, f"Erro ao atualizar consolidação: {str(e)}"
+
+
+# ========== IMPORTAÇÃO EM SEGUNDO PLANO ==========
+
+def _arquivo_em_memoria(nome, conteudo):
+    """Arquivo enviado como BytesIO com .name, independente da sessão do Streamlit."""
+    arquivo = io.BytesIO(conteudo)
+    arquivo.name = nome
+    return arquivo
+
+
+def _tarefa_processamento(progresso, arquivos):
+    arquivos = {tipo: _arquivo_em_memoria(*arquivo) if arquivo else None for tipo, arquivo in arquivos.items()}
+    return processar_arquivos(arquivos.get('clinica'), arquivos.get('laboratorio'),
+                              arquivos.get('convenio_detalhado'), arquivos.get('ipes'),
+                              arquivos.get('mulvi'), arquivos.get('getnet'), progresso=progresso)
+
+
+def _tarefa_importacao(progresso, dados):
+    resultado = salvar_importacao(dados.get('clinica'), dados.get('laboratorio'), dados.get('convenio_detalhado'),
+                                  dados.get('convenio_ipes'), dados.get('mulvi'), dados.get('credito_getnet'),
+                                  progresso=progresso)
+    resultado['recebimentos'] = None
+    if resultado['sucesso']:
+        progresso.etapa("Atualizando recebimentos pendentes", 0.9)
+        try:
+            resultado['recebimentos'] = atualizar_recebimentos_pendentes()
+        except Exception as e:
+            resultado['recebimentos'] = (False, f"Problema ao atualizar recebimentos: {str(e)}")
+    return resultado
+
+
+def submeter_processamento(arquivos):
+    """
+    Processa os arquivos em segundo plano (processar_arquivos); devolve o id da tarefa.
+
+    Args:
+        arquivos: {tipo: arquivo enviado} com os tipos de FONTES_IMPORTACAO.
+    """
+    conteudos = {tipo: (arquivo.name, arquivo.getvalue()) for tipo, arquivo in arquivos.items() if arquivo}
+    nomes = ', '.join(nome for nome, _ in conteudos.values())
+    return tarefas.submeter('processamento_importacao', _tarefa_processamento, conteudos, descricao=nomes)
+
+
+def submeter_importacao(dados_processados):
+    """
+    Grava os dados processados em segundo plano (salvar_importacao seguido de
+    atualizar_recebimentos_pendentes); devolve o id da tarefa. A gravação não é
+    interrompida no meio: a tarefa só pode ser cancelada enquanto está na fila.
+    """
+    return tarefas.submeter('importacao', _tarefa_importacao, dict(dados_processados), cancelavel=False,
+                            descricao=', '.join(dados_processados))
@@ -0,0 +1,463 @@
+"""
+Livro-razão (ledger) append-only da movimentação de contas.
+
+O histórico consolidado continua em data/movimentacao_contas.pkl (a "base").
+Cada gravação nova vira um pequeno segmento em data/movimentacao_contas_segmentos/,
+então registrar uma movimentação custa O(linhas novas) e não O(histórico).
+De tempos em tempos os segmentos são compactados de volta na base. Antes de
+reescrever, compactar ou apagar, a base e os segmentos ganham um checkpoint de hard
+links (components.wal), para restaurar o histórico de qualquer momento.
+Edições manuais (atualizar_linhas) regravam só as partes com linhas alteradas.
+A importação confere linhas repetidas pelo índice de chaves (chaves()), que
+guarda um hash por linha e só lê os segmentos gravados desde a última consulta.
+
+Uso:
+    from components import ledger
+    ledger.append([{'data_cadastro': ..., 'conta': 'BANESE', 'pago': 10.0}])
+    df = ledger.scan({'conta': 'BANESE'})
+"""
+import os
+import time
+import pickle
+import numpy as np
+import pandas as pd
+from components import repositorio
+from components import travas
+from components import wal
+from components.travas import ConflitoVersao
+
+CAMINHO_BASE = 'data/movimentacao_contas.pkl'
+PASTA_SEGMENTOS = 'data/movimentacao_contas_segmentos'
+# Hash das chaves de cada linha (por base/segmento), para a importação descartar
+# movimentações repetidas sem reler o histórico
+CAMINHO_CHAVES = 'data/movimentacao_contas_chaves.pkl'
+
+# Colunas que identificam uma movimentação importada
+COLUNAS_CHAVE = ['data_cadastro', 'paciente', 'servicos', 'pago']
+
+# Quantidade de segmentos a partir da qual o próximo append compacta tudo na base
+LIMITE_SEGMENTOS = 500
+
+
+def _listar_segmentos():
+    """Retorna os nomes dos segmentos em ordem de gravação."""
+    if not os.path.isdir(PASTA_SEGMENTOS):
+        return []
+    return sorted(n for n in os.listdir(PASTA_SEGMENTOS) if n.endswith('.pkl'))
+
+
+def _novo_nome_segmento():
+    # time_ns garante a ordem cronológica; o pid evita colisão entre processos
+    return f"{time.time_ns():020d}_{os.getpid()}.pkl"
+
+
+def _como_dataframe(registros):
+    if registros is None:
+        return pd.DataFrame()
+    if isinstance(registros, pd.DataFrame):
+        return registros
+    if isinstance(registros, dict):
+        return pd.DataFrame([registros])
+    registros = list(registros)
+    if registros and isinstance(registros[0], pd.DataFrame):
+        return pd.concat(registros, ignore_index=True)
+    return pd.DataFrame(registros)
+
+
+def _gravar_pickle(df, caminho):
+    """Grava em arquivo temporário e renomeia, para nunca deixar um pickle pela metade."""
+    # A base é protegida pela trava do ledger (ver reescrever/compactar); segmentos são imutáveis
+    repositorio.salvar_tabela(df, caminho, versionar=False)
+
+
+def _remover_segmento(nome):
+    repositorio.remover_tabela(os.path.join(PASTA_SEGMENTOS, nome), versionar=False)
+
+
+def _ler_pickle(caminho, compacto=False):
+    # Sem cópia: as partes só são lidas/concatenadas, nunca alteradas
+    return repositorio.ler_tabela(caminho, copiar=False, compacto=compacto)
+
+
+def _aplicar_filtros(df, filtros):
+    """
+    Filtros: {coluna: valor | lista/conjunto de valores | função(Series) -> máscara}.
+    Colunas inexistentes resultam em DataFrame vazio.
+    """
+    mascara = pd.Series(True, index=df.index)
+    for coluna, criterio in filtros.items():
+        if coluna not in df.columns:
+            return df.iloc[0:0]
+        serie = df[coluna]
+        if callable(criterio):
+            mascara &= criterio(serie)
+        elif isinstance(criterio, (list, tuple, set, frozenset, pd.Series, pd.Index)):
+            mascara &= serie.isin(list(criterio))
+        else:
+            mascara &= serie == criterio
+    return df[mascara]
+
+
+def segmentos():
+    """Nomes dos segmentos ainda não compactados, em ordem de gravação."""
+    return _listar_segmentos()
+
+
+def versao_base():
+    """Identifica a versão atual da base (muda a cada reescrita/compactação)."""
+    if not os.path.exists(CAMINHO_BASE):
+        return None
+    st = os.stat(CAMINHO_BASE)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def ler_base(compacto=False):
+    """
+    Lê apenas a base consolidada (sem os segmentos).
+    Com compacto=True devolve o formato de components.esquemas, só para leitura.
+    """
+    if not os.path.exists(CAMINHO_BASE):
+        return pd.DataFrame()
+    if compacto:
+        return _ler_pickle(CAMINHO_BASE, compacto=True)
+    return repositorio.ler_tabela(CAMINHO_BASE)
+
+
+def ler_segmento(nome, compacto=False):
+    """Lê um único segmento (ver ler_base para compacto)."""
+    return _ler_pickle(os.path.join(PASTA_SEGMENTOS, nome), compacto=compacto)
+
+
+def ler_segmentos(nomes):
+    """Lê apenas os segmentos informados, concatenados na ordem dada."""
+    with travas.travar(CAMINHO_BASE, exclusiva=False):
+        partes = [_ler_pickle(os.path.join(PASTA_SEGMENTOS, n)) for n in nomes]
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame()
+    return pd.concat(partes, ignore_index=True)
+
+
+def versao():
+    """
+    Versão do histórico completo: versão da base + segmentos presentes.
+    Como segmentos só são acrescentados, uma versão posterior que mantém a mesma
+    base e contém todos os segmentos anteriores difere apenas por appends.
+    """
+    return (versao_base(), tuple(_listar_segmentos()))
+
+
+def existe():
+    """Indica se já existe algum histórico de movimentação."""
+    return os.path.exists(CAMINHO_BASE) or bool(_listar_segmentos())
+
+
+def append(registros):
+    """
+    Anexa novas movimentações ao ledger sem reescrever o histórico.
+
+    Args:
+        registros: DataFrame, dict, lista de dicts ou lista de DataFrames.
+
+    Returns:
+        int: quantidade de linhas gravadas.
+    """
+    df = _como_dataframe(registros)
+    if df.empty:
+        return 0
+
+    nome, caminho = novo_segmento()
+    df = df.reset_index(drop=True)
+    _gravar_pickle(df, caminho)
+    apos_append(df, nome)
+    return len(df)
+
+
+def novo_segmento():
+    """Reserva o nome e o caminho do próximo segmento (usado também pelas transações)."""
+    os.makedirs(PASTA_SEGMENTOS, exist_ok=True)
+    nome = _novo_nome_segmento()
+    return nome, os.path.join(PASTA_SEGMENTOS, nome)
+
+
+def apos_append(df, nome):
+    """Manutenção executada depois que um segmento novo foi gravado em disco."""
+    from components.contas import aplicar_movimentacoes_saldos
+
+    # Mantém a visão de saldos em dia; se falhar aqui, ela se corrige na próxima leitura
+    aplicar_movimentacoes_saldos(df, nome)
+
+    if len(_listar_segmentos()) > LIMITE_SEGMENTOS:
+        compactar()
+
+
+def scan(filtros=None, colunas=None, com_versao=False):
+    """
+    Lê o histórico completo (base + segmentos) na ordem de gravação.
+
+    Args:
+        filtros (dict): ver _aplicar_filtros.
+        colunas (list): restringe as colunas retornadas.
+        com_versao (bool): retorna também a versão exata do que foi lido
+            (para passar depois a reescrever).
+
+    Returns:
+        DataFrame com índice 0..n-1 (vazio se não houver histórico),
+        ou (DataFrame, versao) se com_versao=True.
+    """
+    # Trava compartilhada: impede que uma compactação apague segmentos no meio da leitura
+    partes = []
+    with travas.travar(CAMINHO_BASE, exclusiva=False):
+        versao_lida = (versao_base(), tuple(_listar_segmentos()))
+        if os.path.exists(CAMINHO_BASE):
+            partes.append(_ler_pickle(CAMINHO_BASE))
+        for nome in versao_lida[1]:
+            partes.append(_ler_pickle(os.path.join(PASTA_SEGMENTOS, nome)))
+
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        df = pd.DataFrame()
+    elif len(partes) == 1:
+        df = partes[0].reset_index(drop=True).copy()
+    else:
+        df = pd.concat(partes, ignore_index=True)
+
+    if filtros and not df.empty:
+        df = _aplicar_filtros(df, filtros)
+    if colunas and not df.empty:
+        df = df[[c for c in colunas if c in df.columns]]
+    return (df, versao_lida) if com_versao else df
+
+
+def colunas():
+    """Colunas presentes no histórico (base + segmentos), sem concatenar nem copiar as linhas."""
+    vistas = {}
+    with travas.travar(CAMINHO_BASE, exclusiva=False):
+        caminhos = [CAMINHO_BASE] if os.path.exists(CAMINHO_BASE) else []
+        caminhos += [os.path.join(PASTA_SEGMENTOS, n) for n in _listar_segmentos()]
+        for caminho in caminhos:
+            vistas.update(dict.fromkeys(_ler_pickle(caminho, compacto=True).columns))
+    return list(vistas)
+
+
+def hash_chaves(df):
+    """
+    Hash (uint64) das COLUNAS_CHAVE de cada linha, com data e valor normalizados
+    (o mesmo registro dá o mesmo hash lido do ledger ou vindo da importação).
+    """
+    if df.empty:
+        return np.empty(0, dtype='uint64')
+    df = df.reindex(columns=COLUNAS_CHAVE)
+    chaves = pd.DataFrame({
+        'data_cadastro': pd.to_datetime(df['data_cadastro'], errors='coerce').astype('datetime64[ns]'),
+        'paciente': df['paciente'].astype(str),
+        'servicos': df['servicos'].astype(str),
+        'pago': pd.to_numeric(df['pago'], errors='coerce').round(2),
+    })
+    return pd.util.hash_pandas_object(chaves, index=False).to_numpy()
+
+
+def _carregar_indice_chaves():
+    """Índice salvo ou None se não existir / estiver corrompido."""
+    if not os.path.exists(CAMINHO_CHAVES):
+        return None
+    try:
+        with open(CAMINHO_CHAVES, 'rb') as f:
+            indice = pickle.load(f)
+        if not {'versao_base', 'base', 'segmentos'} <= set(indice):
+            return None
+        return indice
+    except Exception:
+        return None
+
+
+def _salvar_indice_chaves(indice):
+    os.makedirs(os.path.dirname(CAMINHO_CHAVES) or '.', exist_ok=True)
+    tmp = f"{CAMINHO_CHAVES}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(indice, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, CAMINHO_CHAVES)
+
+
+def chaves():
+    """
+    Hashes (hash_chaves) de todas as linhas do histórico.
+
+    Vem do índice em CAMINHO_CHAVES: só os segmentos gravados depois da última
+    sincronização são lidos. A base só é relida se mudou sem passar por
+    reescrever/compactar (que já regravam o índice), ex.: restauração pelo WAL.
+    """
+    with travas.travar(CAMINHO_BASE, exclusiva=False):
+        versao_lida = versao_base()
+        nomes = _listar_segmentos()
+        indice = _carregar_indice_chaves()
+        alterado = indice is None or indice['versao_base'] != versao_lida
+        if alterado:
+            indice = {'versao_base': versao_lida, 'base': hash_chaves(ler_base()), 'segmentos': {}}
+        for nome in nomes:
+            if nome not in indice['segmentos']:
+                indice['segmentos'][nome] = hash_chaves(ler_segmento(nome))
+                alterado = True
+        if set(indice['segmentos']) - set(nomes):
+            indice['segmentos'] = {n: indice['segmentos'][n] for n in nomes}
+            alterado = True
+    if alterado:
+        _salvar_indice_chaves(indice)
+    return np.concatenate([indice['base'], *indice['segmentos'].values()])
+
+
+def _reiniciar_indice_chaves(df):
+    """Índice de uma base recém-gravada com df e sem segmentos (chamada sob a trava do ledger)."""
+    _salvar_indice_chaves({'versao_base': versao_base(), 'base': hash_chaves(df), 'segmentos': {}})
+
+
+def _atualizar_indice_chaves(alteradas, versao_anterior, renomeados):
+    """Troca no índice os hashes das partes regravadas por atualizar_linhas (sob a trava do ledger)."""
+    indice = _carregar_indice_chaves()
+    if indice is None or indice['versao_base'] != versao_anterior:
+        return   # desatualizado: chaves() refaz na próxima consulta
+    for nome, _, _, novo in alteradas:
+        if nome is None:
+            indice['base'] = hash_chaves(novo)
+        else:
+            indice['segmentos'].pop(nome, None)
+            indice['segmentos'][renomeados[nome]] = hash_chaves(novo)
+    indice['versao_base'] = versao_base()
+    _salvar_indice_chaves(indice)
+
+
+def reescrever(df, versao_esperada=None):
+    """
+    Substitui todo o histórico pelo DataFrame informado (edição manual, migrações).
+    Os segmentos existentes são descartados, pois já estão contidos em df.
+
+    Args:
+        versao_esperada: versão retornada por scan(com_versao=True) ao ler df. Se
+            depois disso outro usuário só acrescentou movimentações, elas são
+            anexadas a df automaticamente; se a base mudou (outra edição ou
+            compactação de conteúdo diferente), lança ConflitoVersao.
+    """
+    from components.contas import reconstruir_saldos
+
+    with travas.travar(CAMINHO_BASE):
+        # Guarda (sem copiar) o histórico atual para restauração em um ponto no tempo
+        wal.checkpoint_ledger()
+        segmentos = _listar_segmentos()
+        df = df.reset_index(drop=True)
+        if versao_esperada is not None:
+            base_lida, segmentos_lidos = versao_esperada
+            novos = [n for n in segmentos if n not in segmentos_lidos]
+            if base_lida != versao_base() or len(segmentos) - len(novos) != len(segmentos_lidos):
+                raise ConflitoVersao(f"{CAMINHO_BASE} foi alterado por outro usuário")
+            if novos:
+                df_novos = ler_segmentos(novos)
+                if not df_novos.empty:
+                    df = pd.concat([df, df_novos], ignore_index=True)
+
+        os.makedirs(os.path.dirname(CAMINHO_BASE) or '.', exist_ok=True)
+        _gravar_pickle(df, CAMINHO_BASE)
+        for nome in segmentos:
+            _remover_segmento(nome)
+        reconstruir_saldos(df, segmentos=[])
+        _reiniciar_indice_chaves(df)
+
+
+def atualizar_linhas(alteracoes, versao_esperada):
+    """
+    Altera linhas já gravadas (edição manual) regravando só a base e/ou os
+    segmentos que as contêm, em vez de reescrever todo o histórico.
+
+    Args:
+        alteracoes (DataFrame): índice = posição da linha em scan(); colunas = valores novos.
+        versao_esperada: versão retornada por scan(com_versao=True) ao ler as posições.
+            Appends posteriores não mudam as posições; qualquer outra mudança
+            lança ConflitoVersao.
+
+    Um segmento alterado ganha um nome novo na mesma posição da ordem de gravação,
+    para que leituras anteriores à edição também deixem de conferir a versão.
+
+    Returns:
+        int: quantidade de linhas alteradas.
+    """
+    from components.contas import substituir_movimentacoes_saldos
+
+    if alteracoes.empty:
+        return 0
+    with travas.travar(CAMINHO_BASE):
+        base_lida, segmentos_lidos = versao_esperada
+        segmentos_lidos = list(segmentos_lidos)
+        if base_lida != versao_base() or _listar_segmentos()[:len(segmentos_lidos)] != segmentos_lidos:
+            raise ConflitoVersao(f"{CAMINHO_BASE} foi alterado por outro usuário")
+
+        partes = [(None, CAMINHO_BASE)] if os.path.exists(CAMINHO_BASE) else []
+        partes += [(n, os.path.join(PASTA_SEGMENTOS, n)) for n in segmentos_lidos]
+        posicoes = alteracoes.index.to_numpy()
+        alteradas = []   # (nome do segmento ou None para a base, caminho, antes, depois)
+        inicio = 0
+        for nome, caminho in partes:
+            df = _ler_pickle(caminho)
+            dentro = (posicoes >= inicio) & (posicoes < inicio + len(df))
+            if dentro.any():
+                novo = df.copy()
+                rotulos = novo.index[posicoes[dentro] - inicio]
+                for coluna in alteracoes.columns:
+                    novo.loc[rotulos, coluna] = alteracoes[coluna].to_numpy()[dentro]
+                alteradas.append((nome, caminho, df, novo))
+            inicio += len(df)
+        if ((posicoes < 0) | (posicoes >= inicio)).any():
+            raise ValueError("Posições de linha fora do histórico lido")
+
+        wal.checkpoint_ledger()
+        versao_anterior = versao_base()
+        renomeados = {}
+        for nome, caminho, _, novo in alteradas:
+            _gravar_pickle(novo, caminho)
+            if nome is not None:
+                # Regrava no lugar e só então renomeia: uma queda no meio não duplica linhas
+                renomeados[nome] = f"{nome[:-4]}_e{time.time_ns()}.pkl"
+                os.replace(caminho, os.path.join(PASTA_SEGMENTOS, renomeados[nome]))
+                repositorio.invalidar(caminho)
+
+        substituir_movimentacoes_saldos([a[2] for a in alteradas], [a[3] for a in alteradas],
+                                        versao_anterior, renomeados)
+        _atualizar_indice_chaves(alteradas, versao_anterior, renomeados)
+    return len(alteracoes)
+
+
+def compactar():
+    """Incorpora os segmentos na base. Retorna quantos segmentos foram compactados."""
+    from components.contas import reconstruir_saldos
+
+    with travas.travar(CAMINHO_BASE):
+        segmentos = _listar_segmentos()
+        if not segmentos:
+            return 0
+        wal.checkpoint_ledger()
+
+        partes = []
+        if os.path.exists(CAMINHO_BASE):
+            partes.append(_ler_pickle(CAMINHO_BASE))
+        for nome in segmentos:
+            partes.append(_ler_pickle(os.path.join(PASTA_SEGMENTOS, nome)))
+        partes = [p for p in partes if not p.empty]
+        df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+        _gravar_pickle(df, CAMINHO_BASE)
+        for nome in segmentos:
+            _remover_segmento(nome)
+        reconstruir_saldos(df, segmentos=[])
+        _reiniciar_indice_chaves(df)
+        return len(segmentos)
+
+
+def apagar():
+    """Remove base e segmentos (usado ao redefinir os saldos iniciais)."""
+    from components.contas import reconstruir_saldos
+
+    with travas.travar(CAMINHO_BASE):
+        wal.checkpoint_ledger()
+        repositorio.remover_tabela(CAMINHO_BASE, versionar=False)
+        for nome in _listar_segmentos():
+            _remover_segmento(nome)
+        reconstruir_saldos(pd.DataFrame(), segmentos=[])
+        _reiniciar_indice_chaves(pd.DataFrame())
@@ -0,0 +1,562 @@
+"""
+Particionamento mensal das tabelas de atendimentos e cartões.
+
+As tabelas abaixo cresciam como um único pickle com todo o histórico, e consultas
+por período, exclusões por data e reimportações de uma semana liam e regravavam o
+arquivo inteiro. Aqui cada tabela vira uma pasta com um pickle por mês:
+
+    data/movimento_clinica_particoes/
+        _manifesto.pkl      partição, linhas, primeira/última data, dias presentes, maior índice
+        2025-08.pkl
+        2025-09.pkl
+        sem_data.pkl        linhas sem data válida na coluna de partição
+
+O restante do sistema continua usando o caminho lógico ('data/movimento_clinica.pkl')
+através de components.repositorio. Leituras por período (repositorio.ler_periodo)
+abrem apenas os meses do intervalo, e as gravações passam por uma Transacao, que
+grava só as partições alteradas e o manifesto de uma vez. A trava e a versão
+(components.travas) são as do caminho lógico.
+
+O manifesto guarda também, por mês, um bitmap dos dias que têm linhas (bit d-1
+para o dia d). Com ele datas_presentes() responde se um dia já foi importado sem
+abrir nenhuma partição; como o manifesto é refeito em toda gravação, o índice
+acompanha importações e exclusões.
+
+Os rótulos do índice são preservados entre partições (indice_arquivo e as baixas
+dependem deles); linhas anexadas recebem rótulos a partir do maior já usado.
+
+Migração dos pickles existentes: é um passo explícito e de mão única (o arquivo
+original fica como '<arquivo>.pre_particoes'). Até ela ser feita, a tabela
+continua sendo lida e gravada como um pickle único:
+    python -m components.particoes --migrar
+Os pickles de data/ são versionados no git; rode a migração na cópia de produção
+dos dados, não em um clone de desenvolvimento (as partições e os demais arquivos
+gerados estão no .gitignore).
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+from components import repositorio
+from components import banco_sql
+from components import esquemas
+from components import travas
+
+# Caminho lógico -> coluna de data usada para particionar
+TABELAS = {
+    'data/movimento_clinica.pkl': 'data_cadastro',
+    'data/movimento_laboratorio.pkl': 'data_cadastro',
+    'data/convenio_detalhado.pkl': 'data_cadastro',
+    'data/convenio_ipes.pkl': 'data_cadastro',
+    'data/credito_mulvi.pkl': 'Data_Lançamento',
+    'data/credito_getnet.pkl': 'data_venda',
+}
+
+NOME_MANIFESTO = '_manifesto.pkl'
+SEM_DATA = 'sem_data'
+
+COLUNAS_MANIFESTO = ['particao', 'linhas', 'inicio', 'fim', 'dias', 'indice_max']
+
+
+def _logico(caminho):
+    alvo = os.path.abspath(caminho)
+    for logico in TABELAS:
+        if os.path.abspath(logico) == alvo:
+            return logico
+    return None
+
+
+def particionavel(caminho):
+    """Indica se o caminho é uma das TABELAS (tabelas do banco SQLite têm precedência)."""
+    return _logico(caminho) is not None and not banco_sql.gerencia(caminho)
+
+
+def gerencia(caminho):
+    """
+    Indica se o caminho é uma tabela particionada: particionável e já migrada, ou
+    ainda sem arquivo nenhum. Um pickle único não migrado continua como está.
+    """
+    return particionavel(caminho) and (existe(caminho) or not os.path.exists(_logico(caminho)))
+
+
+def coluna_particao(caminho):
+    return TABELAS[_logico(caminho)]
+
+
+def pasta(caminho):
+    return os.path.splitext(_logico(caminho))[0] + '_particoes'
+
+
+def caminho_manifesto(caminho):
+    return os.path.join(pasta(caminho), NOME_MANIFESTO)
+
+
+def caminho_particao(caminho, chave):
+    return os.path.join(pasta(caminho), f"{chave}.pkl")
+
+
+def existe(caminho):
+    return os.path.exists(caminho_manifesto(caminho))
+
+
+# ========== DIVISÃO EM MESES ==========
+
+def _datas(df, coluna):
+    if coluna not in df.columns:
+        return pd.Series(pd.NaT, index=df.index)
+    return pd.to_datetime(df[coluna], errors='coerce')
+
+
+def _chaves(df, coluna):
+    """Mês ('AAAA-MM') de cada linha, ou SEM_DATA."""
+    return _datas(df, coluna).dt.strftime('%Y-%m').fillna(SEM_DATA)
+
+
+def chave_mes(data):
+    return pd.Timestamp(data).strftime('%Y-%m')
+
+
+def dividir(df, caminho):
+    """{mês: linhas do mês} mantendo os rótulos originais do índice."""
+    if df is None or df.empty:
+        return {}
+    chaves = _chaves(df, coluna_particao(caminho))
+    return {chave: df[chaves == chave] for chave in sorted(chaves.unique())}
+
+
+def juntar(partes):
+    """Concatena partições na ordem original das linhas (rótulos do índice)."""
+    partes = [p for p in partes if p is not None and not p.empty]
+    if not partes:
+        return pd.DataFrame()
+    df = partes[0].copy() if len(partes) == 1 else pd.concat(partes)
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind='stable')
+    return df
+
+
+def _bitmap_dias(datas):
+    """Bitmap dos dias do mês presentes em datas (bit d-1 para o dia d)."""
+    dias = datas.dropna().dt.day.unique()
+    if len(dias) == 0:
+        return 0
+    return int(np.bitwise_or.reduce(np.left_shift(1, dias.astype('int64') - 1)))
+
+
+def _resumo(parte, chave, coluna):
+    datas = _datas(parte, coluna)
+    indice_max = None
+    if pd.api.types.is_integer_dtype(parte.index.dtype) and len(parte):
+        indice_max = int(parte.index.max())
+    return {'particao': chave, 'linhas': len(parte), 'inicio': datas.min(),
+            'fim': datas.max(), 'dias': _bitmap_dias(datas), 'indice_max': indice_max}
+
+
+# ========== MANIFESTO ==========
+
+def ler_manifesto(caminho):
+    """Manifesto da tabela (DataFrame vazio se ainda não houver partições)."""
+    destino = caminho_manifesto(caminho)
+    if not os.path.exists(destino):
+        return pd.DataFrame(columns=COLUNAS_MANIFESTO)
+    return repositorio.ler_tabela(destino, copiar=False)
+
+
+def _no_periodo(manifesto, inicio, fim):
+    chaves = [c for c in manifesto['particao'] if c != SEM_DATA]
+    if inicio is not None:
+        chaves = [c for c in chaves if c >= chave_mes(inicio)]
+    if fim is not None:
+        chaves = [c for c in chaves if c <= chave_mes(fim)]
+    return chaves
+
+
+def proximo_indice(caminho):
+    manifesto = ler_manifesto(caminho)
+    maiores = pd.to_numeric(manifesto['indice_max'], errors='coerce').dropna()
+    return int(maiores.max()) + 1 if not maiores.empty else 0
+
+
+def intervalo(caminho):
+    """(primeira, última) data da tabela segundo o manifesto, sem ler as partições."""
+    manifesto = ler_manifesto(caminho)
+    inicio = pd.to_datetime(manifesto['inicio'], errors='coerce').min()
+    fim = pd.to_datetime(manifesto['fim'], errors='coerce').max()
+    if pd.isna(inicio) or pd.isna(fim):
+        return None
+    return inicio, fim
+
+
+def datas_presentes(caminho, datas):
+    """
+    Dias de `datas` que já têm linhas na tabela (pela coluna de partição).
+    Usa o bitmap de dias do manifesto: o custo depende só das datas consultadas.
+    Meses de manifestos antigos, sem bitmap, são lidos uma vez e calculados.
+
+    Returns:
+        set: objetos date.
+    """
+    dias = pd.to_datetime(pd.Series(list(datas)), errors='coerce').dropna().dt.normalize().drop_duplicates()
+    if dias.empty or not existe(caminho):
+        return set()
+    manifesto = ler_manifesto(caminho)
+    bitmaps = dict(zip(manifesto['particao'], manifesto['dias'])) if 'dias' in manifesto.columns \
+        else dict.fromkeys(manifesto['particao'])
+    presentes = set()
+    for chave, grupo in dias.groupby(dias.dt.strftime('%Y-%m')):
+        if chave not in bitmaps:
+            continue
+        bitmap = bitmaps[chave]
+        if bitmap is None or pd.isna(bitmap):
+            parte = ler_particoes(caminho, [chave]).get(chave, pd.DataFrame())
+            bitmap = _bitmap_dias(_datas(parte, coluna_particao(caminho)))
+        bitmap = int(bitmap)
+        presentes.update(d.date() for d in grupo if bitmap >> (d.day - 1) & 1)
+    return presentes
+
+
+# ========== LEITURA ==========
+
+def ler_particoes(caminho, chaves):
+    """{mês: DataFrame} das partições existentes entre as chaves informadas."""
+    with travas.travar(caminho, exclusiva=False):
+        existentes = set(ler_manifesto(caminho)['particao'])
+        return {c: repositorio.ler_tabela(caminho_particao(caminho, c))
+                for c in chaves if c in existentes}
+
+
+def ler(caminho, inicio=None, fim=None):
+    """
+    Lê a tabela inteira ou apenas as linhas com a data de partição em [inicio, fim]
+    (datas inclusivas; None deixa o lado aberto). Só os meses do intervalo são abertos.
+
+    Raises:
+        FileNotFoundError: se a tabela ainda não tiver manifesto.
+    """
+    if not existe(caminho):
+        raise FileNotFoundError(caminho)
+    periodo = inicio is not None or fim is not None
+    with travas.travar(caminho, exclusiva=False):
+        manifesto = ler_manifesto(caminho)
+        chaves = _no_periodo(manifesto, inicio, fim) if periodo else list(manifesto['particao'])
+        partes = [repositorio.ler_tabela(caminho_particao(caminho, c), copiar=False) for c in chaves]
+    df = juntar(partes)
+    if periodo and not df.empty:
+        df = df[filtrar_periodo(_datas(df, coluna_particao(caminho)), inicio, fim)]
+    return df
+
+
+def filtrar_periodo(datas, inicio=None, fim=None):
+    """Máscara das datas em [inicio, fim], comparando apenas o dia."""
+    dias = pd.to_datetime(datas, errors='coerce').dt.normalize()
+    mascara = dias.notna()
+    if inicio is not None:
+        mascara &= dias >= pd.Timestamp(inicio).normalize()
+    if fim is not None:
+        mascara &= dias <= pd.Timestamp(fim).normalize()
+    return mascara
+
+
+# ========== GRAVAÇÃO ==========
+
+def _igual(atual, novo):
+    """
+    Compara uma partição em disco com a versão nova. Tolera as diferenças que a
+    concatenação com outros meses introduz (dtypes e colunas só com NaN), para que
+    regravar a tabela inteira não reescreva os meses que não mudaram.
+    """
+    extras = [c for c in novo.columns if c not in atual.columns and novo[c].isna().all()]
+    if extras:
+        novo = novo.drop(columns=extras)
+    if atual.shape != novo.shape or not atual.index.equals(novo.index):
+        return False
+    try:
+        pd.testing.assert_frame_equal(atual, novo, check_dtype=False, check_like=True,
+                                      check_index_type=False, check_column_type=False,
+                                      check_categorical=False)
+    except (AssertionError, TypeError, ValueError):
+        return False
+    return True
+
+
+def preparar(caminho, partes, completo):
+    """
+    Arquivos a gravar para aplicar `partes` ({mês: DataFrame}) à tabela.
+    Chamado pela Transacao com a trava exclusiva do caminho lógico.
+
+    Args:
+        completo: partes é a tabela inteira (meses ausentes saem do manifesto);
+            senão só os meses informados mudam. Partes vazias são removidas.
+
+    Returns:
+        dict: destino -> DataFrame (partições alteradas + manifesto).
+    """
+    coluna = coluna_particao(caminho)
+    manifesto = ler_manifesto(caminho)
+    atuais = set(manifesto['particao'])
+    entradas = {} if completo else {r['particao']: r for r in manifesto.to_dict('records')}
+
+    gravacoes = {}
+    for chave, parte in partes.items():
+        entradas.pop(chave, None)
+        if parte is None or parte.empty:
+            continue
+        entradas[chave] = _resumo(parte, chave, coluna)
+        destino = caminho_particao(caminho, chave)
+        if chave in atuais and _igual(repositorio.ler_tabela(destino, copiar=False), parte):
+            continue
+        gravacoes[destino] = parte
+
+    novo = pd.DataFrame([entradas[c] for c in sorted(entradas)], columns=COLUNAS_MANIFESTO)
+    gravacoes[caminho_manifesto(caminho)] = novo
+    return gravacoes
+
+
+def limpar(caminho):
+    """Apaga partições que saíram do manifesto. Chamado com a trava exclusiva."""
+    diretorio = pasta(caminho)
+    if not os.path.isdir(diretorio):
+        return
+    ativas = {f"{c}.pkl" for c in ler_manifesto(caminho)['particao']}
+    for nome in os.listdir(diretorio):
+        if nome.endswith('.pkl') and nome != NOME_MANIFESTO and nome not in ativas:
+            repositorio.remover_tabela(os.path.join(diretorio, nome), versionar=False)
+
+
+def gravar(df, caminho):
+    """Substitui a tabela inteira; só os meses que mudaram são regravados."""
+    from components.transacao import Transacao
+
+    with Transacao() as tx:
+        tx.gravar(df, caminho)
+
+
+def anexar(df_novo, caminho):
+    """
+    Acrescenta linhas novas regravando apenas os meses em que elas caem.
+    Os rótulos do índice continuam a partir do maior já usado.
+    """
+    from components.transacao import Transacao
+
+    if df_novo is None or df_novo.empty:
+        return 0
+    # Trava durante toda a leitura-alteração-gravação: a versão lida não muda até o commit
+    with travas.travar(caminho):
+        inicio = proximo_indice(caminho)
+        df_novo = df_novo.copy()
+        df_novo.index = pd.RangeIndex(inicio, inicio + len(df_novo))
+        novas = dividir(df_novo, caminho)
+        with Transacao() as tx:
+            atuais = tx.ler_particoes(caminho, novas.keys())
+            tx.gravar_particoes(caminho, {
+                chave: pd.concat([atuais[chave], parte]) if chave in atuais else parte
+                for chave, parte in novas.items()
+            }, operacao=('anexar', {'linhas': df_novo}))
+    return len(df_novo)
+
+
+def separar_mesclagem(atual, df_novo, chave, preservar=()):
+    """
+    Compara as linhas novas com as existentes pela coluna `chave` (junção por hash).
+
+    Args:
+        atual: linhas existentes que podem ter as mesmas chaves (ex.: só os meses
+            das linhas novas).
+        preservar: colunas que nunca são sobrescritas nem comparadas (ex.: status
+            alterado depois da importação).
+
+    Returns:
+        tuple: (linhas a inserir, DataFrame com as colunas a atualizar indexado
+        pelos rótulos existentes, quantidade de linhas idênticas ignoradas).
+    """
+    vazio = df_novo.iloc[0:0]
+    if atual.empty or chave not in atual.columns:
+        return df_novo, vazio, 0
+    ids_atuais = atual[chave].astype(str)
+    rotulos = pd.Series(atual.index, index=ids_atuais)
+    rotulos = rotulos[~rotulos.index.duplicated()]
+    ids_novos = df_novo[chave].astype(str)
+    existente = ids_novos.isin(rotulos.index).to_numpy()
+    if not existente.any():
+        return df_novo, vazio, 0
+
+    comuns = df_novo[existente].copy()
+    comuns.index = pd.Index(rotulos.loc[ids_novos[existente]].to_numpy())
+    anteriores = atual.loc[comuns.index]
+    colunas = [c for c in comuns.columns if c != chave and c not in preservar]
+    diferentes = np.zeros(len(comuns), dtype=bool)
+    for coluna in colunas:
+        novo = comuns[coluna]
+        if coluna not in anteriores.columns:
+            diferentes |= novo.notna().to_numpy()
+            continue
+        antigo = anteriores[coluna]
+        try:
+            igual = (novo == antigo).fillna(False).astype(bool) | (novo.isna() & antigo.isna())
+        except (TypeError, ValueError):
+            igual = novo.astype(str) == antigo.astype(str)
+        diferentes |= ~igual.to_numpy()
+    return df_novo[~existente], comuns.loc[diferentes, colunas], int((~diferentes).sum())
+
+
+def mesclar(df_novo, caminho, chave='id_unico', preservar=()):
+    """
+    Upsert por `chave`: insere as linhas novas, atualiza as que mudaram e ignora
+    as idênticas. Só os meses das linhas recebidas são lidos e só os meses
+    alterados são regravados (reimportar o mesmo arquivo não grava nada).
+
+    Returns:
+        dict: inseridas, atualizadas, ignoradas.
+    """
+    from components.transacao import Transacao
+
+    contagem = {'inseridas': 0, 'atualizadas': 0, 'ignoradas': 0}
+    if df_novo is None or df_novo.empty:
+        return contagem
+    with travas.travar(caminho):
+        meses = dividir(df_novo, caminho).keys()
+        with Transacao() as tx:
+            atuais = tx.ler_particoes(caminho, meses)
+            atual = juntar(atuais.values()) if atuais else pd.DataFrame()
+            inseridas, atualizadas, ignoradas = separar_mesclagem(atual, df_novo, chave, preservar)
+
+            partes = {}
+            if not atualizadas.empty:
+                for mes, parte in atuais.items():
+                    rotulos = atualizadas.index.intersection(parte.index)
+                    if len(rotulos):
+                        parte = parte.copy()
+                        for coluna in atualizadas.columns:
+                            parte.loc[rotulos, coluna] = atualizadas.loc[rotulos, coluna]
+                        partes[mes] = parte
+            if not inseridas.empty:
+                inicio = proximo_indice(caminho)
+                inseridas = inseridas.copy()
+                inseridas.index = pd.RangeIndex(inicio, inicio + len(inseridas))
+                for mes, parte in dividir(inseridas, caminho).items():
+                    base = partes.get(mes, atuais.get(mes))
+                    partes[mes] = pd.concat([base, parte]) if base is not None else parte
+            if partes:
+                tx.gravar_particoes(caminho, partes, operacao=(
+                    'mesclar', {'inseridas': inseridas, 'atualizadas': atualizadas}))
+
+    contagem.update(inseridas=len(inseridas), atualizadas=len(atualizadas), ignoradas=ignoradas)
+    return contagem
+
+
+def excluir_datas(caminho, datas, coluna=None):
+    """
+    Remove as linhas cuja `coluna` (padrão: coluna de partição) cai em um dos dias
+    informados. Pela coluna de partição apenas os meses desses dias são lidos.
+
+    Returns:
+        int: linhas removidas.
+
+    Raises:
+        KeyError: se nenhuma partição lida tiver a coluna.
+    """
+    from components.transacao import Transacao
+
+    coluna = coluna or coluna_particao(caminho)
+    dias = pd.to_datetime(pd.Series(list(datas)), errors='coerce').dropna().dt.normalize()
+    if dias.empty or not existe(caminho):
+        return 0
+    removidas = 0
+    with travas.travar(caminho):
+        if coluna == coluna_particao(caminho):
+            chaves = sorted({chave_mes(d) for d in dias})
+        else:
+            chaves = list(ler_manifesto(caminho)['particao'])
+        with Transacao() as tx:
+            atuais = tx.ler_particoes(caminho, chaves)
+            if atuais and not any(coluna in df.columns for df in atuais.values()):
+                raise KeyError(coluna)
+            partes = {}
+            for chave, df in atuais.items():
+                if coluna not in df.columns:
+                    continue
+                mascara = _datas(df, coluna).dt.normalize().isin(set(dias))
+                if mascara.any():
+                    partes[chave] = df[~mascara]
+                    removidas += int(mascara.sum())
+            if partes:
+                tx.gravar_particoes(caminho, partes, operacao=(
+                    'excluir_datas', {'coluna': coluna, 'datas': list(dias)}))
+    return removidas
+
+
+def remover(caminho):
+    """Apaga manifesto e partições. Chamado com a trava exclusiva."""
+    from components import wal
+
+    diretorio = pasta(caminho)
+    if not os.path.isdir(diretorio):
+        return
+    wal.registrar(caminho, [('remover', {})])
+    # Sem manifesto a tabela deixa de existir, mesmo que a remoção pare no meio
+    repositorio.remover_tabela(caminho_manifesto(caminho), versionar=False)
+    for nome in os.listdir(diretorio):
+        if nome.endswith('.pkl'):
+            repositorio.remover_tabela(os.path.join(diretorio, nome), versionar=False)
+
+
+def tamanho(caminho):
+    """Bytes ocupados em disco pelas partições e pelo manifesto."""
+    diretorio = pasta(caminho)
+    if not os.path.isdir(diretorio):
+        return 0
+    return sum(os.path.getsize(os.path.join(diretorio, n))
+               for n in os.listdir(diretorio) if n.endswith('.pkl'))
+
+
+# ========== MIGRAÇÃO ==========
+
+def pendentes():
+    """Tabelas particionáveis que ainda têm o pickle único (migração não feita ou interrompida)."""
+    return [c for c in TABELAS if particionavel(c) and os.path.exists(c)]
+
+
+def migrar():
+    """
+    Divide em meses os pickles únicos das tabelas particionadas.
+
+    Returns:
+        list: tabelas migradas.
+    """
+    from components.transacao import Transacao
+
+    migradas = []
+    for caminho in pendentes():
+        if existe(caminho):
+            # Partições já gravadas (migração interrompida antes do rename, ou criadas
+            # por uma regravação do caminho lógico): o pickle único é uma cópia antiga
+            try:
+                with travas.travar(caminho):
+                    os.replace(caminho, f"{caminho}.pre_particoes")
+                    repositorio.invalidar(caminho)
+                migradas.append(caminho)
+            except OSError as e:
+                print(f"Erro ao renomear {caminho}: {e}")
+            continue
+        try:
+            with travas.travar(caminho):
+                df = esquemas.expandir(pd.read_pickle(caminho))
+                # Conteúdo igual ao original: o primeiro checkpoint é a base do WAL
+                # (gravar_particoes: até o rename, gerencia() ainda vê o pickle único)
+                with Transacao(registrar_wal=False) as tx:
+                    tx.gravar_particoes(caminho, dividir(df, caminho))
+                os.replace(caminho, f"{caminho}.pre_particoes")
+                repositorio.invalidar(caminho)
+            migradas.append(caminho)
+        except Exception as e:
+            # O pickle original continua no lugar e em uso; a migração pode ser refeita
+            print(f"Erro ao particionar {caminho}: {e}")
+    return migradas
+
+
+if __name__ == "__main__":
+    if '--migrar' in sys.argv:
+        tabelas = migrar()
+        print(f"✅ Tabelas particionadas: {', '.join(tabelas) if tabelas else 'nenhuma'}")
+    else:
+        print("Uso: python -m components.particoes --migrar")
@@ -1,13 +1,38 @@
 import re
+import io
+from collections import namedtuple
 import pdfplumber
 import pandas as pd
 from datetime import datetime
 import os
+from components import repositorio
+
+# PDFs com pelo menos esta quantidade de páginas têm o texto extraído em paralelo
+PAGINAS_PARALELO = int(os.environ.get('SANTASAUDE_PAGINAS_PDF_PARALELO', '40'))
+# Processos da extração em paralelo (0 = um por núcleo)
+PROCESSOS_PDF = int(os.environ.get('SANTASAUDE_PROCESSOS_PDF', '0'))
+
+# Motor de extração do texto das páginas:
+#   'texto'        page.extract_text() (padrão)
+#   'coordenadas'  linhas montadas das caixas dos caracteres (page.chars), com a
+#                  coluna de valor em uma faixa fixa de x (ver _texto_por_coordenadas)
+MODO_EXTRACAO_PDF = os.environ.get('SANTASAUDE_MODO_PDF_IPES', 'texto')
+MODOS_EXTRACAO_PDF = ('texto', 'coordenadas')
+
+# Início (x, em pontos) da coluna de valor do extrato IPES; vazio = calibrado por página
+_faixa_valor = os.environ.get('SANTASAUDE_PDF_IPES_X_VALOR', '')
+X_COLUNA_VALOR = float(_faixa_valor) if _faixa_valor else None
+# Tolerâncias do modo 'coordenadas' (pontos): mesma linha, espaço entre palavras,
+# distância máxima entre o "R" e o "$" separados
+TOLERANCIA_Y = 3.0
+TOLERANCIA_X = 1.5
+FOLGA_R = 20.0
 
 def normalize_line(s: str) -> str:
     if not s:
         return ""
-    return re.sub(r"\s+", " ", s).strip()
+    # str.split() e \s usam a mesma definição de espaço em branco
+    return " ".join(s.split())
 
 RX_SEP1 = re.compile(r'N.? ?Guia ?Operad\.:\s*(\d+)\s+Benefici[áa]rio:\s*([0-9]+)\s*-\s*(.+)$', re.I)
 RX_SEP2 = re.compile(r'Senha:\s*([0-9]+).*?Data\s+Solicit\.:\s*(\d{2}/\d{2}/\d{4})', re.I)
@@ -17,160 +42,344 @@ RX_ROW_START = re.compile(r'^\s*\d+\s+\d{2}\s+\d+\s*-\s*', re.I)
 # Reconhece final de linha completa (tem valor monetário no fim)
 RX_MONEY_END = re.compile(r'R\$\s*[\d\.,]+\s*$', re.I)
 
-def parse_row_buffer(buf: str):
+# Linha da tabela em uma passada: seq, tabela, código do procedimento e, se
+# houver, o primeiro valor "R$ 1.234,56" depois do código
+RX_LINHA = re.compile(r'^\s*(\d+)\s+(\d{2})\s+(\d{8})(?:.*?R\$\s*([\d.,]+))?')
+# Início de registro de procedimento e linha com cara de contexto de beneficiário
+RX_INICIO_PROC = re.compile(r'^\s*\d+\s+\d{2}\s+\d+')
+RX_CONTEXTO_BENEF = re.compile(r'\d{6,}\s*-\s*')
+# Par "código - descrição" da tabela de procedimentos
+RX_PROC = re.compile(r'(?<!\d)(\d{8,9})(?!\d)\s*-\s*([^\n\r]+)', re.I)
+
+def _digitos(texto):
+    return ''.join(ch for ch in texto if ch.isdecimal())
+
+def _valor_cifrao_separado(s):
     """
-    Parser que trata casos onde "R$" se separa e vira apenas "$" com números espalhados
+    Reconstrói o valor quando o "R$" se separou e sobrou só "$" com os números
+    espalhados depois dele. None se não houver "$" ou dígitos suficientes.
     """
-    s = normalize_line(buf)
-
-    # 1) Extrai seq, tabela, procedimento_codigo do início
-    m_inicio = re.match(r'^\s*(\d+)\s+(\d{2})\s+(\d{8})', s)
-    if not m_inicio:
+    pos_cifrao = s.find('$')
+    if pos_cifrao < 0:
         return None
-    
-    seq = int(m_inicio.group(1))
-    tabela = m_inicio.group(2)
-    proc_cod = m_inicio.group(3)
-    
-    # 2) Tenta extrair valor normal primeiro (R$ junto)
-    m_valor = re.search(r'R\$\s*([\d\.,]+)', s)
-    if m_valor:
-        valor = float(m_valor.group(1).replace(".", "").replace(",", "."))
-        return {
-            "seq": seq,
-            "tabela": tabela,
-            "procedimento_codigo": proc_cod,
-            "valor_exec": valor,
-        }
-    
-    # 3) Se não achou "R$", procura por "$" isolado e reconstrói o valor
-    m_cifrao = re.search(r'\$', s)
-    if m_cifrao:
-        # Pega tudo após o "$"
-        parte_pos_cifrao = s[m_cifrao.end():]
-        
-        # Primeiro tenta encontrar vírgula e pegar números ao redor
-        if ',' in parte_pos_cifrao:
-            # Tem vírgula - pega números antes e depois da primeira vírgula
-            pos_virgula = parte_pos_cifrao.find(',')
-            antes_virgula = parte_pos_cifrao[:pos_virgula]
-            depois_virgula = parte_pos_cifrao[pos_virgula+1:]
-            
-            nums_antes = re.findall(r'(\d)', antes_virgula)
-            nums_depois = re.findall(r'(\d)', depois_virgula)
-            
-            if nums_antes and nums_depois:
-                # Junta números antes e depois da vírgula
-                parte_inteira = ''.join(nums_antes)
-                parte_decimal = ''.join(nums_depois[:2])  # máximo 2 casas decimais
-                valor_str = f"{parte_inteira},{parte_decimal}"
-                valor = float(valor_str.replace(",", "."))
-            else:
-                return None
-        else:
-            # Sem vírgula - pega todos os números e assume últimos 2 são centavos
-            nums = re.findall(r'(\d)', parte_pos_cifrao)
-            
-            if len(nums) >= 2:
-                # Assume que os últimos 2 dígitos são centavos
-                parte_inteira = ''.join(nums[:-2]) if len(nums) > 2 else '0'
-                parte_decimal = ''.join(nums[-2:])
-                valor_str = f"{parte_inteira},{parte_decimal}"
-                valor = float(valor_str.replace(",", "."))
-            elif len(nums) == 1:
-                # Apenas um número, assume centavos
-                valor = float("0.0" + nums[0])
-            else:
-                return None
-        
-        return {
-            "seq": seq,
-            "tabela": tabela,
-            "procedimento_codigo": proc_cod,
-            "valor_exec": valor,
-        }
-    
-    # Se não encontrou nem "R$" nem "$", falha
+    # Pega tudo após o "$"
+    parte_pos_cifrao = s[pos_cifrao + 1:]
+
+    # Tem vírgula: números antes e depois da primeira vírgula (máximo 2 casas decimais)
+    pos_virgula = parte_pos_cifrao.find(',')
+    if pos_virgula >= 0:
+        parte_inteira = _digitos(parte_pos_cifrao[:pos_virgula])
+        parte_decimal = _digitos(parte_pos_cifrao[pos_virgula + 1:])[:2]
+        if not parte_inteira or not parte_decimal:
+            return None
+        return float(f"{parte_inteira}.{parte_decimal}")
+
+    # Sem vírgula: os últimos 2 dígitos são centavos; um dígito só também é centavo
+    nums = _digitos(parte_pos_cifrao)
+    if len(nums) >= 2:
+        return float(f"{nums[:-2] or '0'}.{nums[-2:]}")
+    if len(nums) == 1:
+        return float("0.0" + nums)
     return None
 
-def parse_pdf_text_as_table(pdf_path: str):
+def parse_row_buffer(buf: str, normalizado: bool = False):
+    """
+    Parser que trata casos onde "R$" se separa e vira apenas "$" com números espalhados.
+    A linha bem formada sai de um único regex compilado (RX_LINHA); só as linhas
+    sem "R$" passam pela reconstrução do valor. normalizado=True pula a
+    normalização de espaços (buffers montados por parse_paginas_como_tabela).
+    """
+    campos = _campos_linha(buf if normalizado else normalize_line(buf))
+    if campos is None:
+        return None
+    seq, tabela, proc_cod, valor = campos
+    return {
+        "seq": seq,
+        "tabela": tabela,
+        "procedimento_codigo": proc_cod,
+        "valor_exec": valor,
+    }
+
+def _campos_linha(s):
+    """(seq, tabela, procedimento_codigo, valor_exec) de um buffer normalizado, ou None."""
+    # 1) seq, tabela, procedimento_codigo do início e o valor "R$", se houver
+    m = RX_LINHA.match(s)
+    if not m:
+        return None
+
+    if m.group(4) is not None:
+        valor = float(m.group(4).replace(".", "").replace(",", "."))
+    else:
+        # 2) Sem "R$": procura por "$" isolado e reconstrói o valor
+        valor = _valor_cifrao_separado(s)
+        if valor is None:
+            return None
+    return int(m.group(1)), m.group(2), m.group(3), valor
+
+def _conteudo_pdf(pdf_path):
+    if isinstance(pdf_path, (bytes, bytearray)):
+        return bytes(pdf_path)
+    if hasattr(pdf_path, 'getvalue'):
+        return pdf_path.getvalue()
+    if hasattr(pdf_path, 'read'):
+        pdf_path.seek(0)
+        return pdf_path.read()
+    with open(pdf_path, 'rb') as f:
+        return f.read()
+
+# ========== MODO 'coordenadas' ==========
+
+def _linhas_caracteres(chars):
+    """Agrupa os caracteres da página em linhas (posição vertical), cada uma ordenada por x."""
+    linhas = []
+    atual, topo = [], None
+    for c in sorted(chars, key=lambda c: (c['top'], c['x0'])):
+        if topo is not None and c['top'] - topo > TOLERANCIA_Y:
+            linhas.append(sorted(atual, key=lambda c: c['x0']))
+            atual = []
+        if not atual:
+            topo = c['top']
+        atual.append(c)
+    if atual:
+        linhas.append(sorted(atual, key=lambda c: c['x0']))
+    return linhas
+
+def _texto_caracteres(chars):
+    """Texto de uma linha de caracteres, com espaço onde há distância entre eles."""
+    partes = []
+    anterior = None
+    for c in chars:
+        if anterior is not None and c['x0'] - anterior['x1'] > TOLERANCIA_X:
+            partes.append(' ')
+        partes.append(c['text'])
+        anterior = c
+    return ''.join(partes)
+
+def _inicio_coluna_valor(linhas):
+    """
+    x onde começa a coluna de valor na página: o "R" (ou o "$", se o "R" não
+    estiver por perto) mais à esquerda entre as linhas que têm "$".
+    """
+    inicios = []
+    for linha in linhas:
+        cifrao = next((c for c in linha if c['text'] == '$'), None)
+        if cifrao is None:
+            continue
+        letra_r = [c for c in linha if c['text'] in 'Rr' and 0 <= cifrao['x0'] - c['x1'] <= FOLGA_R]
+        inicios.append(max(letra_r, key=lambda c: c['x0'])['x0'] if letra_r else cifrao['x0'])
+    return min(inicios) - 0.5 if inicios else None
+
+# Caracteres aceitos na célula de valor ("R$ 1.234,56")
+_CARACTERES_VALOR = set('R$0123456789.,- ')
+
+def _texto_por_coordenadas(page):
+    """
+    Texto da página montado das caixas dos caracteres (page.chars, já em cache
+    no pdfplumber), sem o page.extract_text(). Tudo o que está na coluna de
+    valor de uma linha vira uma célula só, reescrita como "R$ 1.234,56": o "R"
+    e o "$" separados no PDF não quebram mais o valor.
+    """
+    linhas = _linhas_caracteres(page.chars)
+    x_valor = X_COLUNA_VALOR if X_COLUNA_VALOR is not None else _inicio_coluna_valor(linhas)
+    textos = []
+    for linha in linhas:
+        if x_valor is None:
+            textos.append(_texto_caracteres(linha))
+            continue
+        esquerda = [c for c in linha if c['x0'] < x_valor]
+        celula = [c['text'] for c in linha if c['x0'] >= x_valor]
+        # Só é célula de valor se tiver apenas R, $, dígitos e separadores
+        if not celula or not set(celula) <= _CARACTERES_VALOR:
+            textos.append(_texto_caracteres(linha))
+            continue
+        digitos = ''.join(t for t in celula if t in '0123456789.,')
+        valor = f"R$ {digitos}" if digitos else '$'
+        textos.append(f"{_texto_caracteres(esquerda)} {valor}".strip())
+    return '\n'.join(textos)
+
+def _texto_pagina(page, modo='texto'):
+    if modo == 'coordenadas':
+        return _texto_por_coordenadas(page)
+    return page.extract_text() or ""
+
+def _modo(modo):
+    modo = modo or MODO_EXTRACAO_PDF
+    if modo not in MODOS_EXTRACAO_PDF:
+        raise ValueError(f"Modo de extração de PDF inválido: {modo} (use {', '.join(MODOS_EXTRACAO_PDF)})")
+    return modo
+
+def _iterar_intervalo(pdf, inicio, fim, modo='texto'):
+    """
+    (número da página, texto) das páginas inicio..fim-1 (base 0) de um PDF já
+    aberto, liberando os objetos de cada página assim que o texto é extraído.
+    """
+    for pidx in range(inicio, fim):
+        page = pdf.pages[pidx]
+        texto = _texto_pagina(page, modo)
+        fechar = getattr(page, 'close', None) or getattr(page, 'flush_cache', None)
+        if fechar is not None:
+            fechar()
+        yield pidx + 1, texto
+
+def _textos_intervalo(conteudo, inicio, fim, modo='texto'):
+    """Texto das páginas inicio..fim-1 (base 0); executada nos processos da extração em paralelo."""
+    with pdfplumber.open(io.BytesIO(conteudo)) as pdf:
+        return list(_iterar_intervalo(pdf, inicio, fim, modo))
+
+def iterar_textos_paginas(pdf_path, processos=None, modo=None):
+    """
+    Gera (número da página, texto) na ordem das páginas; os parsers
+    (iterar_registros_ipes etc.) consomem cada página assim que ela chega.
+    Aceita caminho, bytes ou arquivo aberto/BytesIO. `modo` escolhe o motor de
+    extração (MODOS_EXTRACAO_PDF; padrão MODO_EXTRACAO_PDF).
+
+    Em sequência, uma página por vez é mantida em memória (PDFs enormes).
+    PDFs com PAGINAS_PARALELO páginas ou mais são divididos em faixas de páginas
+    extraídas em processos separados (PROCESSOS_PDF); cada faixa é entregue
+    assim que ela e as anteriores ficam prontas. O único estado entre páginas
+    (guia/beneficiário/senha) fica com os parsers, que as percorrem em ordem.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    modo = _modo(modo)
+    conteudo = _conteudo_pdf(pdf_path)
+    with pdfplumber.open(io.BytesIO(conteudo)) as pdf:
+        total = len(pdf.pages)
+        processos = processos or PROCESSOS_PDF or (os.cpu_count() or 1)
+        processos = min(processos, total)
+        if total < PAGINAS_PARALELO or processos <= 1:
+            yield from _iterar_intervalo(pdf, 0, total, modo)
+            return
+
+    tamanho = -(-total // processos)
+    faixas = [(inicio, min(inicio + tamanho, total)) for inicio in range(0, total, tamanho)]
+    entregues = 0
+    try:
+        with ProcessPoolExecutor(max_workers=len(faixas)) as pool:
+            futuros = [pool.submit(_textos_intervalo, conteudo, inicio, fim, modo) for inicio, fim in faixas]
+            for (_, fim), futuro in zip(faixas, futuros):
+                yield from futuro.result()
+                entregues = fim
+    except (BrokenProcessPool, OSError, NotImplementedError) as e:
+        # Ex.: ambiente que não permite criar processos. Nos processos da importação
+        # PROCESSOS_PDF já é 1 (importacao._inicializar_processo_importacao)
+        print(f"Extração do PDF em paralelo indisponível ({e}); lendo as páginas em sequência.")
+        with pdfplumber.open(io.BytesIO(conteudo)) as pdf:
+            yield from _iterar_intervalo(pdf, entregues, total, modo)
+
+def textos_paginas(pdf_path, processos=None, modo=None):
+    """
+    Texto de cada página do PDF como [(número da página, texto)] (ver
+    iterar_textos_paginas). page.extract_text() é a parte cara da leitura: use
+    a lista quando o mesmo texto passar por mais de um parser.
+    """
+    return list(iterar_textos_paginas(pdf_path, processos=processos, modo=modo))
+
+def parse_pdf_text_as_table(pdf_path: str, modo=None):
     """
     Extrai dados do PDF de convênio IPES e retorna DataFrame processado
     """
-    registros = []
-    falhas = []
+    return parse_paginas_como_tabela(textos_paginas(pdf_path, modo=modo))
 
-    contexto = {
-        "guia_operadora": None,
-        "beneficiario_codigo": None,
-        "beneficiario_nome": None,
-        "senha": None,
-        "data_solicitacao": None,
-    }
+# Campos de cada registro da tabela IPES (contexto da guia + linha + origem)
+RegistroIPES = namedtuple('RegistroIPES', [
+    'guia_operadora', 'beneficiario_codigo', 'beneficiario_nome', 'senha', 'data_solicitacao',
+    'seq', 'tabela', 'procedimento_codigo', 'valor_exec', 'pagina', 'linha',
+])
+# Colunas do DataFrame correspondentes (página e linha original como no formato anterior)
+COLUNAS_REGISTRO_IPES = list(RegistroIPES._fields[:-2]) + ['_pagina', '_linha']
+
+def iterar_registros_ipes(paginas, manter_linha=False, falhas=None):
+    """
+    Gera os registros da tabela do PDF IPES (RegistroIPES) à medida que as
+    páginas são lidas; quem consome pode começar antes da última página.
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for pidx, page in enumerate(pdf.pages, start=1):
-            buffer = ""
-            text = page.extract_text() or ""
-            
-            for raw in text.splitlines():
-                linha = normalize_line(raw)
+    Args:
+        paginas: iterável de (número da página, texto), ex.: iterar_textos_paginas(pdf)
+            para ler sob demanda ou textos_paginas(pdf) já extraído.
+        manter_linha: guarda o buffer original em `linha` (senão None).
+        falhas: lista que recebe (página, buffer) das linhas não reconhecidas.
+
+    O contexto (guia/beneficiário/senha) é uma tupla compartilhada pelos
+    registros até o próximo separador, sem cópia por linha.
+    """
+    contexto = (None, None, None, None, None)
+
+    def _registro(buffer, pidx):
+        campos = _campos_linha(buffer)
+        if campos is None:
+            if falhas is not None:
+                falhas.append((pidx, buffer))
+            return None
+        return RegistroIPES(*contexto, *campos, pidx, buffer if manter_linha else None)
+
+    for pidx, text in paginas:
+        buffer = ""
+        
+        for raw in text.splitlines():
+            linha = normalize_line(raw)
+
+            # Separadores
+            m1 = RX_SEP1.search(linha)
+            m2 = None if m1 else RX_SEP2.search(linha)
+            if m1 or m2:
+                # Flush buffer antes de mudar contexto
+                if buffer.strip():
+                    registro = _registro(buffer, pidx)
+                    if registro:
+                        yield registro
+                    buffer = ""
 
-                # Separadores
-                m1 = RX_SEP1.search(linha)
                 if m1:
-                    # Flush buffer antes de mudar contexto
-                    if buffer.strip():
-                        parsed = parse_row_buffer(buffer)
-                        if parsed:
-                            registros.append({**contexto, **parsed, "_pagina": pidx, "_linha": buffer})
-                        else:
-                            falhas.append({"_pagina": pidx, "linha": buffer})
-                        buffer = ""
-                    
-                    contexto["guia_operadora"] = m1.group(1)
-                    contexto["beneficiario_codigo"] = m1.group(2)
-                    contexto["beneficiario_nome"] = m1.group(3).strip()
-                    continue
-
-                m2 = RX_SEP2.search(linha)
-                if m2:
-                    # Flush buffer antes de mudar contexto
-                    if buffer.strip():
-                        parsed = parse_row_buffer(buffer)
-                        if parsed:
-                            registros.append({**contexto, **parsed, "_pagina": pidx, "_linha": buffer})
-                        else:
-                            falhas.append({"_pagina": pidx, "linha": buffer})
-                        buffer = ""
-                    
-                    contexto["senha"] = m2.group(1)
-                    contexto["data_solicitacao"] = m2.group(2)
-                    continue
-
-                # Linhas da tabela - ajustar para detectar "$" isolado também
-                if RX_ROW_START.match(linha) or buffer:
-                    buffer = (buffer + " " + linha).strip() if buffer else linha
-                    
-                    # Se linha terminou (tem "R$" ou "$"), processa
-                    if RX_MONEY_END.search(buffer) or re.search(r'\$', buffer):
-                        parsed = parse_row_buffer(buffer)
-                        if parsed:
-                            registros.append({**contexto, **parsed, "_pagina": pidx, "_linha": buffer})
-                        else:
-                            falhas.append({"_pagina": pidx, "linha": buffer})
-                        buffer = ""
-
-            # Flush final da página
-            if buffer.strip():
-                parsed = parse_row_buffer(buffer)
-                if parsed:
-                    registros.append({**contexto, **parsed, "_pagina": pidx, "_linha": buffer})
+                    contexto = (m1.group(1), m1.group(2), m1.group(3).strip()) + contexto[3:]
                 else:
-                    falhas.append({"_pagina": pidx, "linha": buffer})
+                    contexto = contexto[:3] + (m2.group(1), m2.group(2))
+                continue
 
-    df = pd.DataFrame(registros)
-    df_falhas = pd.DataFrame(falhas)
+            # Linhas da tabela - ajustar para detectar "$" isolado também
+            if RX_ROW_START.match(linha) or buffer:
+                buffer = (buffer + " " + linha).strip() if buffer else linha
+                
+                # Se linha terminou (tem "R$" ou "$"), processa
+                if '$' in buffer:
+                    registro = _registro(buffer, pidx)
+                    if registro:
+                        yield registro
+                    buffer = ""
+
+        # Flush final da página
+        if buffer.strip():
+            registro = _registro(buffer, pidx)
+            if registro:
+                yield registro
+
+def tabela_registros_ipes(registros):
+    """
+    DataFrame dos registros de iterar_registros_ipes, montado coluna a coluna
+    (cada registro é descartado assim que seus campos entram nas colunas).
+    """
+    colunas = {c: [] for c in COLUNAS_REGISTRO_IPES}
+    destinos = [colunas[c].append for c in COLUNAS_REGISTRO_IPES]
+    quantidade = 0
+    for registro in registros:
+        for adicionar, valor in zip(destinos, registro):
+            adicionar(valor)
+        quantidade += 1
+    if not quantidade:
+        return pd.DataFrame()
+    if all(v is None for v in colunas['_linha']):
+        del colunas['_linha']
+    return pd.DataFrame(colunas)
+
+def parse_paginas_como_tabela(paginas):
+    """
+    Linhas da tabela do PDF IPES a partir dos textos das páginas (ver textos_paginas).
+    Retorna (df_registros, df_falhas), com o buffer original de cada linha em `_linha`.
+    """
+    falhas = []
+    df = tabela_registros_ipes(iterar_registros_ipes(paginas, manter_linha=True, falhas=falhas))
+    df_falhas = pd.DataFrame(falhas, columns=['_pagina', 'linha']) if falhas else pd.DataFrame()
     return df, df_falhas
 
 # --- NOVO: função para extrair tabela de procedimentos (código + descrição) ---
@@ -179,91 +388,88 @@ def extrair_tabela_procedimentos(pdf_path: str):
     Extrai somente pares (codigo_procedimento, descricao_procedimento) do PDF IPES.
     Retorna (df_procedimentos, df_falhas).
     """
-    procedimentos = []
-    falhas = []
+    return extrair_procedimentos_paginas(textos_paginas(pdf_path))
 
-    RX_PROC = re.compile(r'(?<!\d)(\d{8,9})(?!\d)\s*-\s*([^\n\r]+)', re.I)
-
-    def extrair_descricao_por_caixa(descricao_bruta: str) -> str:
-        # procura primeiro caractere alfabético minúsculo
-        idx_lower = None
-        for i, ch in enumerate(descricao_bruta):
-            if ch.isalpha() and ch.islower():
-                idx_lower = i
-                break
-        if idx_lower is not None:
-            # recua até o último " - " antes do primeiro lowercase
-            pos_sep = descricao_bruta.rfind(' - ', 0, idx_lower)
-            if pos_sep != -1:
-                desc = descricao_bruta[:pos_sep].strip()
-            else:
-                desc = descricao_bruta.split(' - ')[0].strip()
+def _descricao_por_caixa(descricao_bruta: str) -> str:
+    # procura primeiro caractere alfabético minúsculo
+    idx_lower = None
+    for i, ch in enumerate(descricao_bruta):
+        if ch.isalpha() and ch.islower():
+            idx_lower = i
+            break
+    if idx_lower is not None:
+        # recua até o último " - " antes do primeiro lowercase
+        pos_sep = descricao_bruta.rfind(' - ', 0, idx_lower)
+        if pos_sep != -1:
+            desc = descricao_bruta[:pos_sep].strip()
         else:
             desc = descricao_bruta.split(' - ')[0].strip()
-        desc = re.sub(r'\s+', ' ', desc).strip()
-        desc = re.sub(r'[\s\-\–_:]+$', '', desc).strip()
-        return desc
-
-    with pdfplumber.open(pdf_path) as pdf:
-        for pidx, page in enumerate(pdf.pages, start=1):
-            text = page.extract_text() or ""
-            buffer = ""
-            for raw in text.splitlines():
-                linha = normalize_line(raw)
-
-                # acumula linhas que possam pertencer a um registro de procedimento
-                if re.match(r'^\s*\d+\s+\d{2}\s+\d+', linha) or buffer:
-                    buffer = (buffer + " " + linha).strip() if buffer else linha
-
-                    # tenta encontrar padrão código - descrição no buffer
-                    m = RX_PROC.search(buffer)
-                    if m:
-                        codigo = m.group(1)
-                        descricao_bruta = m.group(2).strip()
-                        descricao_limpa = extrair_descricao_por_caixa(descricao_bruta)
-                        procedimentos.append({
-                            'codigo_procedimento': str(codigo),
-                            'descricao_procedimento': descricao_limpa,
-                            'pagina': pidx,
-                            'linha_original': buffer
-                        })
-                        buffer = ""
-                else:
-                    # linha isolada pode conter código - descrição
-                    m2 = RX_PROC.search(linha)
-                    if m2:
-                        codigo = m2.group(1)
-                        descricao_bruta = m2.group(2).strip()
-                        descricao_limpa = extrair_descricao_por_caixa(descricao_bruta)
-                        procedimentos.append({
-                            'codigo_procedimento': str(codigo),
-                            'descricao_procedimento': descricao_limpa,
-                            'pagina': pidx,
-                            'linha_original': linha
-                        })
-                    else:
-                        # se linha tem muitos dígitos e traço pode ser contexto de beneficiário - capture como falha para revisão
-                        if re.search(r'\d{6,}\s*-\s*', linha):
-                            falhas.append({'pagina': pidx, 'linha': linha})
-
-            # flush buffer final
-            if buffer.strip():
-                m = RX_PROC.search(buffer)
-                if m:
-                    codigo = m.group(1)
-                    descricao_bruta = m.group(2).strip()
-                    descricao_limpa = extrair_descricao_por_caixa(descricao_bruta)
-                    procedimentos.append({
-                        'codigo_procedimento': str(codigo),
-                        'descricao_procedimento': descricao_limpa,
-                        'pagina': pidx,
-                        'linha_original': buffer
-                    })
-                else:
-                    if buffer.strip():
-                        falhas.append({'pagina': pidx, 'linha': buffer})
+    else:
+        desc = descricao_bruta.split(' - ')[0].strip()
+    desc = re.sub(r'\s+', ' ', desc).strip()
+    desc = re.sub(r'[\s\-\–_:]+$', '', desc).strip()
+    return desc
+
+def _procedimentos_pagina(pidx, text, procedimentos, falhas):
+    """Acrescenta às listas os procedimentos (e as falhas) do texto de uma página."""
+    buffer = ""
+    for raw in text.splitlines():
+        linha = normalize_line(raw)
+
+        # acumula linhas que possam pertencer a um registro de procedimento
+        if RX_INICIO_PROC.match(linha) or buffer:
+            buffer = (buffer + " " + linha).strip() if buffer else linha
+
+            # tenta encontrar padrão código - descrição no buffer
+            m = RX_PROC.search(buffer)
+            if m:
+                codigo = m.group(1)
+                descricao_bruta = m.group(2).strip()
+                descricao_limpa = _descricao_por_caixa(descricao_bruta)
+                procedimentos.append({
+                    'codigo_procedimento': str(codigo),
+                    'descricao_procedimento': descricao_limpa,
+                    'pagina': pidx,
+                    'linha_original': buffer
+                })
                 buffer = ""
+        else:
+            # linha isolada pode conter código - descrição
+            m2 = RX_PROC.search(linha)
+            if m2:
+                codigo = m2.group(1)
+                descricao_bruta = m2.group(2).strip()
+                descricao_limpa = _descricao_por_caixa(descricao_bruta)
+                procedimentos.append({
+                    'codigo_procedimento': str(codigo),
+                    'descricao_procedimento': descricao_limpa,
+                    'pagina': pidx,
+                    'linha_original': linha
+                })
+            else:
+                # se linha tem muitos dígitos e traço pode ser contexto de beneficiário - capture como falha para revisão
+                if RX_CONTEXTO_BENEF.search(linha):
+                    falhas.append({'pagina': pidx, 'linha': linha})
 
+    # flush buffer final
+    if buffer.strip():
+        m = RX_PROC.search(buffer)
+        if m:
+            codigo = m.group(1)
+            descricao_bruta = m.group(2).strip()
+            descricao_limpa = _descricao_por_caixa(descricao_bruta)
+            procedimentos.append({
+                'codigo_procedimento': str(codigo),
+                'descricao_procedimento': descricao_limpa,
+                'pagina': pidx,
+                'linha_original': buffer
+            })
+        else:
+            if buffer.strip():
+                falhas.append({'pagina': pidx, 'linha': buffer})
+
+def _tabela_procedimentos(procedimentos, falhas):
+    """(df_procedimentos, df_falhas) das listas de _procedimentos_pagina, um código por linha."""
     df_proc = pd.DataFrame(procedimentos)
     df_falhas = pd.DataFrame(falhas)
 
@@ -273,55 +479,63 @@ def extrair_tabela_procedimentos(pdf_path: str):
 
     return df_proc, df_falhas
 
-def processar_pdf_convenio_ipes(uploaded_file):
+def extrair_procedimentos_paginas(paginas):
+    """
+    Pares (codigo_procedimento, descricao_procedimento) a partir dos textos das
+    páginas (ver textos_paginas). Retorna (df_procedimentos, df_falhas).
+    """
+    procedimentos = []
+    falhas = []
+    for pidx, text in paginas:
+        _procedimentos_pagina(pidx, text, procedimentos, falhas)
+    return _tabela_procedimentos(procedimentos, falhas)
+
+def processar_pdf_convenio_ipes(uploaded_file, modo=None):
     """
-    Processa o arquivo PDF uploadado e retorna DataFrame formatado para o sistema
+    Processa o arquivo PDF uploadado e retorna DataFrame formatado para o sistema.
+    `modo` escolhe o motor de extração ('texto' ou 'coordenadas'; padrão em
+    SANTASAUDE_MODO_PDF_IPES).
     """
     try:
-        # Salva temporariamente o arquivo
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_path = tmp_file.name
-        
-        # Processa o PDF
-        df_raw, df_falhas = parse_pdf_text_as_table(tmp_path)
+        # Uma passada pelas páginas, direto dos bytes enviados (em paralelo nos PDFs
+        # grandes): cada página alimenta a tabela de procedimentos e segue para o
+        # parser dos registros, sem guardar o texto do PDF inteiro
+        procedimentos = []
+        procedimentos_falhas = []
+
+        def _paginas():
+            for pidx, text in iterar_textos_paginas(uploaded_file.getvalue(), modo=modo):
+                _procedimentos_pagina(pidx, text, procedimentos, procedimentos_falhas)
+                yield pidx, text
+
+        # Processa o PDF (sem guardar o texto original de cada linha)
+        falhas = []
+        df_raw = tabela_registros_ipes(iterar_registros_ipes(_paginas(), falhas=falhas))
 
         # --- NOVO: extrai tabela de procedimentos e atualiza procedimentos.pkl ---
         try:
-            df_proc_new, df_proc_falhas = extrair_tabela_procedimentos(tmp_path)
+            df_proc_new, df_proc_falhas = _tabela_procedimentos(procedimentos, procedimentos_falhas)
             caminho_proc = 'data/procedimentos.pkl'
             os.makedirs('data', exist_ok=True)
             if not df_proc_new.empty:
                 if os.path.exists(caminho_proc):
                     try:
-                        df_exist = pd.read_pickle(caminho_proc)
+                        df_exist = repositorio.ler_tabela(caminho_proc)
                         # concatena mantendo descrições existentes como prioridade
                         df_concat = pd.concat([df_exist, df_proc_new], ignore_index=True)
                         df_concat = df_concat.drop_duplicates(subset=['codigo_procedimento'], keep='first').reset_index(drop=True)
-                        df_concat.to_pickle(caminho_proc)
-                        df_proc_salvo = df_concat
+                        repositorio.salvar_tabela(df_concat, caminho_proc)
                     except Exception:
                         # fallback: salva apenas os novos
-                        df_proc_new.to_pickle(caminho_proc)
-                        df_proc_salvo = df_proc_new
-                else:
-                    df_proc_new.to_pickle(caminho_proc)
-                    df_proc_salvo = df_proc_new
-            else:
-                # arquivo existente ou vazio
-                if os.path.exists(caminho_proc):
-                    df_proc_salvo = pd.read_pickle(caminho_proc)
+                        repositorio.salvar_tabela(df_proc_new, caminho_proc)
                 else:
-                    df_proc_salvo = pd.DataFrame(columns=['codigo_procedimento', 'descricao_procedimento'])
+                    repositorio.salvar_tabela(df_proc_new, caminho_proc)
         except Exception:
-            df_proc_salvo = pd.DataFrame(columns=['codigo_procedimento', 'descricao_procedimento'])
+            # Sem procedimentos novos a importação segue; a descrição vem do arquivo salvo
+            pass
 
-        # Remove arquivo temporário
-        os.unlink(tmp_path)
-        
         if df_raw.empty:
-            return None, f"Nenhum dado extraído do PDF. Falhas: {len(df_falhas)}"
+            return None, f"Nenhum dado extraído do PDF. Falhas: {len(falhas)}"
         
         # Converte para formato padrão do sistema
         df_processado = df_raw.copy()
@@ -360,7 +574,7 @@ def processar_pdf_convenio_ipes(uploaded_file):
         try:
             caminho_proc = 'data/procedimentos.pkl'
             if os.path.exists(caminho_proc):
-                df_proc_master = pd.read_pickle(caminho_proc)
+                df_proc_master = repositorio.ler_tabela(caminho_proc)
             else:
                 df_proc_master = pd.DataFrame(columns=['codigo_procedimento', 'descricao_procedimento'])
 
@@ -386,7 +600,64 @@ def processar_pdf_convenio_ipes(uploaded_file):
         except Exception:
             df_final['descricao'] = None
         
-        return df_final, f"PDF processado com sucesso! {len(df_final)} registros extraídos. Falhas: {len(df_falhas)}"
+        return df_final, f"PDF processado com sucesso! {len(df_final)} registros extraídos. Falhas: {len(falhas)}"
         
     except Exception as e:
-        return None, f"Erro ao processar PDF: {str(e)}"
\ No newline at end of file
+        return None, f"Erro ao processar PDF: {str(e)}"
+
+
+# ========== COMPARAÇÃO DOS MOTORES ==========
+
+def _chave_registro(r):
+    return (r.pagina, r.guia_operadora, r.senha, r.seq, r.procedimento_codigo)
+
+def comparar_modos(pdf_path):
+    """
+    Extrai o PDF nos dois motores e compara tempo e resultado, registro a registro
+    (página, guia, senha, seq, procedimento). O modo 'texto' é a referência.
+    """
+    import time
+
+    conteudo = _conteudo_pdf(pdf_path)
+    resultados = {}
+    for modo in MODOS_EXTRACAO_PDF:
+        inicio = time.perf_counter()
+        paginas = textos_paginas(conteudo, processos=1, modo=modo)
+        tempo_extracao = time.perf_counter() - inicio
+        falhas = []
+        registros = list(iterar_registros_ipes(paginas, falhas=falhas))
+        resultados[modo] = {
+            'extracao_s': tempo_extracao,
+            'total_s': time.perf_counter() - inicio,
+            'registros': {_chave_registro(r): r for r in registros},
+            'falhas': len(falhas),
+        }
+
+    referencia, coordenadas = resultados['texto']['registros'], resultados['coordenadas']['registros']
+    comuns = referencia.keys() & coordenadas.keys()
+    return {
+        'paginas': len(paginas),
+        'tempos': {m: (r['extracao_s'], r['total_s']) for m, r in resultados.items()},
+        'registros': {m: len(r['registros']) for m, r in resultados.items()},
+        'falhas': {m: r['falhas'] for m, r in resultados.items()},
+        'iguais': sum(1 for k in comuns if referencia[k].valor_exec == coordenadas[k].valor_exec),
+        'valor_divergente': sum(1 for k in comuns if referencia[k].valor_exec != coordenadas[k].valor_exec),
+        'so_texto': len(referencia.keys() - coordenadas.keys()),
+        'so_coordenadas': len(coordenadas.keys() - referencia.keys()),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    if '--comparar' in sys.argv:
+        for arquivo in sys.argv[sys.argv.index('--comparar') + 1:]:
+            r = comparar_modos(arquivo)
+            print(f"{arquivo} ({r['paginas']} páginas)")
+            for modo, (extracao, total) in r['tempos'].items():
+                print(f"  {modo:<12} extração {extracao:.2f}s, total {total:.2f}s, "
+                      f"{r['registros'][modo]} registros, {r['falhas'][modo]} falhas")
+            print(f"  iguais {r['iguais']}, valor divergente {r['valor_divergente']}, "
+                  f"só no texto {r['so_texto']}, só nas coordenadas {r['so_coordenadas']}")
+    else:
+        print("Uso: python -m components.pdf_parser --comparar arquivo.pdf [...]\n"
+              "(benchmark do parser de linhas: python testa_pdf_parser.py)")
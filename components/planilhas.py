@@ -0,0 +1,343 @@
+"""
+Leitura de planilhas Excel em blocos de linhas, sem carregar a planilha inteira.
+
+pd.read_excel monta a planilha bruta toda em memória (células do openpyxl +
+lista de listas + DataFrame) antes de qualquer filtro. Aqui o openpyxl abre o
+arquivo em modo read_only e as linhas são entregues em DataFrames de até
+TAMANHO_BLOCO linhas; cada importador trata o bloco (mapeamento de colunas,
+rodapés, valores) e só o resultado tratado é acumulado.
+
+Cada bloco sai igual ao trecho correspondente do pd.read_excel:
+    - linhas vazias contam na posição do cabeçalho e ficam nos dados (todas NaN),
+      menos as do fim da planilha;
+    - células vazias e textos como '' viram NaN, e as colunas passam pela mesma
+      inferência de tipos ('0008033' -> 8033), feita bloco a bloco pelo TextParser
+      do pandas (o parser que o read_excel usa);
+    - números inteiros gravados como float voltam como int (1.0 -> 1);
+    - cabeçalhos vazios viram 'Unnamed: n' e repetidos ganham '.1', '.2'...
+
+Arquivos que o openpyxl não abre (.xls antigos) são lidos pelo pandas e
+entregues nos mesmos blocos.
+
+Detecção do cabeçalho: com colunas_esperadas, a linha de cabeçalho é achada
+na mesma leitura, até a LINHAS_DETECCAO-ésima linha não vazia. A
+impressão digital (hash dos nomes normalizados) de cada cabeçalho aceito fica
+em CAMINHO_LAYOUTS; nas próximas leituras da mesma fonte, a linha cuja
+impressão já é conhecida é aceita na hora, sem pontuar as demais. Layouts
+novos são escolhidos pela linha com mais colunas esperadas e, se nenhuma
+tiver, vale a posição informada em `cabecalho`.
+
+Uso:
+    df = planilhas.ler_excel(arquivo, cabecalho=7, tratar_bloco=tratar)
+    df = planilhas.ler_excel(arquivo, cabecalho=7, colunas_esperadas=COLUNAS, fonte='clinica',
+                             tratar_bloco=tratar)
+"""
+import os
+import json
+import hashlib
+import zipfile
+import itertools
+from collections import deque
+import pandas as pd
+from pandas.io.parsers import TextParser
+from components import travas
+
+# Linhas por bloco entregue ao tratamento
+TAMANHO_BLOCO = 5000
+
+# Linhas não vazias examinadas na detecção do cabeçalho
+LINHAS_DETECCAO = 30
+
+# Impressões digitais de cabeçalhos já reconhecidos -> fonte
+CAMINHO_LAYOUTS = 'data/layouts_planilhas.json'
+
+_layouts = None  # cache em memória de CAMINHO_LAYOUTS (por processo)
+
+
+def _nomes_colunas(linha):
+    nomes = []
+    vistos = {}
+    for i, valor in enumerate(linha):
+        nome = f"Unnamed: {i}" if valor is None or (isinstance(valor, str) and valor == '') else valor
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f"{nome}.{vistos[nome]}"
+        else:
+            vistos[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+
+def _celula(valor):
+    """Célula como o leitor do pd.read_excel a entrega: vazia -> '', float inteiro -> int."""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def _aparar(linha):
+    """Tupla da linha sem as células vazias do fim (linha vazia -> ())."""
+    linha = tuple(_celula(v) for v in linha)
+    fim = len(linha)
+    while fim and isinstance(linha[fim - 1], str) and linha[fim - 1] == '':
+        fim -= 1
+    return linha[:fim]
+
+
+def _linhas_openpyxl(arquivo, aba):
+    from openpyxl import load_workbook
+
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        planilha = livro[aba] if aba is not None else livro.worksheets[0]
+        # Em read_only o openpyxl confia na dimensão gravada no arquivo, que alguns
+        # sistemas gravam errada (ex.: 'A1' no relatório GETNET); o read_excel faz o mesmo
+        planilha.reset_dimensions()
+        for linha in planilha.iter_rows(values_only=True):
+            yield linha
+    finally:
+        livro.close()
+
+
+def _linhas_pandas(arquivo, aba):
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    bruto = pd.read_excel(arquivo, sheet_name=aba if aba is not None else 0, header=None, dtype=object)
+    for linha in bruto.itertuples(index=False, name=None):
+        yield tuple(None if pd.isna(v) else v for v in linha)
+
+
+def _sem_vazias_finais(linhas):
+    """Linhas vazias só são entregues quando vem outra com dados depois delas."""
+    vazias = []
+    for linha in linhas:
+        if not linha:
+            vazias.append(linha)
+            continue
+        if vazias:
+            yield from vazias
+            vazias = []
+        yield linha
+
+
+def _linhas(arquivo, aba):
+    """
+    Linhas da planilha como tuplas aparadas (ver _aparar), sem as linhas vazias do
+    fim; openpyxl em read_only quando o formato permite.
+    """
+    try:
+        if hasattr(arquivo, 'seek'):
+            arquivo.seek(0)
+        # .xlsx é um zip; .xls (BIFF) não é aberto pelo openpyxl
+        if not zipfile.is_zipfile(arquivo):
+            raise zipfile.BadZipFile
+        if hasattr(arquivo, 'seek'):
+            arquivo.seek(0)
+        fonte = _linhas_openpyxl(arquivo, aba)
+    except (zipfile.BadZipFile, ImportError):
+        fonte = _linhas_pandas(arquivo, aba)
+    return _sem_vazias_finais(_aparar(linha) for linha in fonte)
+
+
+# ========== DETECÇÃO DO CABEÇALHO ==========
+
+def _normalizar_nome(valor):
+    """Nome de coluna comparável: espaços e quebras de linha colapsados, maiúsculas."""
+    return ' '.join(str(valor).split()).upper() if valor is not None else ''
+
+
+def impressao_cabecalho(linha):
+    """Impressão digital de uma linha de cabeçalho (ignora células vazias no fim)."""
+    nomes = [_normalizar_nome(v) for v in linha]
+    while nomes and nomes[-1] == '':
+        nomes.pop()
+    return hashlib.sha1('\x1f'.join(nomes).encode('utf-8')).hexdigest()[:16]
+
+
+def _layouts_conhecidos():
+    global _layouts
+    if _layouts is None:
+        try:
+            with open(CAMINHO_LAYOUTS, 'r', encoding='utf-8') as f:
+                _layouts = json.load(f)
+        except (OSError, ValueError):
+            _layouts = {}
+    return _layouts
+
+
+def _aprender(impressao, fonte, colunas):
+    """Guarda a impressão do cabeçalho aceito (outros processos podem gravar ao mesmo tempo)."""
+    layouts = _layouts_conhecidos()
+    if layouts.get(impressao, {}).get('fonte') == fonte:
+        return
+    registro = {'fonte': fonte, 'colunas': [str(c) for c in colunas]}
+    layouts[impressao] = registro
+    try:
+        pasta = os.path.dirname(CAMINHO_LAYOUTS)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with travas.travar(CAMINHO_LAYOUTS):
+            try:
+                with open(CAMINHO_LAYOUTS, 'r', encoding='utf-8') as f:
+                    gravados = json.load(f)
+            except (OSError, ValueError):
+                gravados = {}
+            gravados[impressao] = registro
+            tmp = f"{CAMINHO_LAYOUTS}.{os.getpid()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(gravados, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, CAMINHO_LAYOUTS)
+    except OSError as e:
+        # Sem o cache a detecção continua funcionando, só não fica mais rápida
+        print(f"Erro ao gravar layouts de planilhas: {e}")
+
+
+def escolher_cabecalho(linhas, colunas_esperadas, padrao=None):
+    """
+    Posição da linha com mais nomes de colunas_esperadas (a primeira, em empate).
+
+    Returns:
+        tuple: (posição, quantidade de colunas reconhecidas); sem nenhuma
+        reconhecida, (padrao, 0) se padrao estiver entre as linhas, senão (None, 0).
+    """
+    esperadas = {_normalizar_nome(c) for c in colunas_esperadas}
+    melhor, pontos_melhor, total = None, 0, 0
+    for posicao, linha in enumerate(linhas):
+        total += 1
+        pontos = sum(1 for v in linha if _normalizar_nome(v) in esperadas)
+        if pontos > pontos_melhor:
+            melhor, pontos_melhor = posicao, pontos
+    if melhor is None and padrao is not None and padrao < total:
+        melhor = padrao
+    return melhor, pontos_melhor
+
+
+def _separar_cabecalho(linhas, cabecalho, colunas_esperadas, fonte):
+    """
+    (linha de cabeçalho, iterador das linhas seguintes) a partir do iterador das
+    linhas da planilha, sem relê-la. As posições contam as linhas vazias, como o
+    header= do pd.read_excel.
+    """
+    if colunas_esperadas is None:
+        for posicao, linha in enumerate(linhas):
+            if posicao == cabecalho:
+                return linha, linhas
+        return None, iter(())
+
+    conhecidos = _layouts_conhecidos()
+    candidatas = []
+    nao_vazias = 0
+    for linha in linhas:
+        if fonte is not None and linha and conhecidos.get(impressao_cabecalho(linha), {}).get('fonte') == fonte:
+            return linha, linhas
+        candidatas.append(linha)
+        nao_vazias += bool(linha)
+        if nao_vazias >= LINHAS_DETECCAO:
+            break
+    posicao, _ = escolher_cabecalho(candidatas, colunas_esperadas, padrao=cabecalho)
+    if posicao is None:
+        return None, iter(())
+    linha = candidatas[posicao]
+    if fonte is not None:
+        _aprender(impressao_cabecalho(linha), fonte, _nomes_colunas(linha))
+    return linha, itertools.chain(candidatas[posicao + 1:], linhas)
+
+
+def detectar_cabecalho(arquivo, colunas_esperadas, aba=None, fonte=None, cabecalho=0):
+    """Nomes das colunas do cabeçalho detectado, lendo só as primeiras linhas (ou None)."""
+    linha, _ = _separar_cabecalho(_linhas(arquivo, aba), cabecalho, colunas_esperadas, fonte)
+    return _nomes_colunas(linha) if linha is not None else None
+
+
+# ========== LEITURA EM BLOCOS ==========
+
+def ler_em_blocos(arquivo, cabecalho=0, aba=None, descartar_finais=0, como_texto=False,
+                  tamanho_bloco=TAMANHO_BLOCO, colunas_esperadas=None, fonte=None):
+    """
+    Gera DataFrames com as linhas da planilha, em blocos.
+
+    Args:
+        arquivo: caminho ou arquivo aberto (ex.: upload do Streamlit).
+        cabecalho: posição da linha de cabeçalho, contando as linhas vazias
+            (o mesmo que header= do pd.read_excel).
+        aba: nome da aba (padrão: a primeira).
+        descartar_finais: linhas do fim que são ignoradas (rodapés), contadas
+            depois das linhas vazias do fim da planilha (o mesmo que skipfooter=).
+        como_texto: células como texto (o mesmo que dtype=str).
+        colunas_esperadas: nomes que identificam o cabeçalho; com eles a linha é
+            detectada e `cabecalho` só vale se nenhuma linha os tiver.
+        fonte: nome do layout no cache de impressões (ex.: 'clinica').
+    """
+    pendentes = deque()
+    bloco = []
+    entregues = 0
+    # Todas as linhas têm a largura da mais larga já lida (o read_excel usa a da planilha)
+    largura = [0]
+    # Colunas que já vieram como texto em um bloco anterior continuam texto nos
+    # seguintes, como na inferência da planilha inteira ('094328650' e depois '1196114')
+    textos = set()
+
+    def medir(linhas):
+        for linha in linhas:
+            largura[0] = max(largura[0], len(linha))
+            yield linha
+
+    linha_cabecalho, linhas = _separar_cabecalho(medir(_linhas(arquivo, aba)), cabecalho,
+                                                 colunas_esperadas, fonte)
+    if linha_cabecalho is None:
+        return
+    for linha in linhas:
+        # Guarda as últimas linhas até saber se são o rodapé
+        pendentes.append(linha)
+        if len(pendentes) <= descartar_finais:
+            continue
+        bloco.append(pendentes.popleft())
+        if len(bloco) >= tamanho_bloco:
+            yield _montar(linha_cabecalho, bloco, largura[0], como_texto, textos)
+            entregues += 1
+            bloco = []
+
+    # Sem nenhuma linha de dados ainda entrega um bloco vazio com as colunas
+    if bloco or not entregues:
+        yield _montar(linha_cabecalho, bloco, largura[0], como_texto, textos)
+
+
+def _montar(cabecalho, linhas, largura, como_texto, textos):
+    """
+    DataFrame do bloco pelo TextParser, com as mesmas opções que o pd.read_excel
+    usa; acrescenta a `textos` as colunas inferidas como texto neste bloco.
+    """
+    dados = [list(linha) + [''] * (largura - len(linha)) for linha in [cabecalho] + linhas]
+    tipos = str if como_texto else {c: object for c in textos} or None
+    df = TextParser(dados, header=0, skip_blank_lines=False, dtype=tipos).read()
+    if not como_texto:
+        for coluna in df.columns:
+            serie = df[coluna]
+            if coluna in textos:
+                # Só texto vira o tipo de texto padrão do pandas, como no read_excel
+                df[coluna] = serie.infer_objects()
+            elif (serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype)) and serie.notna().any():
+                textos.add(coluna)
+    return df
+
+
+def ler_excel(arquivo, cabecalho=0, tratar_bloco=None, **opcoes):
+    """
+    Lê a planilha em blocos aplicando `tratar_bloco(df) -> df` a cada um e
+    concatena só os resultados tratados. Ver ler_em_blocos para as opções.
+    """
+    partes = []
+    inicio = 0
+    for bloco in ler_em_blocos(arquivo, cabecalho=cabecalho, **opcoes):
+        # Índice contínuo, como o do DataFrame lido de uma vez
+        bloco.index = pd.RangeIndex(inicio, inicio + len(bloco))
+        inicio += len(bloco)
+        if tratar_bloco is not None:
+            bloco = tratar_bloco(bloco)
+        if bloco is not None:
+            partes.append(bloco)
+    if not partes:
+        return pd.DataFrame()
+    return pd.concat(partes) if len(partes) > 1 else partes[0]
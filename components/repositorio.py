@@ -0,0 +1,383 @@
+"""
+Camada de acesso aos arquivos data/*.pkl com cache em memória.
+
+Cada rerun do Streamlit relia e desserializava os mesmos pickles várias vezes
+por página. Aqui os DataFrames ficam em um LRU compartilhado pelo processo,
+indexado por (caminho, mtime, tamanho): se o arquivo mudar em disco (inclusive
+por outro processo) a chave muda e ele é relido.
+
+Os DataFrames ficam no cache (e em disco) no formato compacto definido em
+components.esquemas e são expandidos na leitura.
+
+Com o backend SQLite ativo (components.banco_sql), os caminhos das tabelas
+gerenciadas pelo banco são atendidos por ele de forma transparente. As tabelas
+particionadas por mês (components.particoes) também: ler_periodo, anexar_tabela
+e excluir_datas tocam apenas os meses envolvidos.
+
+Uso:
+    from components import repositorio
+    df = repositorio.ler_tabela('data/recebimentos_pendentes.pkl')
+    repositorio.salvar_tabela(df, 'data/recebimentos_pendentes.pkl')
+"""
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+from components import travas
+from components import banco_sql
+from components import esquemas
+from components import particoes
+
+# Memória máxima ocupada pelos DataFrames em cache (bytes)
+LIMITE_BYTES_CACHE = 256 * 1024 * 1024
+
+_cache = OrderedDict()   # caminho -> (chave, df, bytes)
+_bytes_em_cache = 0
+_trava = threading.RLock()
+_estatisticas = {'acertos': 0, 'faltas': 0, 'descartes': 0}
+
+
+def _normalizar(caminho):
+    return os.path.abspath(caminho)
+
+
+def _chave_arquivo(caminho):
+    """(mtime_ns, tamanho) do arquivo ou None se ele não existir."""
+    try:
+        st = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _tamanho_df(df):
+    try:
+        return int(df.memory_usage(index=True, deep=True).sum())
+    except Exception:
+        return 0
+
+
+def _remover(caminho_abs):
+    global _bytes_em_cache
+    item = _cache.pop(caminho_abs, None)
+    if item is not None:
+        _bytes_em_cache -= item[2]
+
+
+def _guardar(caminho_abs, chave, df):
+    """Insere no LRU e descarta os itens mais antigos até caber no limite."""
+    global _bytes_em_cache
+    tamanho = _tamanho_df(df)
+    _remover(caminho_abs)
+    if tamanho > LIMITE_BYTES_CACHE:
+        return
+    _cache[caminho_abs] = (chave, df, tamanho)
+    _bytes_em_cache += tamanho
+    while _bytes_em_cache > LIMITE_BYTES_CACHE and _cache:
+        _, (_, _, tam) = _cache.popitem(last=False)
+        _bytes_em_cache -= tam
+        _estatisticas['descartes'] += 1
+
+
+def _entregar(df, copiar, compacto):
+    if compacto:
+        return df.copy() if copiar else df
+    if esquemas.compacto(df):
+        # expandir já devolve um DataFrame novo
+        return esquemas.expandir(df)
+    return df.copy() if copiar else df
+
+
+def ler_tabela(caminho, copiar=True, compacto=False):
+    """
+    Lê um pickle usando o cache.
+
+    Args:
+        caminho (str): arquivo .pkl.
+        copiar (bool): devolve uma cópia (padrão), pois a maioria dos chamadores
+            altera o DataFrame. Use False apenas para leitura pura.
+        compacto (bool): devolve o DataFrame no formato de components.esquemas
+            (categorias e centavos), sem expandir. Apenas para leitura pura.
+
+    Raises:
+        FileNotFoundError: se o arquivo não existir (mesmo comportamento de pd.read_pickle).
+    """
+    if banco_sql.gerencia(caminho):
+        return banco_sql.ler(caminho)
+    if particoes.gerencia(caminho):
+        df = particoes.ler(caminho)
+        return esquemas.compactar(df, caminho) if compacto else df
+
+    caminho_abs = _normalizar(caminho)
+    chave = _chave_arquivo(caminho_abs)
+    if chave is None:
+        with _trava:
+            _remover(caminho_abs)
+        raise FileNotFoundError(caminho)
+
+    with _trava:
+        item = _cache.get(caminho_abs)
+        if item is not None and item[0] == chave:
+            _cache.move_to_end(caminho_abs)
+            _estatisticas['acertos'] += 1
+            return _entregar(item[1], copiar, compacto)
+
+    # Arquivos ainda não migrados são compactados já no cache
+    df = esquemas.compactar(pd.read_pickle(caminho_abs), caminho_abs)
+    with _trava:
+        _estatisticas['faltas'] += 1
+        # Só guarda se o arquivo não mudou durante a leitura
+        if _chave_arquivo(caminho_abs) == chave:
+            _guardar(caminho_abs, chave, df)
+    return _entregar(df, copiar, compacto)
+
+
+def salvar_tabela(df, caminho, versionar=True):
+    """
+    Grava o DataFrame de forma atômica (temporário + rename) e atualiza o cache,
+    de modo que a próxima leitura não precise desserializar o arquivo de novo.
+    O arquivo é gravado no formato compacto do esquema da tabela.
+
+    Com versionar=True a gravação é feita sob a trava exclusiva do arquivo e
+    incrementa sua versão, invalidando transações que o leram antes
+    (ver components.travas). Arquivos que nunca são reescritos, como os
+    segmentos do ledger, usam versionar=False.
+    """
+    if particoes.gerencia(caminho):
+        # Transação própria: trava e versiona o caminho lógico
+        particoes.gravar(df, caminho)
+        return
+    caminho_abs = _normalizar(caminho)
+    os.makedirs(os.path.dirname(caminho_abs) or '.', exist_ok=True)
+    gravar = banco_sql.gravar if banco_sql.gerencia(caminho) else _gravar_atomico
+    if not versionar:
+        gravar(df, caminho_abs)
+        return
+    with travas.travar(caminho_abs):
+        gravar(df, caminho_abs)
+        travas.incrementar_versao(caminho_abs)
+
+
+def _gravar_atomico(df, caminho_abs):
+    df = esquemas.compactar(df, caminho_abs)
+    tmp = f"{caminho_abs}.tmp"
+    df.to_pickle(tmp)
+    os.replace(tmp, caminho_abs)
+    registrar_gravacao(df, caminho_abs)
+
+
+def registrar_gravacao(df, caminho):
+    """Coloca no cache um DataFrame que acabou de ser gravado em caminho por outra rotina."""
+    caminho_abs = _normalizar(caminho)
+    compactado = esquemas.compactar(df, caminho_abs)
+    with _trava:
+        chave = _chave_arquivo(caminho_abs)
+        if chave is not None:
+            _guardar(caminho_abs, chave, compactado if compactado is not df else df.copy())
+
+
+def remover_tabela(caminho, versionar=True):
+    """Apaga o arquivo (se existir) e sua entrada no cache."""
+    caminho_abs = _normalizar(caminho)
+    with _trava:
+        _remover(caminho_abs)
+    if not existe(caminho_abs):
+        return
+    if particoes.gerencia(caminho):
+        with travas.travar(caminho_abs):
+            particoes.remover(caminho)
+            travas.incrementar_versao(caminho_abs)
+        return
+    apagar = banco_sql.apagar if banco_sql.gerencia(caminho) else os.remove
+    if not versionar:
+        apagar(caminho_abs)
+        return
+    with travas.travar(caminho_abs):
+        apagar(caminho_abs)
+        travas.incrementar_versao(caminho_abs)
+
+
+def existe(caminho):
+    """Equivalente a os.path.exists que também considera as tabelas do banco."""
+    if banco_sql.gerencia(caminho):
+        return banco_sql.existe(caminho)
+    if particoes.gerencia(caminho):
+        return particoes.existe(caminho)
+    return os.path.exists(caminho)
+
+
+def tamanho(caminho):
+    """Bytes ocupados em disco pela tabela (soma das partições, se particionada)."""
+    if particoes.gerencia(caminho):
+        return particoes.tamanho(caminho)
+    return os.path.getsize(caminho) if os.path.exists(caminho) else 0
+
+
+def _coluna_data(caminho, coluna):
+    """Coluna de data padrão: a de partição, também enquanto a tabela não foi migrada."""
+    if coluna is None and particoes.particionavel(caminho):
+        return particoes.coluna_particao(caminho)
+    return coluna
+
+
+def ler_periodo(caminho, inicio=None, fim=None, coluna=None):
+    """
+    Linhas com a data de `coluna` em [inicio, fim] (dias inclusivos; None deixa o
+    lado aberto). Em tabelas particionadas, pela coluna de partição (padrão), só os
+    meses do intervalo são lidos; nas demais a tabela é lida e filtrada.
+
+    Returns:
+        DataFrame vazio se a tabela não existir.
+    """
+    coluna = _coluna_data(caminho, coluna)
+    if not existe(caminho):
+        return pd.DataFrame()
+    if particoes.gerencia(caminho) and coluna in (None, particoes.coluna_particao(caminho)):
+        return particoes.ler(caminho, inicio, fim)
+    df = ler_tabela(caminho)
+    if coluna is None or coluna not in df.columns:
+        return df
+    return df[particoes.filtrar_periodo(df[coluna], inicio, fim)]
+
+
+def intervalo_datas(caminho, coluna=None):
+    """
+    (primeira, última) data da tabela ou None. Em tabelas particionadas vem do
+    manifesto, sem ler os dados.
+    """
+    coluna = _coluna_data(caminho, coluna)
+    if not existe(caminho):
+        return None
+    if particoes.gerencia(caminho) and coluna in (None, particoes.coluna_particao(caminho)):
+        return particoes.intervalo(caminho)
+    df = ler_tabela(caminho, copiar=False)
+    if coluna is None or coluna not in df.columns:
+        return None
+    datas = pd.to_datetime(df[coluna], errors='coerce').dropna()
+    return (datas.min(), datas.max()) if not datas.empty else None
+
+
+def datas_presentes(caminho, datas, coluna=None):
+    """
+    Dias de `datas` que já existem na tabela (conjunto de date). Em tabelas
+    particionadas, pela coluna de partição, vem do índice de dias do manifesto
+    sem ler os dados; nas demais lê só o período consultado.
+    """
+    coluna = _coluna_data(caminho, coluna)
+    if not existe(caminho):
+        return set()
+    if particoes.gerencia(caminho) and coluna in (None, particoes.coluna_particao(caminho)):
+        return particoes.datas_presentes(caminho, datas)
+    dias = pd.to_datetime(pd.Series(list(datas)), errors='coerce').dropna().dt.normalize().drop_duplicates()
+    if dias.empty:
+        return set()
+    df = ler_periodo(caminho, dias.min(), dias.max(), coluna)
+    if coluna not in df.columns:
+        return set()
+    existentes = pd.to_datetime(df[coluna], errors='coerce').dt.normalize()
+    return {d.date() for d in dias[dias.isin(existentes)]}
+
+
+def anexar_tabela(df_novo, caminho):
+    """
+    Acrescenta linhas à tabela. Em tabelas particionadas regrava só os meses das
+    linhas novas; nas demais lê, concatena (renumerando o índice) e grava tudo.
+    """
+    if df_novo is None or df_novo.empty:
+        return 0
+    if particoes.gerencia(caminho):
+        return particoes.anexar(df_novo, caminho)
+    df_combinado = df_novo
+    if existe(caminho):
+        df_combinado = pd.concat([ler_tabela(caminho), df_novo], ignore_index=True)
+    salvar_tabela(df_combinado, caminho)
+    return len(df_novo)
+
+
+def mesclar_tabela(df_novo, caminho, chave='id_unico', preservar=()):
+    """
+    Upsert das linhas de df_novo por `chave` (ver particoes.mesclar). Tabelas
+    particionadas só leem e regravam os meses das linhas recebidas; nas demais a
+    comparação é a mesma, mas o arquivo é lido e gravado inteiro.
+
+    Returns:
+        dict: inseridas, atualizadas, ignoradas.
+    """
+    if df_novo is None or df_novo.empty:
+        return {'inseridas': 0, 'atualizadas': 0, 'ignoradas': 0}
+    if chave not in df_novo.columns:
+        return {'inseridas': anexar_tabela(df_novo, caminho), 'atualizadas': 0, 'ignoradas': 0}
+    if particoes.gerencia(caminho):
+        return particoes.mesclar(df_novo, caminho, chave, preservar)
+
+    atual = ler_tabela(caminho) if existe(caminho) else pd.DataFrame()
+    inseridas, atualizadas, ignoradas = particoes.separar_mesclagem(atual, df_novo, chave, preservar)
+    if not atualizadas.empty or not inseridas.empty:
+        atual = atual.copy()
+        for coluna in atualizadas.columns:
+            atual.loc[atualizadas.index, coluna] = atualizadas[coluna]
+        salvar_tabela(pd.concat([atual, inseridas], ignore_index=True), caminho)
+    return {'inseridas': len(inseridas), 'atualizadas': len(atualizadas), 'ignoradas': ignoradas}
+
+
+def excluir_datas(caminho, coluna, datas):
+    """
+    Remove as linhas cuja `coluna` cai em um dos dias informados.
+
+    Returns:
+        int: linhas removidas.
+
+    Raises:
+        KeyError: se a coluna não existir.
+    """
+    if not existe(caminho):
+        return 0
+    if particoes.gerencia(caminho):
+        return particoes.excluir_datas(caminho, datas, coluna)
+    df = ler_tabela(caminho)
+    if df.empty:
+        return 0
+    if coluna not in df.columns:
+        raise KeyError(coluna)
+    dias = pd.to_datetime(pd.Series(list(datas)), errors='coerce').dropna().dt.normalize()
+    mascara = pd.to_datetime(df[coluna], errors='coerce').dt.normalize().isin(set(dias))
+    if mascara.any():
+        salvar_tabela(df[~mascara], caminho)
+    return int(mascara.sum())
+
+
+def selecionar(caminho, coluna, valores):
+    """
+    Linhas em que `coluna` (None = rótulo do índice) está em `valores`.
+    No banco usa o índice da coluna; em pickle filtra o DataFrame em memória.
+    """
+    if banco_sql.gerencia(caminho):
+        return banco_sql.selecionar(caminho, coluna, valores)
+    # Filtra no formato compacto e expande só as linhas selecionadas
+    df = ler_tabela(caminho, copiar=False, compacto=True)
+    if coluna is None:
+        parte = df[df.index.isin(list(valores))]
+    elif coluna not in df.columns:
+        parte = df.iloc[0:0]
+    else:
+        parte = df[df[coluna].isin(list(valores))]
+    # Nem toda versão do pandas propaga attrs na seleção
+    parte.attrs = df.attrs
+    return _entregar(parte, True, False)
+
+
+def invalidar(caminho=None):
+    """Descarta do cache um arquivo específico ou, sem argumento, todos."""
+    global _bytes_em_cache
+    with _trava:
+        if caminho is None:
+            _cache.clear()
+            _bytes_em_cache = 0
+        else:
+            _remover(_normalizar(caminho))
+
+
+def estatisticas_cache():
+    """Retorna acertos, faltas, descartes, itens e bytes ocupados pelo cache."""
+    with _trava:
+        return dict(_estatisticas, itens=len(_cache), bytes=_bytes_em_cache)
@@ -1,6 +1,5 @@
-import pandas as pd
-import os
 from datetime import datetime
+from components import ledger
 
 # --- CONFIGURE AQUI OS SALDOS INICIAIS ---
 saldos_iniciais = {
@@ -20,16 +19,13 @@ def definir_saldos():
     Cria registros de 'SALDO INICIAL' no arquivo de movimentações.
     Grava valores negativos na coluna 'pago' para débitos.
     """
-    caminho_arquivo = 'data/movimentacao_contas.pkl'
     data_saldo_inicial = datetime(2025, 1, 1)
 
-    if os.path.exists(caminho_arquivo):
-        df = pd.read_pickle(caminho_arquivo)
-        if not df[df['descricao'] == 'SALDO INICIAL'].empty:
+    if ledger.existe():
+        df = ledger.scan(filtros={'descricao': 'SALDO INICIAL'})
+        if not df.empty:
             print("❌ Erro: Saldos iniciais já parecem ter sido definidos. Abortando.")
             return
-    else:
-        df = pd.DataFrame()
 
     novas_entradas = []
     for conta, valor in saldos_iniciais.items():
@@ -60,13 +56,7 @@ def definir_saldos():
         novas_entradas.append(registro)
 
     if novas_entradas:
-        df_novas = pd.DataFrame(novas_entradas)
-        df_final = pd.concat([df, df_novas], ignore_index=True)
-        
-        # Apaga o arquivo antigo antes de salvar o novo para garantir a limpeza
-        if os.path.exists(caminho_arquivo):
-            os.remove(caminho_arquivo)
-        df_final.to_pickle(caminho_arquivo)
+        ledger.append(novas_entradas)
         
         print("\n✅ Saldos iniciais registrados com sucesso!")
     else:
@@ -77,10 +67,9 @@ if __name__ == "__main__":
     if confirmacao.lower() == 's':
         # Antes de rodar, apague o arquivo movimentacao_contas.pkl para garantir
         # que não haja saldos antigos.
-        caminho_mov = 'data/movimentacao_contas.pkl'
-        if os.path.exists(caminho_mov):
-            print(f"Apagando arquivo antigo: {caminho_mov}")
-            os.remove(caminho_mov)
+        if ledger.existe():
+            print(f"Apagando arquivo antigo: {ledger.CAMINHO_BASE}")
+            ledger.apagar()
         
         definir_saldos()
     else:
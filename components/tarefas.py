@@ -0,0 +1,268 @@
+"""
+Fila local de tarefas em segundo plano (importações).
+
+A tarefa roda em uma thread do servidor do Streamlit, fora do ciclo de
+execução da página: a tela submete, volta na hora e consulta o andamento a
+cada rerun. Recarregar o navegador não interrompe o trabalho, e a tela
+encontra a tarefa de novo por listar()/ultima().
+
+Cada tarefa tem um registro em data/tarefas/<id>.json (tipo, estado, etapa,
+fração concluída, mensagens, datas) e, ao terminar, o resultado em
+data/tarefas/<id>.pkl. A função da tarefa recebe um Progresso como primeiro
+argumento e informa as etapas:
+
+    def minha_tarefa(progresso, arquivos):
+        progresso.etapa("Lendo arquivos", 0.1)
+        ...
+        return resultado
+
+    id_tarefa = tarefas.submeter('importacao', minha_tarefa, arquivos)
+    tarefas.obter(id_tarefa)      # {'estado': 'executando', 'etapa': ..., 'fracao': 0.1, ...}
+    tarefas.resultado(id_tarefa)
+
+O cancelamento é cooperativo: cancelar() marca a tarefa e a próxima chamada a
+progresso.etapa() levanta TarefaCancelada. Tarefas submetidas com
+cancelavel=False (gravações) só podem ser canceladas enquanto estão na fila.
+Tarefas que estavam em andamento quando o servidor parou aparecem como
+'interrompida'.
+"""
+import os
+import json
+import uuid
+import pickle
+import threading
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+PASTA_TAREFAS = 'data/tarefas'
+
+# Tarefas executadas ao mesmo tempo (importações gravam as mesmas tabelas: padrão 1)
+TRABALHADORES = int(os.environ.get('SANTASAUDE_TRABALHADORES_TAREFAS', '1'))
+
+# Registros de tarefas terminadas mantidos em disco
+DIAS_MANTIDOS = 7
+
+NA_FILA = 'na_fila'
+EXECUTANDO = 'executando'
+CONCLUIDA = 'concluida'
+FALHOU = 'falhou'
+CANCELADA = 'cancelada'
+INTERROMPIDA = 'interrompida'
+FINAIS = (CONCLUIDA, FALHOU, CANCELADA, INTERROMPIDA)
+
+
+class TarefaCancelada(BaseException):
+    """
+    Levantada em Progresso.etapa() quando a tarefa foi cancelada. Deriva de
+    BaseException para atravessar os `except Exception` das funções de importação.
+    """
+
+
+# Estado deste processo: registros são alterados pela thread da tarefa e pela tela
+_trava = threading.Lock()
+_executor = None
+_cancelamentos = {}  # id -> threading.Event das tarefas na fila ou em execução aqui
+
+
+def _caminho(id_tarefa, extensao='json'):
+    return os.path.join(PASTA_TAREFAS, f"{id_tarefa}.{extensao}")
+
+
+def _ler(id_tarefa):
+    try:
+        with open(_caminho(id_tarefa), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar(registro):
+    os.makedirs(PASTA_TAREFAS, exist_ok=True)
+    caminho = _caminho(registro['id'])
+    tmp = f"{caminho}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(registro, f, ensure_ascii=False, default=str)
+    os.replace(tmp, caminho)
+
+
+def _alterar(id_tarefa, **campos):
+    """Atualiza campos do registro; devolve o registro gravado (ou None se não existe)."""
+    with _trava:
+        registro = _ler(id_tarefa)
+        if registro is None:
+            return None
+        registro.update(campos, atualizada=datetime.now().isoformat())
+        _gravar(registro)
+        return registro
+
+
+class Progresso:
+    """Passado à função da tarefa para informar etapas e checar o cancelamento."""
+
+    def __init__(self, id_tarefa, evento, cancelavel=True):
+        self.id = id_tarefa
+        self._evento = evento
+        self.cancelavel = cancelavel
+
+    def cancelada(self):
+        return self.cancelavel and self._evento.is_set()
+
+    def etapa(self, nome, fracao=None):
+        """Registra a etapa atual (fração de 0 a 1, opcional); levanta TarefaCancelada se pedido."""
+        if self.cancelada():
+            raise TarefaCancelada(self.id)
+        campos = {'etapa': nome}
+        if fracao is not None:
+            campos['fracao'] = max(0.0, min(1.0, float(fracao)))
+        _alterar(self.id, **campos)
+
+
+def _obter_executor():
+    global _executor
+    with _trava:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TRABALHADORES, thread_name_prefix='tarefa')
+        return _executor
+
+
+def submeter(tipo, funcao, *args, cancelavel=True, descricao='', **kwargs):
+    """
+    Coloca funcao(progresso, *args, **kwargs) na fila e devolve o id da tarefa.
+    Os argumentos ficam na memória do servidor: passe bytes, não objetos da sessão.
+    """
+    id_tarefa = f"{datetime.now():%Y%m%d%H%M%S}_{uuid.uuid4().hex[:8]}"
+    agora = datetime.now().isoformat()
+    evento = threading.Event()
+    with _trava:
+        _gravar({
+            'id': id_tarefa, 'tipo': tipo, 'descricao': descricao, 'estado': NA_FILA,
+            'etapa': 'Na fila', 'fracao': 0.0, 'erro': None, 'cancelavel': cancelavel,
+            'entregue': False, 'criada': agora, 'iniciada': None, 'terminada': None,
+            'atualizada': agora,
+        })
+        _cancelamentos[id_tarefa] = evento
+    _obter_executor().submit(_executar, id_tarefa, evento, cancelavel, funcao, args, kwargs)
+    return id_tarefa
+
+
+def _executar(id_tarefa, evento, cancelavel, funcao, args, kwargs):
+    try:
+        if evento.is_set():
+            _alterar(id_tarefa, estado=CANCELADA, etapa='Cancelada', terminada=datetime.now().isoformat())
+            return
+        _alterar(id_tarefa, estado=EXECUTANDO, etapa='Iniciando', iniciada=datetime.now().isoformat())
+        tmp = f"{_caminho(id_tarefa, 'pkl')}.tmp"
+        try:
+            resultado = funcao(Progresso(id_tarefa, evento, cancelavel), *args, **kwargs)
+            # Resultado que não pode ser gravado (não serializável, disco cheio) também é falha
+            with open(tmp, 'wb') as f:
+                pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, _caminho(id_tarefa, 'pkl'))
+        except TarefaCancelada:
+            _alterar(id_tarefa, estado=CANCELADA, etapa='Cancelada', terminada=datetime.now().isoformat())
+            return
+        except Exception as e:
+            traceback.print_exc()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            _alterar(id_tarefa, estado=FALHOU, etapa='Falhou', erro=str(e), terminada=datetime.now().isoformat())
+            return
+
+        _alterar(id_tarefa, estado=CONCLUIDA, etapa='Concluída', fracao=1.0, terminada=datetime.now().isoformat())
+    finally:
+        with _trava:
+            _cancelamentos.pop(id_tarefa, None)
+
+
+def obter(id_tarefa):
+    """
+    Registro da tarefa (dict) ou None. Tarefas não terminadas que não pertencem a
+    este processo (servidor reiniciado no meio) passam a 'interrompida'.
+    """
+    registro = _ler(id_tarefa)
+    if registro is None or registro['estado'] in FINAIS:
+        return registro
+    with _trava:
+        ativa = id_tarefa in _cancelamentos
+    if not ativa:
+        registro = _alterar(id_tarefa, estado=INTERROMPIDA, etapa='Interrompida',
+                            erro='O servidor foi reiniciado durante a tarefa.',
+                            terminada=datetime.now().isoformat())
+    return registro
+
+
+def listar(tipo=None, limite=20):
+    """Tarefas mais recentes primeiro, opcionalmente de um tipo."""
+    if not os.path.isdir(PASTA_TAREFAS):
+        return []
+    ids = sorted((n[:-5] for n in os.listdir(PASTA_TAREFAS) if n.endswith('.json')), reverse=True)
+    registros = []
+    for id_tarefa in ids:
+        registro = obter(id_tarefa)
+        if registro is None or (tipo is not None and registro['tipo'] != tipo):
+            continue
+        registros.append(registro)
+        if len(registros) >= limite:
+            break
+    return registros
+
+
+def ultima(tipo, nao_entregue=True):
+    """A tarefa mais recente do tipo (só as ainda não entregues à tela, por padrão)."""
+    for registro in listar(tipo):
+        if not nao_entregue or not registro.get('entregue'):
+            return registro
+    return None
+
+
+def resultado(id_tarefa, entregar=False):
+    """Resultado de uma tarefa concluída (None se não houver). entregar=True marca como recebido pela tela."""
+    try:
+        with open(_caminho(id_tarefa, 'pkl'), 'rb') as f:
+            valor = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        valor = None
+    if entregar:
+        marcar_entregue(id_tarefa)
+    return valor
+
+
+def marcar_entregue(id_tarefa):
+    """A tela já mostrou o desfecho: a tarefa não é mais retomada por ultima()."""
+    _alterar(id_tarefa, entregue=True)
+
+
+def cancelar(id_tarefa):
+    """
+    Pede o cancelamento. Na fila, a tarefa nem começa; em execução, para na próxima
+    etapa (se cancelável). Retorna False se a tarefa já terminou ou não é deste processo.
+    """
+    with _trava:
+        evento = _cancelamentos.get(id_tarefa)
+    registro = _ler(id_tarefa)
+    if evento is None or registro is None or registro['estado'] in FINAIS:
+        return False
+    if registro['estado'] == EXECUTANDO and not registro.get('cancelavel', True):
+        return False
+    evento.set()
+    _alterar(id_tarefa, etapa='Cancelando...')
+    return True
+
+
+def podar(dias=DIAS_MANTIDOS):
+    """Apaga registros e resultados de tarefas terminadas há mais de `dias` dias."""
+    limite = datetime.now() - timedelta(days=dias)
+    removidas = 0
+    for registro in listar(limite=10**9):
+        if registro['estado'] not in FINAIS or not registro.get('terminada'):
+            continue
+        if datetime.fromisoformat(registro['terminada']) >= limite:
+            continue
+        for extensao in ('json', 'pkl'):
+            try:
+                os.remove(_caminho(registro['id'], extensao))
+            except FileNotFoundError:
+                pass
+        removidas += 1
+    return removidas
@@ -0,0 +1,531 @@
+"""
+Transações multi-arquivo para as operações que alteram vários pickles de uma vez
+(conciliação de cartão, conciliação IPES, antecipação, baixa de convênio).
+
+As alterações ficam preparadas em memória e só vão para o disco no final do
+bloco `with`, todas juntas:
+
+    from components.transacao import Transacao
+    with Transacao() as tx:
+        df = tx.ler('data/recebimentos_pendentes.pkl')
+        ...
+        tx.gravar(df, 'data/recebimentos_pendentes.pkl')
+        tx.anexar_ledger(novas_movimentacoes)
+
+Protocolo de gravação:
+    1. cada DataFrame é gravado em '<destino>.tx-<id>' e sincronizado (fsync);
+    2. a versão atual de cada destino é preservada em '<destino>.bak-<id>';
+    3. o diário data/transacoes/<id>.json é gravado com fsync (ponto de commit);
+    4. os temporários são renomeados sobre os destinos e diário/backups são apagados.
+
+Concorrência: tx.ler() guarda a versão de cada arquivo lido (components.travas).
+No commit os destinos são travados e, se algum foi gravado por outro usuário
+depois da leitura, a transação falha com ConflitoVersao sem gravar nada. As
+funções decoradas com @com_retentativa refazem a operação inteira (releitura +
+alterações) algumas vezes antes de desistir. Novos segmentos do ledger nunca
+conflitam, pois são arquivos novos.
+
+Tabelas do backend SQLite (components.banco_sql): tx.selecionar() e
+tx.atualizar() viram SELECT/UPDATE indexados. Nesse caso o diário é gravado
+dentro do próprio banco, na mesma transação SQL, e o COMMIT do banco passa a ser
+o ponto de commit.
+
+Tabelas particionadas por mês (components.particoes): tx.gravar() da tabela
+inteira ou tx.gravar_particoes() de alguns meses viram, no commit, as partições
+alteradas + o manifesto, gravadas pelo mesmo protocolo. A trava e a versão são as
+do caminho lógico. Antes das renomeações a operação é registrada no WAL
+(components.wal) e o manifesto guarda o lsn dela.
+
+Se o processo cair antes do passo 3 nada mudou (sobram apenas temporários '.tx-'
+que ninguém lê); depois do passo 3 recuperar_transacoes() conclui as renomeações. Se uma renomeação
+falhar com o processo ainda vivo, os backups são restaurados.
+"""
+import os
+import json
+import time
+import shutil
+import pickle
+import functools
+import threading
+from components import repositorio
+from components import banco_sql
+from components import esquemas
+from components import ledger
+from components import particoes
+from components import travas
+from components import wal
+from components.travas import ConflitoVersao
+
+PASTA_DIARIO = 'data/transacoes'
+
+# Quantas vezes uma operação é refeita quando outro usuário grava ao mesmo tempo
+TENTATIVAS_CONFLITO = 3
+
+# Transações deste processo sendo aplicadas agora (a recuperação não deve tocá-las)
+_ativas = set()
+_trava_ativas = threading.Lock()
+
+
+def _fsync_pasta(pasta):
+    # Não suportado em todos os sistemas (ex.: Windows); a renomeação continua atômica
+    try:
+        fd = os.open(pasta or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _gravar_sincronizado(df, caminho):
+    with open(caminho, 'wb') as f:
+        pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _gravar_diario(caminho, conteudo):
+    tmp = f"{caminho}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, caminho)
+    _fsync_pasta(os.path.dirname(caminho))
+
+
+def _preservar(destino, backup):
+    """Guarda a versão atual do destino (hard link quando possível, senão cópia)."""
+    if not os.path.exists(destino):
+        return False
+    try:
+        os.link(destino, backup)
+    except OSError:
+        shutil.copy2(destino, backup)
+    return True
+
+
+def _remover_se_existir(caminho):
+    if os.path.exists(caminho):
+        os.remove(caminho)
+
+
+def _processo_vivo(pid):
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _em_andamento(id_transacao, pid):
+    """Transação ainda sendo aplicada (por este processo ou por outro vivo)."""
+    with _trava_ativas:
+        if id_transacao in _ativas:
+            return True
+    return _processo_vivo(pid)
+
+
+def _atualizar_df(df, coluna, chaves, valores, padroes=None):
+    """Aplica em memória o equivalente ao UPDATE de banco_sql.atualizar."""
+    chaves = list(chaves)
+    mascara = df.index.isin(chaves) if coluna is None else df[coluna].isin(chaves)
+    for nome, padrao in (padroes or {}).items():
+        if nome not in df.columns:
+            df[nome] = padrao
+    for nome, valor in valores.items():
+        df.loc[mascara, nome] = valor
+    return int(mascara.sum())
+
+
+class Transacao:
+    """Unidade de trabalho: agrupa gravações de DataFrames e as aplica de forma atômica."""
+
+    def __init__(self, registrar_wal=True):
+        """
+        Args:
+            registrar_wal: registra no WAL as alterações das tabelas particionadas
+                (False só para regravações sem mudança de conteúdo, como migrações).
+        """
+        self.id = f"{time.time_ns():020d}_{os.getpid()}_{threading.get_ident()}"
+        self._gravacoes = {}   # destino -> DataFrame
+        self._segmentos = []   # (nome, destino) dos segmentos novos do ledger
+        self._versoes = {}     # caminho -> versão vista na primeira leitura
+        self._banco = []       # (caminho, operação(con)) para tabelas do backend SQLite
+        self._particionadas = {}   # caminho lógico -> ({mês: DataFrame}, tabela inteira?)
+        self._operacoes = {}   # caminho lógico -> [(op, dados)] do WAL (None = sem detalhe)
+        self._reaplicadas = {}     # caminho lógico -> lsn reaplicado por wal.recuperar
+        self._registrar_wal = registrar_wal
+
+    # ---------- preparação ----------
+
+    def _registrar_versao(self, caminho, leitura):
+        # Trava compartilhada para que versão e conteúdo lidos sejam do mesmo momento
+        with travas.travar(caminho, exclusiva=False):
+            versao = travas.versao(caminho)
+            resultado = leitura()
+        self._versoes.setdefault(caminho, versao)
+        return resultado
+
+    def ler(self, caminho):
+        """Lê um arquivo considerando o que já foi preparado nesta transação."""
+        if caminho in self._gravacoes:
+            return self._gravacoes[caminho]
+        if caminho in self._particionadas:
+            partes, completo = self._particionadas[caminho]
+            if not completo:
+                atuais = particoes.dividir(self._registrar_versao(
+                    caminho, lambda: repositorio.ler_tabela(caminho)), caminho)
+                partes = dict(atuais, **partes)
+            return particoes.juntar(partes.values())
+        return self._registrar_versao(caminho, lambda: repositorio.ler_tabela(caminho))
+
+    def ler_particoes(self, caminho, chaves):
+        """{mês: DataFrame} de alguns meses de uma tabela particionada."""
+        chaves = list(chaves)
+        preparadas, completo = self._particionadas.get(caminho, ({}, False))
+        faltantes = [c for c in chaves if c not in preparadas]
+        lidas = {}
+        if faltantes and not completo:
+            lidas = self._registrar_versao(caminho, lambda: particoes.ler_particoes(caminho, faltantes))
+        return {c: preparadas[c] if c in preparadas else lidas[c]
+                for c in chaves if c in preparadas or c in lidas}
+
+    def selecionar(self, caminho, coluna, valores):
+        """
+        Só as linhas em que `coluna` (None = índice original do arquivo) está em
+        `valores`. No backend SQLite é uma consulta indexada.
+        """
+        if caminho in self._gravacoes or caminho in self._particionadas:
+            df = self.ler(caminho)
+            mascara = df.index.isin(list(valores)) if coluna is None else df[coluna].isin(list(valores))
+            return df[mascara].copy()
+        return self._registrar_versao(caminho, lambda: repositorio.selecionar(caminho, coluna, valores))
+
+    def _anotar(self, caminho, operacao):
+        """Guarda a operação do WAL; uma gravação sem operação vira 'substituir_meses'."""
+        if operacao is None:
+            self._operacoes[caminho] = None
+        elif self._operacoes.get(caminho, []) is not None:
+            self._operacoes.setdefault(caminho, []).append(operacao)
+
+    def gravar(self, df, caminho, operacao=None):
+        """
+        Prepara a gravação de df em caminho (efetivada só no commit).
+        `operacao` ((op, dados), ver components.wal) descreve a alteração por linha
+        em tabelas particionadas.
+        """
+        if banco_sql.gerencia(caminho):
+            self._banco.append((caminho, lambda con: banco_sql.gravar(df, caminho, con=con)))
+        elif particoes.gerencia(caminho):
+            self._particionadas[caminho] = (particoes.dividir(df, caminho), True)
+            self._anotar(caminho, operacao)
+        else:
+            self._gravacoes[caminho] = df
+
+    def gravar_particoes(self, caminho, partes, operacao=None):
+        """
+        Prepara a troca de alguns meses ({mês: DataFrame}) de uma tabela
+        particionada; os demais ficam como estão. Um DataFrame vazio remove o mês.
+        """
+        preparadas, completo = self._particionadas.get(caminho, ({}, False))
+        self._particionadas[caminho] = (dict(preparadas, **partes), completo)
+        self._anotar(caminho, operacao)
+
+    def reaplicando(self, caminho, lsn):
+        """Gravação de operações já registradas no WAL (não registra de novo)."""
+        self._reaplicadas[caminho] = lsn
+
+    def atualizar(self, caminho, coluna, chaves, valores, padroes=None):
+        """
+        Prepara a atualização de `valores` ({coluna: valor}) nas linhas cujas
+        `coluna` (None = índice original) estão em `chaves`. No backend SQLite
+        vira UPDATE indexado; em pickle altera o DataFrame e regrava o arquivo.
+        `padroes` dá o valor das demais linhas quando a coluna ainda não existe.
+        """
+        chaves = list(chaves)
+        if banco_sql.gerencia(caminho):
+            self._banco.append((caminho, lambda con: banco_sql.atualizar(
+                caminho, coluna, chaves, valores, padroes=padroes, con=con)))
+            return
+        df = self._gravacoes[caminho] if caminho in self._gravacoes else self.ler(caminho)
+        _atualizar_df(df, coluna, chaves, valores, padroes)
+        # Em tabelas particionadas só os meses alterados são regravados no commit
+        self.gravar(df, caminho, operacao=('atualizar', {
+            'coluna': coluna, 'chaves': chaves, 'valores': valores, 'padroes': padroes}))
+
+    def anexar_ledger(self, registros):
+        """Prepara um novo segmento do ledger com as movimentações informadas."""
+        df = ledger._como_dataframe(registros)
+        if df.empty:
+            return 0
+        nome, destino = ledger.novo_segmento()
+        self._gravacoes[destino] = df.reset_index(drop=True)
+        self._segmentos.append((nome, destino))
+        return len(df)
+
+    # ---------- efetivação ----------
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_exc, exc, tb):
+        if tipo_exc is None:
+            self.commit()
+        else:
+            self.descartar()
+        return False
+
+    def descartar(self):
+        self._gravacoes.clear()
+        self._segmentos.clear()
+        self._versoes.clear()
+        self._banco.clear()
+        self._particionadas.clear()
+        self._operacoes.clear()
+        self._reaplicadas.clear()
+
+    def commit(self):
+        if not self._gravacoes and not self._banco and not self._particionadas:
+            return
+
+        segmentos = {destino for _, destino in self._segmentos}
+        versionados = [d for d in self._gravacoes if d not in segmentos]
+        versionados += [c for c, _ in self._banco if c not in versionados]
+        versionados += [c for c in self._particionadas if c not in versionados]
+        with _trava_ativas:
+            _ativas.add(self.id)
+        registrados = []
+        try:
+            with travas.travar(versionados):
+                for destino in versionados:
+                    if destino in self._versoes:
+                        travas.verificar_versao(destino, self._versoes[destino])
+                try:
+                    # Partições comparadas com o disco já sob a trava exclusiva
+                    for caminho, (partes, completo) in self._particionadas.items():
+                        gravacoes = particoes.preparar(caminho, partes, completo)
+                        lsn = self._registrar_no_wal(caminho, gravacoes, registrados)
+                        gravacoes[particoes.caminho_manifesto(caminho)].attrs['lsn'] = lsn
+                        self._gravacoes.update(gravacoes)
+                    if self._banco:
+                        self._aplicar_com_banco()
+                    else:
+                        self._aplicar()
+                except Exception:
+                    for caminho, lsn in registrados:
+                        wal.abortar(caminho, lsn)
+                    raise
+                for destino in versionados:
+                    travas.incrementar_versao(destino)
+                for caminho in self._particionadas:
+                    particoes.limpar(caminho)
+        finally:
+            with _trava_ativas:
+                _ativas.discard(self.id)
+
+        for destino, df in self._gravacoes.items():
+            repositorio.registrar_gravacao(df, destino)
+        for nome, destino in self._segmentos:
+            ledger.apos_append(self._gravacoes[destino], nome)
+        for caminho in self._particionadas:
+            try:
+                if wal.precisa_checkpoint(caminho):
+                    wal.checkpoint(caminho)
+            except Exception as e:
+                # Os dados já foram gravados; o checkpoint é tentado de novo no próximo commit
+                print(f"Erro ao criar checkpoint de {caminho}: {e}")
+        self.descartar()
+
+    def _registrar_no_wal(self, caminho, gravacoes, registrados):
+        """Registra a alteração da tabela particionada no WAL e devolve o lsn do manifesto."""
+        if caminho in self._reaplicadas:
+            return self._reaplicadas[caminho]
+        if not self._registrar_wal:
+            return wal.lsn_atual()
+        operacoes = self._operacoes.get(caminho)
+        if not operacoes:
+            operacao = wal.substituicao(caminho, gravacoes)
+            if not operacao[1]['partes']:
+                # Nenhum mês mudou: nada a registrar
+                return wal.lsn_aplicado(caminho)
+            operacoes = [operacao]
+        lsn = wal.registrar(caminho, operacoes)
+        registrados.append((caminho, lsn))
+        return lsn
+
+    def _preparar_arquivos(self):
+        """Passos 1 e 2: temporários sincronizados + backups das versões atuais."""
+        # Grava já no formato compacto; o mesmo DataFrame vai para o cache no fim
+        self._gravacoes = {d: esquemas.compactar(df, d) for d, df in self._gravacoes.items()}
+        entradas = []
+        try:
+            for destino, df in self._gravacoes.items():
+                entrada = {'destino': destino, 'tmp': f"{destino}.tx-{self.id}",
+                           'backup': f"{destino}.bak-{self.id}", 'tinha_original': False}
+                entradas.append(entrada)
+                os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+                _gravar_sincronizado(df, entrada['tmp'])
+                entrada['tinha_original'] = _preservar(destino, entrada['backup'])
+        except Exception:
+            _descartar_preparacao(entradas)
+            raise
+        return entradas
+
+    def _aplicar(self):
+        entradas = self._preparar_arquivos()
+
+        # 3. diário = ponto de commit
+        os.makedirs(PASTA_DIARIO, exist_ok=True)
+        caminho_diario = os.path.join(PASTA_DIARIO, f"{self.id}.json")
+        diario = {'id': self.id, 'pid': os.getpid(), 'estado': 'aplicando', 'entradas': entradas}
+        _gravar_diario(caminho_diario, diario)
+
+        # 4. renomeações
+        try:
+            _renomear(entradas)
+        except Exception:
+            diario['estado'] = 'desfazendo'
+            _gravar_diario(caminho_diario, diario)
+            _desfazer(entradas)
+            _remover_se_existir(caminho_diario)
+            raise
+
+        _finalizar(entradas, caminho_diario)
+
+    def _aplicar_com_banco(self):
+        """
+        Variante com tabelas no SQLite: o diário é gravado no próprio banco, na
+        mesma transação SQL das alterações, e o COMMIT do banco é o ponto de commit.
+        Depois dele os arquivos só podem avançar (recuperar_transacoes conclui).
+        """
+        entradas = self._preparar_arquivos()
+        con = banco_sql.conexao()
+        try:
+            con.execute('BEGIN IMMEDIATE')
+            for _, operacao in self._banco:
+                operacao(con)
+            if entradas:
+                banco_sql.registrar_diario(con, self.id, entradas)
+            con.execute('COMMIT')
+        except Exception:
+            if con.in_transaction:
+                con.execute('ROLLBACK')
+            _descartar_preparacao(entradas)
+            raise
+
+        if entradas:
+            _renomear(entradas)
+            _finalizar(entradas, None)
+            banco_sql.concluir_diario(self.id)
+
+
+def _descartar_preparacao(entradas):
+    for e in entradas:
+        _remover_se_existir(e['tmp'])
+        _remover_se_existir(e['backup'])
+
+
+def _renomear(entradas):
+    for e in entradas:
+        os.replace(e['tmp'], e['destino'])
+    for pasta in {os.path.dirname(e['destino']) for e in entradas}:
+        _fsync_pasta(pasta)
+
+
+def com_retentativa(funcao):
+    """
+    Refaz a operação quando a transação dela falha por ConflitoVersao.
+    Para funções que retornam (sucesso, mensagem), como as de conciliação.
+    """
+    @functools.wraps(funcao)
+    def executar(*args, **kwargs):
+        for tentativa in range(1, TENTATIVAS_CONFLITO + 1):
+            try:
+                return funcao(*args, **kwargs)
+            except ConflitoVersao as e:
+                print(f"Conflito de gravação em {e} (tentativa {tentativa}/{TENTATIVAS_CONFLITO}); refazendo operação.")
+                time.sleep(0.05 * tentativa)
+        return False, "Os dados foram alterados por outro usuário ao mesmo tempo. Tente novamente."
+    return executar
+
+
+def _desfazer(entradas):
+    """Restaura as versões anteriores dos destinos listados no diário."""
+    for e in entradas:
+        _remover_se_existir(e['tmp'])
+        if e['tinha_original'] and os.path.exists(e['backup']):
+            os.replace(e['backup'], e['destino'])
+        elif not e['tinha_original']:
+            _remover_se_existir(e['destino'])
+        repositorio.invalidar(e['destino'])
+
+
+def _finalizar(entradas, caminho_diario):
+    for e in entradas:
+        _remover_se_existir(e['backup'])
+    if caminho_diario:
+        _remover_se_existir(caminho_diario)
+
+
+def _avancar(entradas):
+    """Conclui as renomeações de uma transação já confirmada."""
+    for e in entradas:
+        with travas.travar(e['destino']):
+            if os.path.exists(e['tmp']):
+                os.replace(e['tmp'], e['destino'])
+            travas.incrementar_versao(e['destino'])
+        repositorio.invalidar(e['destino'])
+
+
+def recuperar_transacoes():
+    """
+    Conclui ou desfaz transações interrompidas por queda do processo.
+    Chamado na inicialização do app; retorna quantas transações foram tratadas.
+    """
+    tratadas = 0
+    if banco_sql.ativo():
+        for id_transacao, pid, entradas in banco_sql.diarios_pendentes():
+            if _em_andamento(id_transacao, pid):
+                continue
+            _avancar(entradas)
+            _finalizar(entradas, None)
+            banco_sql.concluir_diario(id_transacao)
+            print(f"Transação {id_transacao} concluída na recuperação.")
+            tratadas += 1
+
+    if not os.path.isdir(PASTA_DIARIO):
+        return tratadas
+
+    for nome in sorted(os.listdir(PASTA_DIARIO)):
+        if not nome.endswith('.json'):
+            continue
+        caminho_diario = os.path.join(PASTA_DIARIO, nome)
+        try:
+            with open(caminho_diario, 'r', encoding='utf-8') as f:
+                diario = json.load(f)
+        except Exception as e:
+            print(f"Diário de transação ilegível {nome}: {e}")
+            continue
+        if _em_andamento(diario.get('id'), diario.get('pid', -1)):
+            continue
+
+        entradas = diario.get('entradas', [])
+        if diario.get('estado') == 'desfazendo':
+            _desfazer(entradas)
+            _remover_se_existir(caminho_diario)
+            print(f"Transação {diario.get('id')} desfeita na recuperação.")
+        else:
+            _avancar(entradas)
+            _finalizar(entradas, caminho_diario)
+            print(f"Transação {diario.get('id')} concluída na recuperação.")
+        tratadas += 1
+
+    return tratadas
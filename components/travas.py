@@ -0,0 +1,112 @@
+"""
+Travas por arquivo e controle de versão para gravações concorrentes.
+
+Cada arquivo de dados tem um companheiro '<arquivo>.lock' que serve ao mesmo
+tempo de trava consultiva (fcntl.flock) e de contador de versão. Toda gravação
+feita pelo repositório ou por uma transação incrementa o contador com a trava
+exclusiva; uma transação guarda a versão que leu e, no commit, compara com a
+atual (compare-and-swap). Se outro usuário gravou no meio do caminho, a
+transação falha com ConflitoVersao e a operação pode ser refeita.
+
+Sem fcntl (Windows) as travas viram locks de thread, que protegem apenas
+dentro do mesmo processo.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class ConflitoVersao(Exception):
+    """O arquivo foi alterado por outro processo depois de lido."""
+
+
+_local = threading.local()
+_travas_thread = {}
+_trava_registro = threading.Lock()
+
+
+def _caminho_trava(caminho):
+    return f"{os.path.abspath(caminho)}.lock"
+
+
+def _travas_da_thread():
+    if not hasattr(_local, 'abertas'):
+        _local.abertas = {}   # caminho da trava -> [arquivo, contagem]
+    return _local.abertas
+
+
+def _trava_thread(caminho_trava):
+    with _trava_registro:
+        return _travas_thread.setdefault(caminho_trava, threading.RLock())
+
+
+@contextmanager
+def travar(caminhos, exclusiva=True):
+    """
+    Trava os arquivos informados (na ordem alfabética, para evitar deadlock).
+    Reentrante na mesma thread: travar um arquivo já travado não bloqueia.
+    """
+    if isinstance(caminhos, str):
+        caminhos = [caminhos]
+    alvos = sorted({_caminho_trava(c) for c in caminhos})
+    abertas = _travas_da_thread()
+    adquiridas = []
+    try:
+        for alvo in alvos:
+            if alvo in abertas:
+                abertas[alvo][1] += 1
+                adquiridas.append(alvo)
+                continue
+            os.makedirs(os.path.dirname(alvo) or '.', exist_ok=True)
+            arquivo = open(alvo, 'a+')
+            if fcntl is not None:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+            else:
+                _trava_thread(alvo).acquire()
+            abertas[alvo] = [arquivo, 1]
+            adquiridas.append(alvo)
+        yield
+    finally:
+        for alvo in reversed(adquiridas):
+            abertas[alvo][1] -= 1
+            if abertas[alvo][1] > 0:
+                continue
+            arquivo = abertas.pop(alvo)[0]
+            if fcntl is not None:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+            else:
+                _trava_thread(alvo).release()
+            arquivo.close()
+
+
+def versao(caminho):
+    """Versão atual do arquivo (0 se nunca foi gravado pelo repositório)."""
+    try:
+        with open(_caminho_trava(caminho), 'r') as f:
+            conteudo = f.read().strip()
+        return int(conteudo) if conteudo else 0
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def incrementar_versao(caminho):
+    """Incrementa o contador de versão. Deve ser chamado com a trava exclusiva."""
+    nova = versao(caminho) + 1
+    with open(_caminho_trava(caminho), 'r+') as f:
+        f.seek(0)
+        f.truncate()
+        f.write(str(nova))
+        f.flush()
+    return nova
+
+
+def verificar_versao(caminho, esperada):
+    """Lança ConflitoVersao se a versão atual for diferente da esperada."""
+    atual = versao(caminho)
+    if atual != esperada:
+        raise ConflitoVersao(f"{caminho} (versão lida {esperada}, atual {atual})")
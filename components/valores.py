@@ -0,0 +1,214 @@
+"""
+Conversão vetorizada de valores monetários e numéricos das planilhas importadas.
+
+Aceita, na mesma coluna, números já convertidos pelo pandas e textos como
+"R$ 1.234,56", "-R$ 10,00", "R$ -10,00", "1,234.56", "37,60", "-" e vazios.
+Nada é feito linha a linha: a coluna vira um array de str do NumPy e passa pelas
+funções de np.char (sem expressões regulares), e a conversão final é um astype
+para float (pd.to_numeric só nos textos fora do formato "1234.56").
+
+Regras de separadores (texto):
+    vírgula e ponto      o que aparece por último é o decimal ("1.234,56", "1,234.56")
+    só vírgula           decimal ("37,60")
+    só ponto             milhar se houver mais de um ponto ou exatamente 3 dígitos
+                         depois dele ("1.234", "1.234.567"); senão decimal ("37.6")
+
+Quando a amostra do começo da coluna indica menos valores distintos que metade
+das linhas (nas planilhas os mesmos preços se repetem muito), cada valor
+distinto é convertido uma vez (pd.factorize); senão a coluna inteira é
+convertida direto, sem o custo do factorize.
+
+Diferenças em relação aos conversores que cada importador tinha antes (medidas
+com testa_valores.py; os valores que eles já liam certo não mudam):
+    clínica              "37.60" era 3760.0 e "1,234.56" era 1.23456; "-R$ 1.234,56" era 0.0
+    laboratório          "1.234,56", "R$ 1.234,56" e "1,234.56" eram 0.0
+    convênio             "R$ 1.234,56" era 0.0
+    cartões (MULVI/GETNET)  "1.234,56", "R$ 1.234,56" e "1,234.56" eram NaN
+
+Uso:
+    from components import valores
+    centavos, validos = valores.centavos(df['Valor Pago'])
+    df['pago'] = valores.reais(df['Valor Pago'])          # inválidos -> 0.0
+
+    python testa_valores.py [linhas] [--distintos N]    # benchmark contra os conversores antigos
+"""
+import numpy as np
+import pandas as pd
+
+# Textos que significam "sem valor"
+VAZIOS = ['', '-', 'nan', 'NaN', 'None', '<NA>', 'NaT']
+
+# Linhas do começo da coluna usadas para estimar quantos valores distintos ela tem
+AMOSTRA_REPETICOES = 10_000
+
+
+def _textos(serie):
+    """Máscara dos elementos que são texto (os demais são números, datas ou nulos)."""
+    if serie.dtype != object and not pd.api.types.is_string_dtype(serie.dtype):
+        return pd.Series(False, index=serie.index)
+    if pd.api.types.infer_dtype(serie, skipna=True) == 'string':
+        # Só textos e nulos (o caso comum): dispensa olhar elemento por elemento
+        return serie.notna()
+    return pd.Series([isinstance(v, str) for v in serie.to_numpy()], index=serie.index, dtype=bool)
+
+
+def _remover_simbolos(texto):
+    """
+    Remove "R$", espaços (inclusive \\xa0), sinais e parênteses de um array de
+    str em uma passada: os caracteres são vistos como uma matriz de códigos (uma
+    linha por texto) e os que ficam são empurrados para o começo da linha.
+    """
+    if not len(texto) or texto.dtype.itemsize == 0:
+        return texto
+    codigos = np.ascontiguousarray(texto).view(np.uint32).reshape(len(texto), -1)
+    remover = np.zeros(codigos.shape, dtype=bool)
+    for simbolo in ' \xa0-+()':
+        remover |= codigos == ord(simbolo)
+    cifrao = (codigos[:, :-1] == ord('R')) & (codigos[:, 1:] == ord('$'))
+    remover[:, :-1] |= cifrao
+    remover[:, 1:] |= cifrao
+    manter = ~remover & (codigos != 0)
+    # Posição de destino de cada caractere mantido, no array achatado
+    destino = np.cumsum(manter, axis=1, dtype=np.intp)
+    destino += np.arange(0, codigos.size, codigos.shape[1])[:, None] - 1
+    origem = np.flatnonzero(manter)
+    resultado = np.zeros_like(codigos)
+    resultado.ravel()[destino.ravel()[origem]] = codigos.ravel()[origem]
+    return resultado.view(texto.dtype).reshape(len(texto))
+
+
+def _trocar(resultado, texto, linhas, *trocas):
+    """resultado[linhas] = texto[linhas] com as trocas (de, para) aplicadas em ordem."""
+    if not linhas.any():
+        return
+    trecho = texto[linhas]
+    for de, para in trocas:
+        trecho = np.char.replace(trecho, de, para)
+    resultado[linhas] = trecho
+
+
+def _normalizar(texto):
+    """
+    Textos (array NumPy de str) no formato "1234.56" (ou '' quando vazios), com o
+    sinal em uma máscara. Só usa as funções de np.char, que percorrem o array em C.
+    """
+    texto = np.char.strip(texto)   # também tira \xa0, que é espaço para o Python
+    negativo = np.char.startswith(texto, '-') | np.char.startswith(texto, '(') \
+        | (np.char.find(texto, 'R$-') >= 0) | (np.char.find(texto, 'R$ -') >= 0)
+    texto = _remover_simbolos(texto)
+    texto = np.where(np.isin(texto, VAZIOS), '', texto)
+
+    ultima_virgula = np.char.rfind(texto, ',')
+    ultimo_ponto = np.char.rfind(texto, '.')
+    tem_virgula = ultima_virgula >= 0
+    tem_ponto = ultimo_ponto >= 0
+    pontos = np.char.count(texto, '.')
+    digitos_apos_ponto = np.char.str_len(texto) - ultimo_ponto - 1
+
+    # Cada troca de separadores só percorre as linhas em que ela se aplica
+    resultado = texto.copy()
+    # "1.234,56" e "37,60": ponto é milhar, vírgula é decimal
+    _trocar(resultado, texto, tem_virgula & (~tem_ponto | (ultima_virgula > ultimo_ponto)),
+            ('.', ''), (',', '.'))
+    # "1,234.56": vírgula é milhar
+    _trocar(resultado, texto, tem_virgula & tem_ponto & (ultimo_ponto > ultima_virgula), (',', ''))
+    # "1.234" / "1.234.567": só pontos de milhar
+    _trocar(resultado, texto, ~tem_virgula & tem_ponto & ((pontos > 1) | (digitos_apos_ponto == 3)),
+            ('.', ''))
+    return resultado, negativo
+
+
+def _para_float(texto):
+    """
+    Textos normalizados em float64 (NaN nos vazios e inválidos). Os que têm só
+    dígitos ASCII e no máximo um ponto são convertidos pelo astype do NumPy; o
+    resto ("1e3", lixo) fica com pd.to_numeric.
+    """
+    numeros = np.full(len(texto), np.nan)
+    if not len(texto) or texto.dtype.itemsize == 0:
+        return numeros
+    codigos = np.ascontiguousarray(texto).view(np.uint32).reshape(len(texto), -1)
+    digitos = (codigos >= ord('0')) & (codigos <= ord('9'))
+    pontos = codigos == ord('.')
+    simples = (digitos | pontos | (codigos == 0)).all(axis=1) & digitos.any(axis=1) \
+        & (pontos.sum(axis=1) <= 1)
+    numeros[simples] = texto[simples].astype('float64')
+    outros = ~simples & (texto != '')
+    if outros.any():
+        numeros[outros] = pd.to_numeric(pd.Series(texto[outros], dtype=object), errors='coerce')
+    return numeros
+
+
+def _numeros(serie):
+    """Valores em float64 (NaN nos não reconhecidos), sem arredondar para centavos."""
+    eh_texto = _textos(serie).to_numpy()
+    if not eh_texto.any():
+        return pd.to_numeric(serie, errors='coerce').astype('float64')
+    numeros = np.full(len(serie), np.nan)
+    if not eh_texto.all():
+        numeros[~eh_texto] = pd.to_numeric(serie[~eh_texto], errors='coerce').astype('float64')
+    texto, negativo = _normalizar(np.asarray(serie[eh_texto], dtype=str))
+    convertidos = _para_float(texto)
+    numeros[eh_texto] = np.where(negativo, -convertidos, convertidos)
+    return pd.Series(numeros, index=serie.index)
+
+
+def _poucos_distintos(serie):
+    """
+    Indica se os valores distintos são menos da metade das linhas, quando
+    converter só eles compensa o custo do pd.factorize. O total de distintos é
+    estimado pela amostra do começo da coluna (estimador Chao1: valores vistos
+    uma e duas vezes indicam quantos ainda não apareceram).
+    """
+    amostra = serie.iloc[:AMOSTRA_REPETICOES]
+    contagens = amostra.value_counts(dropna=False)
+    distintos = len(contagens)
+    if len(amostra) < len(serie):
+        uma_vez = int((contagens == 1).sum())
+        duas_vezes = int((contagens == 2).sum())
+        distintos += uma_vez * (uma_vez - 1) / (2 * (duas_vezes + 1))
+    return distintos < len(serie) / 2
+
+
+def centavos(serie):
+    """
+    Converte uma coluna de valores em centavos inteiros.
+
+    Returns:
+        tuple: (Series Int64 de centavos, com <NA> nos inválidos; Series bool com
+        True onde o valor foi reconhecido).
+    """
+    serie = pd.Series(serie) if not isinstance(serie, pd.Series) else serie
+    if (serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype)) and _poucos_distintos(serie):
+        # Colunas de dinheiro costumam repetir os mesmos valores: converte cada valor
+        # distinto uma vez e espalha o resultado pelos códigos do factorize
+        codigos, unicos = pd.factorize(serie)
+        por_valor = np.append(_numeros(pd.Series(unicos, dtype=object)).to_numpy(), np.nan)
+        numeros = pd.Series(por_valor[codigos], index=serie.index)
+    else:
+        numeros = _numeros(serie)
+
+    validos = numeros.notna() & np.isfinite(numeros.fillna(0))
+    resultado = pd.Series(np.round(numeros.where(validos) * 100), index=serie.index, name=serie.name)
+    return resultado.astype('Int64'), validos
+
+
+def reais(serie, padrao=0.0):
+    """Valores em reais (float); os não reconhecidos recebem `padrao` (ex.: 0.0 ou np.nan)."""
+    valores, validos = centavos(serie)
+    resultado = valores.astype('float64') / 100
+    return resultado.where(validos, padrao)
+
+
+def inteiros(serie, padrao=0):
+    """
+    Códigos numéricos com pontos de agrupamento ("10.10.10.1" -> 1010101).
+    Números já convertidos pelo pandas são mantidos; os demais recebem `padrao`.
+    """
+    serie = pd.Series(serie) if not isinstance(serie, pd.Series) else serie
+    eh_texto = _textos(serie)
+    numeros = pd.to_numeric(serie.where(~eh_texto), errors='coerce').astype('float64')
+    if eh_texto.any():
+        texto = serie[eh_texto].astype(str).str.replace('.', '', regex=False).str.strip()
+        numeros.loc[eh_texto] = pd.to_numeric(texto, errors='coerce')
+    return numeros.where(np.isfinite(numeros)).fillna(padrao).astype('int64')
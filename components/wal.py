@@ -0,0 +1,511 @@
+"""
+Write-ahead log (WAL) de operações por linha e recuperação para um ponto no tempo.
+
+As tabelas particionadas (components.particoes) registram cada alteração como uma
+operação pequena em data/wal/*.wal antes de gravá-la nas partições:
+
+    anexar            linhas novas (com os rótulos do índice)
+    atualizar         coluna-chave, chaves e valores (baixas, status de repasse)
+    mesclar           linhas inseridas + colunas atualizadas por rótulo (importação)
+    excluir_datas     coluna e dias removidos
+    remover           a tabela inteira foi apagada
+    substituir_meses  meses inteiros, só quando a gravação não informa a operação
+    abortar           a operação de lsn indicado não chegou a ser gravada
+
+Formato binário: cabeçalho fixo (mágico, tamanho, crc32, lsn, instante) + pickle
+da operação. O lsn vem do contador de versão de data/wal/sequencia (components.travas)
+e o manifesto de cada tabela guarda em attrs['lsn'] a última operação aplicada.
+Na abertura do app recuperar() reaplica só a cauda: operações com lsn maior que o
+do manifesto (o processo caiu entre o registro e a gravação). Um registro cortado
+no fim do arquivo (queda durante a escrita) é ignorado.
+
+Checkpoints: a cada OPERACOES_POR_CHECKPOINT lsns a tabela ganha um checkpoint em
+data/wal/checkpoints/<tabela>/, feito com hard links das partições e do manifesto.
+As partições nunca são alteradas no lugar (sempre temporário + rename), então o
+checkpoint não copia dados. restaurar(caminho, momento) parte do último checkpoint
+anterior ao momento e reaplica as operações até ele.
+
+O ledger já é append-only (segmentos com o instante no nome); antes de cada
+reescrita, compactação ou exclusão ele ganha um checkpoint de hard links da base e
+dos segmentos, e restaurar_ledger(momento) monta o histórico daquele instante.
+
+Uso:
+    python -m components.wal --listar
+    python -m components.wal --restaurar data/convenio_ipes.pkl "2025-10-01 18:00"
+    python -m components.wal --restaurar-ledger "2025-10-01 18:00"
+"""
+import os
+import sys
+import time
+import zlib
+import shutil
+import struct
+import pickle
+import pandas as pd
+from components import esquemas
+from components import particoes
+from components import travas
+
+PASTA_WAL = 'data/wal'
+PASTA_CHECKPOINTS = os.path.join(PASTA_WAL, 'checkpoints')
+CAMINHO_SEQUENCIA = os.path.join(PASTA_WAL, 'sequencia')
+TABELA_LEDGER = 'movimentacao_contas'
+
+# Um arquivo de log novo é iniciado quando o atual passa deste tamanho
+TAMANHO_SEGMENTO = 16 * 1024 * 1024
+
+# Distância em lsn a partir da qual uma tabela ganha um novo checkpoint
+OPERACOES_POR_CHECKPOINT = 200
+
+# Checkpoints mantidos por tabela (os mais antigos e o log anterior a eles são apagados)
+CHECKPOINTS_MANTIDOS = 30
+
+_MAGICO = b'SSW1'
+_CABECALHO = struct.Struct('<4sIIQd')   # mágico, tamanho, crc32, lsn, instante (epoch)
+
+
+# ========== ARQUIVOS DE LOG ==========
+
+def _segmentos():
+    """Arquivos de log em ordem; o nome é o primeiro lsn que ele contém."""
+    if not os.path.isdir(PASTA_WAL):
+        return []
+    return sorted(n for n in os.listdir(PASTA_WAL) if n.endswith('.wal'))
+
+
+def _fsync_pasta(pasta):
+    try:
+        fd = os.open(pasta, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def lsn_atual():
+    """Último lsn emitido (0 se nada foi registrado)."""
+    return travas.versao(CAMINHO_SEQUENCIA)
+
+
+def _gravar_registro(operacao):
+    """Acrescenta um registro ao log com fsync e devolve seu lsn."""
+    os.makedirs(PASTA_WAL, exist_ok=True)
+    with travas.travar(CAMINHO_SEQUENCIA):
+        lsn = travas.incrementar_versao(CAMINHO_SEQUENCIA)
+        dados = pickle.dumps(operacao, protocol=pickle.HIGHEST_PROTOCOL)
+        cabecalho = _CABECALHO.pack(_MAGICO, len(dados), zlib.crc32(dados), lsn, time.time())
+
+        nomes = _segmentos()
+        destino = os.path.join(PASTA_WAL, nomes[-1]) if nomes else None
+        novo = destino is None or os.path.getsize(destino) >= TAMANHO_SEGMENTO
+        if novo:
+            destino = os.path.join(PASTA_WAL, f"{lsn:020d}.wal")
+        with open(destino, 'ab') as f:
+            f.write(cabecalho + dados)
+            f.flush()
+            os.fsync(f.fileno())
+        if novo:
+            _fsync_pasta(PASTA_WAL)
+    return lsn
+
+
+def _ler_segmento(caminho, desde_lsn=0):
+    """
+    (lsn, instante, operação) de um arquivo, parando em um registro cortado ou
+    corrompido. Registros com lsn <= desde_lsn são pulados pelo cabeçalho, sem ler
+    nem desserializar a operação.
+    """
+    with open(caminho, 'rb') as f:
+        while True:
+            cabecalho = f.read(_CABECALHO.size)
+            if len(cabecalho) < _CABECALHO.size:
+                return
+            magico, tamanho, crc, lsn, instante = _CABECALHO.unpack(cabecalho)
+            if magico == _MAGICO and lsn <= desde_lsn:
+                f.seek(tamanho, os.SEEK_CUR)
+                continue
+            dados = f.read(tamanho)
+            if magico != _MAGICO or len(dados) < tamanho or zlib.crc32(dados) != crc:
+                print(f"WAL: registro inválido em {caminho} após o lsn {lsn - 1}; restante ignorado.")
+                return
+            yield lsn, instante, pickle.loads(dados)
+
+
+def registros(desde_lsn=0, tabela=None):
+    """
+    Operações com lsn > desde_lsn em ordem, sem as abortadas.
+
+    Returns:
+        list: (lsn, instante, operação).
+    """
+    nomes = _segmentos()
+    lidos = []
+    abortados = set()
+    for i, nome in enumerate(nomes):
+        # O próximo arquivo começa depois: este só interessa se chegar além de desde_lsn
+        if i + 1 < len(nomes) and int(nomes[i + 1][:-4]) <= desde_lsn + 1:
+            continue
+        for lsn, instante, operacao in _ler_segmento(os.path.join(PASTA_WAL, nome), desde_lsn):
+            if tabela is not None and operacao['tabela'] != tabela:
+                continue
+            if operacao['op'] == 'abortar':
+                abortados.add(operacao['lsn'])
+            else:
+                lidos.append((lsn, instante, operacao))
+    return [r for r in lidos if r[0] not in abortados]
+
+
+# ========== REGISTRO (chamado pela Transacao) ==========
+
+def registrar(caminho, operacoes):
+    """
+    Registra as operações de uma transação em uma tabela particionada.
+    Deve ser chamado com a trava exclusiva da tabela, antes de gravar as partições.
+
+    Args:
+        operacoes: lista de (op, dados).
+    """
+    return _gravar_registro({'tabela': particoes._logico(caminho), 'op': 'lote',
+                             'operacoes': list(operacoes)})
+
+
+def abortar(caminho, lsn):
+    """Marca como não aplicada uma operação cuja gravação falhou."""
+    _gravar_registro({'tabela': particoes._logico(caminho), 'op': 'abortar', 'lsn': lsn})
+
+
+def substituicao(caminho, gravacoes):
+    """
+    Operação 'substituir_meses' equivalente às gravações preparadas por
+    particoes.preparar (meses alterados + meses removidos como vazios).
+    """
+    novo = gravacoes[particoes.caminho_manifesto(caminho)]
+    removidos = set(particoes.ler_manifesto(caminho)['particao']) - set(novo['particao'])
+    partes = {chave: pd.DataFrame() for chave in removidos}
+    for chave in novo['particao']:
+        destino = particoes.caminho_particao(caminho, chave)
+        if destino in gravacoes:
+            partes[chave] = gravacoes[destino]
+    return ('substituir_meses', {'partes': partes})
+
+
+# ========== APLICAÇÃO ==========
+
+def aplicar(df, caminho, op, dados):
+    """Aplica uma operação registrada ao DataFrame completo da tabela."""
+    from components.transacao import _atualizar_df
+
+    if op == 'anexar':
+        linhas = dados['linhas']
+        # Idempotente: reaplicar o mesmo anexo não duplica linhas
+        df = df[~df.index.isin(linhas.index)] if not df.empty else df
+        return particoes.juntar([df, linhas])
+    if op == 'atualizar':
+        df = df.copy()
+        _atualizar_df(df, dados['coluna'], dados['chaves'], dados['valores'], dados.get('padroes'))
+        return df
+    if op == 'mesclar':
+        atualizadas = dados['atualizadas']
+        if not atualizadas.empty:
+            df = df.copy()
+            rotulos = atualizadas.index.intersection(df.index)
+            for coluna in atualizadas.columns:
+                df.loc[rotulos, coluna] = atualizadas.loc[rotulos, coluna]
+        inseridas = dados['inseridas']
+        if inseridas.empty:
+            return df
+        df = df[~df.index.isin(inseridas.index)] if not df.empty else df
+        return particoes.juntar([df, inseridas])
+    if op == 'excluir_datas':
+        coluna = dados['coluna']
+        if df.empty or coluna not in df.columns:
+            return df
+        dias = set(pd.to_datetime(pd.Series(list(dados['datas'])), errors='coerce').dropna().dt.normalize())
+        return df[~pd.to_datetime(df[coluna], errors='coerce').dt.normalize().isin(dias)]
+    if op == 'remover':
+        return pd.DataFrame()
+    if op == 'substituir_meses':
+        partes = particoes.dividir(df, caminho)
+        partes.update(dados['partes'])
+        return particoes.juntar(partes.values())
+    raise ValueError(f"Operação desconhecida no WAL: {op}")
+
+
+def _aplicar_registro(df, caminho, operacao):
+    for op, dados in operacao['operacoes']:
+        df = aplicar(df, caminho, op, dados)
+    return df
+
+
+def lsn_aplicado(caminho):
+    return int(particoes.ler_manifesto(caminho).attrs.get('lsn', 0))
+
+
+def recuperar():
+    """
+    Reaplica nas tabelas particionadas as operações registradas e não gravadas
+    (queda entre o registro e a gravação). Chamado na inicialização do app.
+
+    Returns:
+        int: operações reaplicadas.
+    """
+    from components.transacao import Transacao
+
+    reaplicadas = 0
+    if not _segmentos():
+        return reaplicadas
+    for caminho in particoes.TABELAS:
+        if not particoes.gerencia(caminho):
+            continue
+        # Sem nada além do lsn do manifesto não há o que reaplicar, e a trava exclusiva
+        # (que esperaria uma importação gravando a tabela) é dispensada
+        if not registros(lsn_aplicado(caminho), particoes._logico(caminho)):
+            continue
+        # Com a trava, uma transação em andamento em outro processo já terminou ou abortou
+        with travas.travar(caminho):
+            pendentes = registros(lsn_aplicado(caminho), particoes._logico(caminho))
+            if not particoes.existe(caminho):
+                # Tabela apagada: só interessa o que foi registrado depois da remoção
+                remocoes = [i for i, (_, _, operacao) in enumerate(pendentes)
+                            if any(op == 'remover' for op, _ in operacao['operacoes'])]
+                if remocoes:
+                    pendentes = pendentes[remocoes[-1] + 1:]
+            if not pendentes:
+                continue
+            df = particoes.ler(caminho) if particoes.existe(caminho) else pd.DataFrame()
+            for _, _, operacao in pendentes:
+                df = _aplicar_registro(df, caminho, operacao)
+            with Transacao() as tx:
+                tx.gravar(df, caminho)
+                tx.reaplicando(caminho, pendentes[-1][0])
+            reaplicadas += len(pendentes)
+            print(f"WAL: {len(pendentes)} operação(ões) reaplicada(s) em {caminho}.")
+    return reaplicadas
+
+
+# ========== CHECKPOINTS ==========
+
+def _pasta_checkpoints(tabela):
+    return os.path.join(PASTA_CHECKPOINTS, tabela)
+
+
+def _vincular(origem, destino):
+    """Hard link (sem cópia); cópia apenas onde o sistema não suporta links."""
+    try:
+        os.link(origem, destino)
+    except OSError:
+        shutil.copy2(origem, destino)
+
+
+def checkpoints(tabela):
+    """[(lsn, instante_ns, pasta)] dos checkpoints da tabela, do mais antigo ao mais novo."""
+    base = _pasta_checkpoints(tabela)
+    if not os.path.isdir(base):
+        return []
+    itens = []
+    for nome in sorted(os.listdir(base)):
+        if nome.endswith('.tmp'):
+            continue
+        lsn, instante = nome.split('_')
+        itens.append((int(lsn), int(instante), os.path.join(base, nome)))
+    return itens
+
+
+def _criar_checkpoint(tabela, lsn, arquivos):
+    """Cria (de forma atômica) a pasta do checkpoint com links para arquivos {nome: origem}."""
+    destino = os.path.join(_pasta_checkpoints(tabela), f"{lsn:020d}_{time.time_ns():020d}")
+    tmp = f"{destino}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    for nome, origem in arquivos.items():
+        _vincular(origem, os.path.join(tmp, nome))
+    os.replace(tmp, destino)
+    _podar(tabela)
+    return destino
+
+
+def precisa_checkpoint(caminho):
+    existentes = checkpoints(esquemas.nome_tabela(caminho))
+    if not existentes:
+        return particoes.existe(caminho)
+    return lsn_aplicado(caminho) - existentes[-1][0] >= OPERACOES_POR_CHECKPOINT
+
+
+def checkpoint(caminho):
+    """Checkpoint de uma tabela particionada (links das partições e do manifesto)."""
+    with travas.travar(caminho, exclusiva=False):
+        if not particoes.existe(caminho):
+            return None
+        manifesto = particoes.ler_manifesto(caminho)
+        arquivos = {particoes.NOME_MANIFESTO: particoes.caminho_manifesto(caminho)}
+        for chave in manifesto['particao']:
+            arquivos[f"{chave}.pkl"] = particoes.caminho_particao(caminho, chave)
+        return _criar_checkpoint(esquemas.nome_tabela(caminho),
+                                 int(manifesto.attrs.get('lsn', 0)), arquivos)
+
+
+def checkpoint_ledger():
+    """
+    Checkpoint do ledger (base + segmentos), feito antes de reescrever, compactar
+    ou apagar. Deve ser chamado com a trava do ledger.
+    """
+    from components import ledger
+
+    arquivos = {}
+    if os.path.exists(ledger.CAMINHO_BASE):
+        arquivos['base.pkl'] = ledger.CAMINHO_BASE
+    for nome in ledger.segmentos():
+        arquivos[nome] = os.path.join(ledger.PASTA_SEGMENTOS, nome)
+    if not arquivos:
+        return None
+    return _criar_checkpoint(TABELA_LEDGER, lsn_atual(), arquivos)
+
+
+def _podar(tabela):
+    """Mantém os últimos CHECKPOINTS_MANTIDOS e apaga o log que nenhum deles usa."""
+    existentes = checkpoints(tabela)
+    for _, _, pasta in existentes[:-CHECKPOINTS_MANTIDOS]:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    # O log só pode sair se for anterior ao checkpoint mais antigo de todas as tabelas
+    minimos = []
+    for caminho in particoes.TABELAS:
+        if not particoes.gerencia(caminho) or not particoes.existe(caminho):
+            continue
+        cps = checkpoints(esquemas.nome_tabela(caminho))
+        if not cps:
+            return
+        minimos.append(cps[0][0])
+    if not minimos:
+        return
+    limite = min(minimos)
+    nomes = _segmentos()
+    for atual, seguinte in zip(nomes, nomes[1:]):
+        # Todo o arquivo é anterior ao limite se o próximo começa até limite + 1
+        if int(seguinte[:-4]) <= limite + 1:
+            os.remove(os.path.join(PASTA_WAL, atual))
+
+
+def _ler_checkpoint(pasta):
+    partes = [esquemas.expandir(pd.read_pickle(os.path.join(pasta, n)))
+              for n in sorted(os.listdir(pasta)) if n.endswith('.pkl') and n != particoes.NOME_MANIFESTO]
+    return particoes.juntar(partes)
+
+
+# ========== PONTO NO TEMPO ==========
+
+def _instante(momento):
+    return pd.Timestamp(momento).timestamp()
+
+
+def estado_em(caminho, momento):
+    """
+    DataFrame da tabela particionada como estava em `momento` (último checkpoint
+    anterior + operações registradas até o momento).
+
+    Raises:
+        ValueError: se não houver checkpoint anterior ao momento.
+    """
+    limite = _instante(momento)
+    anteriores = [c for c in checkpoints(esquemas.nome_tabela(caminho)) if c[1] / 1e9 <= limite]
+    if not anteriores:
+        raise ValueError(f"Não há checkpoint de {caminho} anterior a {momento}.")
+    lsn, _, pasta = anteriores[-1]
+    df = _ler_checkpoint(pasta)
+    for _, instante, operacao in registros(lsn, particoes._logico(caminho)):
+        if instante > limite:
+            break
+        df = _aplicar_registro(df, caminho, operacao)
+    return df
+
+
+def restaurar(caminho, momento):
+    """
+    Volta a tabela particionada ao estado de `momento`. A restauração também é
+    registrada no WAL, então pode ser desfeita restaurando um momento posterior.
+    """
+    from components.transacao import Transacao
+
+    with travas.travar(caminho):
+        df = estado_em(caminho, momento)
+        with Transacao() as tx:
+            tx.gravar(df, caminho)
+    return len(df)
+
+
+def _instante_segmento(nome):
+    return int(nome.split('_')[0]) / 1e9
+
+
+def estado_ledger_em(momento):
+    """
+    Histórico do ledger em `momento`: a base vigente naquele instante (guardada no
+    primeiro checkpoint posterior, feito antes da reescrita seguinte) mais os
+    segmentos gravados até o momento.
+
+    Raises:
+        ValueError: se o momento for anterior ao período coberto pelos checkpoints.
+    """
+    from components import ledger
+
+    limite = _instante(momento)
+    posteriores = [c for c in checkpoints(TABELA_LEDGER) if c[1] / 1e9 > limite]
+    if posteriores:
+        pasta = posteriores[0][2]
+        base = os.path.join(pasta, 'base.pkl')
+        nomes = [n for n in os.listdir(pasta) if n != 'base.pkl' and n.endswith('.pkl')]
+        caminhos_segmentos = {n: os.path.join(pasta, n) for n in nomes}
+    else:
+        base = ledger.CAMINHO_BASE
+        caminhos_segmentos = {n: os.path.join(ledger.PASTA_SEGMENTOS, n) for n in ledger.segmentos()}
+
+    partes = []
+    if os.path.exists(base):
+        if os.path.getmtime(base) > limite:
+            raise ValueError(f"O ledger não tem checkpoint que cubra {momento}.")
+        partes.append(esquemas.expandir(pd.read_pickle(base)))
+    for nome in sorted(caminhos_segmentos):
+        if _instante_segmento(nome) <= limite:
+            partes.append(esquemas.expandir(pd.read_pickle(caminhos_segmentos[nome])))
+    partes = [p for p in partes if not p.empty]
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+
+def restaurar_ledger(momento):
+    """Volta o ledger ao estado de `momento` (a reescrita guarda um checkpoint antes)."""
+    from components import ledger
+
+    df = estado_ledger_em(momento)
+    ledger.reescrever(df)
+    return len(df)
+
+
+def listar():
+    """{tabela: [(lsn, instante)]} dos checkpoints existentes."""
+    if not os.path.isdir(PASTA_CHECKPOINTS):
+        return {}
+    return {tabela: [(lsn, pd.Timestamp(ns, unit='ns')) for lsn, ns, _ in checkpoints(tabela)]
+            for tabela in sorted(os.listdir(PASTA_CHECKPOINTS))}
+
+
+if __name__ == "__main__":
+    if '--listar' in sys.argv:
+        for tabela, itens in listar().items():
+            print(f"{tabela}: {len(itens)} checkpoint(s)")
+            for lsn, instante in itens:
+                print(f"  lsn {lsn} — {instante:%d/%m/%Y %H:%M:%S}")
+        print(f"Último lsn: {lsn_atual()}")
+    elif '--restaurar' in sys.argv and len(sys.argv) >= 4:
+        i = sys.argv.index('--restaurar')
+        linhas = restaurar(sys.argv[i + 1], sys.argv[i + 2])
+        print(f"✅ {sys.argv[i + 1]} restaurado para {sys.argv[i + 2]}: {linhas} linhas")
+    elif '--restaurar-ledger' in sys.argv and len(sys.argv) >= 3:
+        i = sys.argv.index('--restaurar-ledger')
+        linhas = restaurar_ledger(sys.argv[i + 1])
+        print(f"✅ Ledger restaurado para {sys.argv[i + 1]}: {linhas} linhas")
+    else:
+        print("Uso: python -m components.wal --listar | --restaurar <arquivo> <momento> "
+              "| --restaurar-ledger <momento>")
@@ -8,6 +8,8 @@ from components.functions import (
     salvar_nova_descricao
 )
 from components.importacao import carregar_dados_atendimentos
+from components import repositorio
+from components import cache_importacao
 import pickle
 
 def show():
@@ -151,8 +153,8 @@ def show():
                 if st.checkbox("Confirmo que quero limpar estes dados", key="confirm_clean_specific"):
                     try:
                         caminho = f'data/{arquivo_limpar}.pkl'
-                        if os.path.exists(caminho):
-                            os.remove(caminho)
+                        if repositorio.existe(caminho):
+                            repositorio.remover_tabela(caminho)
                             st.success(f"✅ Dados de {arquivo_limpar} removidos com sucesso!")
                             st.rerun()
                         else:
@@ -169,8 +171,8 @@ def show():
                         arquivos_removidos = []
                         for arquivo in arquivos_dados:
                             caminho = f'data/{arquivo}.pkl'
-                            if os.path.exists(caminho):
-                                os.remove(caminho)
+                            if repositorio.existe(caminho):
+                                repositorio.remover_tabela(caminho)
                                 arquivos_removidos.append(arquivo)
                         
                         if arquivos_removidos:
@@ -270,8 +272,8 @@ def show():
                 
                 for arquivo in ['movimento_clinica', 'movimento_laboratorio', 'convenios_detalhados']:
                     caminho = f'data/{arquivo}.pkl'
-                    if os.path.exists(caminho):
-                        size = os.path.getsize(caminho)
+                    if repositorio.existe(caminho):
+                        size = repositorio.tamanho(caminho)
                         total_size += size
                         arquivos_info.append(f"📁 {arquivo}: {size/1024:.1f} KB")
                     else:
@@ -343,6 +345,21 @@ def show():
                 st.cache_data.clear()
                 st.success("✅ Cache limpo com sucesso!")
                 st.info("🔄 Recarregue a página para ver as mudanças")
+
+            st.markdown("**Cache de Importação:**")
+            estatisticas_cache = cache_importacao.estatisticas()
+            st.markdown(
+                f"📦 {estatisticas_cache['entradas']} arquivo(s) processado(s), "
+                f"{estatisticas_cache['bytes']/1024/1024:.1f} de "
+                f"{estatisticas_cache['limite_bytes']/1024/1024:.0f} MB"
+            )
+            st.markdown(
+                f"🎯 Acertos: {estatisticas_cache['acertos']} | Faltas: {estatisticas_cache['faltas']} "
+                f"({estatisticas_cache['taxa_acerto']:.0%})"
+            )
+            if st.button("🗑️ Limpar Cache de Importação", type="secondary"):
+                removidas = cache_importacao.limpar()
+                st.success(f"✅ {removidas} arquivo(s) removido(s) do cache de importação!")
         
         with col_perf2:
             st.markdown("**Session State:**")
@@ -448,8 +465,8 @@ def show():
             # Verifica arquivos
             for arquivo in ['movimento_clinica', 'movimento_laboratorio', 'convenios_detalhados']:
                 caminho = f'data/{arquivo}.pkl'
-                if os.path.exists(caminho):
-                    size = os.path.getsize(caminho)
+                if repositorio.existe(caminho):
+                    size = repositorio.tamanho(caminho)
                     st.markdown(f"✅ {arquivo}.pkl: {size} bytes")
                 else:
                     st.markdown(f"❌ {arquivo}.pkl: Não encontrado")
\ No newline at end of file
@@ -1,8 +1,8 @@
 from pickle import FALSE
 import streamlit as st
 import pandas as pd
-import os
 from datetime import datetime
+from components import ledger
 
 def mostrar_edicao():
     """Página principal de edição de dados."""
@@ -19,28 +19,32 @@ def mostrar_edicao():
     if aba_selecionada == "Movimentação das Contas":
         mostrar_edicao_movimentacao_contas()
 
+def _dados_edicao(tipo):
+    """
+    Histórico e versão lidos ao abrir o editor deste tipo. Ficam na sessão até
+    salvar ou recarregar, para que a versão conferida ao salvar seja a dos dados
+    em edição, e não a da última releitura da página.
+    """
+    chave = f"dados_edicao_movimento_{tipo}"
+    if chave not in st.session_state:
+        st.session_state[chave] = ledger.scan(com_versao=True)
+    return st.session_state[chave]
+
+def _descartar_edicao():
+    """Descarta os dados e as edições pendentes dos dois editores (releitura na próxima exibição)."""
+    for tipo in ('entrada', 'saida'):
+        st.session_state.pop(f"dados_edicao_movimento_{tipo}", None)
+        st.session_state.pop(f"editor_movimento_{tipo}", None)
+
 def mostrar_edicao_movimentacao_contas():
     """Edição da tabela movimentacao_contas.pkl."""
     st.markdown("### 💰 Edição - Movimentação das Contas")
     st.caption("Edite manualmente os registros de movimentação financeira")
     
-    # Carrega dados
-    caminho_arquivo = 'data/movimentacao_contas.pkl'
-    
-    if not os.path.exists(caminho_arquivo):
+    if not ledger.existe():
         st.error("Arquivo movimentacao_contas.pkl não encontrado!")
         return
     
-    try:
-        df_movimento = pd.read_pickle(caminho_arquivo)
-    except Exception as e:
-        st.error(f"Erro ao carregar arquivo: {e}")
-        return
-    
-    if df_movimento.empty:
-        st.warning("Nenhum dado encontrado no arquivo movimentacao_contas.pkl")
-        return
-    
     # Botões para selecionar tipo de movimentação
     st.markdown("#### 🔄 Tipo de Movimentação")
     col1, col2 = st.columns(2)
@@ -60,6 +64,16 @@ def mostrar_edicao_movimentacao_contas():
     # Recupera tipo do session_state ou usa padrão
     tipo_selecionado = st.session_state.get('tipo_movimento_edicao', 'entrada')
     
+    try:
+        df_movimento, versao_lida = _dados_edicao(tipo_selecionado)
+    except Exception as e:
+        st.error(f"Erro ao carregar arquivo: {e}")
+        return
+    
+    if df_movimento.empty:
+        st.warning("Nenhum dado encontrado no arquivo movimentacao_contas.pkl")
+        return
+    
     # Exibe tipo atual
     st.info(f"💡 Exibindo movimentações de: **{tipo_selecionado.upper()}**")
     
@@ -172,54 +186,63 @@ def mostrar_edicao_movimentacao_contas():
     
     # Botões de ação
     st.markdown("---")
-    col_save, col_export, col_info = st.columns([1, 1, 2])
+    col_save, col_export, col_reload, col_info = st.columns([1, 1, 1, 2])
     
     with col_save:
         if st.button("💾 Salvar Alterações", type="primary", use_container_width=True):
-            salvar_alteracoes_movimento(df_editado, df_movimento, df_filtrado, tipo_selecionado)
+            salvar_alteracoes_movimento(df_editado, df_edicao, df_filtrado, versao_lida, tipo_selecionado)
     
     with col_export:
         if st.button("📊 Exportar Excel", type="secondary", use_container_width=True):
             exportar_movimento_excel(df_editado, tipo_selecionado)
     
+    with col_reload:
+        if st.button("🔄 Recarregar", type="secondary", use_container_width=True,
+                     help="Relê o histórico e descarta as edições não salvas"):
+            _descartar_edicao()
+            st.rerun()
+    
     with col_info:
         st.info("💡 As alterações só serão aplicadas após clicar em 'Salvar Alterações'")
 
-def salvar_alteracoes_movimento(df_editado, df_original, df_filtrado_original, tipo_movimento):
-    """Salva as alterações feitas na tabela de movimentação."""
+def salvar_alteracoes_movimento(df_editado, df_exibido, df_filtrado_original, versao_lida, tipo_movimento):
+    """
+    Salva as linhas alteradas no editor. Só as partes do ledger que contêm essas
+    linhas são regravadas (ledger.atualizar_linhas), conferindo a versão em que
+    os dados do editor foram lidos.
+    """
     try:
-        # Restaura a data_cadastro para formato datetime
-        df_editado_copy = df_editado.copy()
-        if 'data_cadastro' in df_editado_copy.columns:
-            df_editado_copy['data_cadastro'] = pd.to_datetime(df_editado_copy['data_cadastro'], format='%d/%m/%Y')
-        
-        # Identifica registros alterados comparando com o original
+        # Identifica registros alterados comparando com o que foi exibido
         indices_originais = df_filtrado_original.index
         
-        if len(df_editado_copy) != len(indices_originais):
+        if len(df_editado) != len(indices_originais):
             st.error("Erro: Número de linhas alterado durante a edição!")
             return
         
-        # Atualiza o DataFrame original com as alterações
-        df_atualizado = df_original.copy()
+        colunas = [c for c in df_editado.columns if c != 'data_cadastro']
+        alteradas = (df_editado[colunas].astype(str).to_numpy()
+                     != df_exibido[colunas].astype(str).to_numpy()).any(axis=1)
+        if not alteradas.any():
+            st.info("Nenhuma alteração para salvar.")
+            return
         
-        for i, idx_original in enumerate(indices_originais):
-            for coluna in df_editado_copy.columns:
-                if coluna in df_atualizado.columns:
-                    df_atualizado.loc[idx_original, coluna] = df_editado_copy.iloc[i][coluna]
+        # Índice = posição da linha no histórico lido (ver ledger.scan)
+        alteracoes = df_editado.loc[alteradas, colunas].copy()
+        alteracoes.index = indices_originais[alteradas]
         
         # Adiciona timestamp de edição
-        df_atualizado.loc[indices_originais, 'data_ultima_edicao'] = datetime.now()
+        alteracoes['data_ultima_edicao'] = datetime.now()
         
-        # Salva arquivo
-        os.makedirs('data', exist_ok=True)
-        df_atualizado.to_pickle('data/movimentacao_contas.pkl')
+        linhas = ledger.atualizar_linhas(alteracoes, versao_esperada=versao_lida)
         
-        st.success(f"✅ {len(df_editado_copy)} registros de {tipo_movimento} salvos com sucesso!")
+        st.success(f"✅ {linhas} registros de {tipo_movimento} salvos com sucesso!")
         
-        # Força rerun para atualizar os dados
+        # Força rerun para reler os dados
+        _descartar_edicao()
         st.rerun()
         
+    except ledger.ConflitoVersao:
+        st.error("❌ O histórico foi alterado por outro usuário enquanto você editava. Clique em 'Recarregar' e refaça a edição.")
     except Exception as e:
         st.error(f"❌ Erro ao salvar alterações: {str(e)}")
 
@@ -4,54 +4,48 @@ from datetime import date, datetime, timedelta
 import math
 from streamlit_modal import Modal
 from components.functions import registrar_saida
+from components import repositorio
+from components.transacao import Transacao
 
-def inicializar_status_repasses():
+CAMINHO_MOVIMENTO_CLINICA = 'data/movimento_clinica.pkl'
+
+def inicializar_status_repasses(df):
     """
-    Adiciona a coluna 'status' ao arquivo movimento_clinica.pkl se ela não existir.
-    Todos os registros sem status recebem 'a_pagar' como padrão.
+    Garante a coluna 'status_repasse' no DataFrame lido de movimento_clinica.pkl.
+    Registros sem status (inclusive os importados depois) são tratados como 'a_pagar';
+    o status só é gravado no arquivo quando o repasse é pago.
     """
-    try:
-        caminho_arquivo = 'data/movimento_clinica.pkl'
-        df = pd.read_pickle(caminho_arquivo)
-        
-        # Verifica se a coluna status já existe
-        if 'status_repasse' not in df.columns:
-            # Adiciona a coluna com valor padrão 'a_pagar' para todos os registros
-            df['status_repasse'] = 'a_pagar'
-            
-            # Salva o arquivo atualizado
-            df.to_pickle(caminho_arquivo)
-            st.info("✅ Coluna 'status_repasse' adicionada ao arquivo de movimentos da clínica.")
-        
-        return df
-    except Exception as e:
-        st.error(f"Erro ao inicializar status dos repasses: {e}")
-        return pd.DataFrame()
+    if 'status_repasse' not in df.columns:
+        df['status_repasse'] = 'a_pagar'
+    else:
+        df['status_repasse'] = df['status_repasse'].fillna('a_pagar')
+    return df
 
-def carregar_movimentos_clinica():
-    """Carrega os dados do arquivo movimento_clinica.pkl."""
+def carregar_movimentos_clinica(data_inicio=None, data_fim=None):
+    """
+    Carrega os repasses pendentes de movimento_clinica.pkl no período informado.
+    Só os meses do período são lidos (tabela particionada por data de cadastro).
+    """
     try:
-        # Inicializa a coluna de status se necessário
-        df = inicializar_status_repasses()
+        df = repositorio.ler_periodo(CAMINHO_MOVIMENTO_CLINICA, data_inicio, data_fim)
         
         if df.empty:
             return pd.DataFrame()
         
+        df = inicializar_status_repasses(df)
+        
         # Garante que a coluna de data seja datetime
         if 'data_cadastro' in df.columns:
             df['data_cadastro'] = pd.to_datetime(df['data_cadastro'])
         
         # Filtra apenas registros com repasse médico > 0 E status 'a_pagar'
-        if 'repasse_medico' in df.columns and 'status_repasse' in df.columns:
+        if 'repasse_medico' in df.columns:
             df = df[
                 (df['repasse_medico'] > 0) & 
                 (df['status_repasse'] == 'a_pagar')
             ]
         
         return df
-    except FileNotFoundError:
-        st.error("Arquivo 'movimento_clinica.pkl' não encontrado.")
-        return pd.DataFrame()
     except Exception as e:
         st.error(f"Erro ao carregar dados: {e}")
         return pd.DataFrame()
@@ -59,6 +53,7 @@ def carregar_movimentos_clinica():
 def atualizar_status_repasses(indices_pagos):
     """
     Atualiza o status dos repasses médicos para 'pago' no arquivo movimento_clinica.pkl.
+    Só as partições mensais que contêm os registros pagos são regravadas.
     
     Args:
         indices_pagos (list): Lista de índices dos registros que foram pagos
@@ -67,15 +62,12 @@ def atualizar_status_repasses(indices_pagos):
         bool: True se a atualização foi bem-sucedida, False caso contrário
     """
     try:
-        caminho_arquivo = 'data/movimento_clinica.pkl'
-        df = pd.read_pickle(caminho_arquivo)
-        
-        # Atualiza o status dos registros pagos
-        df.loc[indices_pagos, 'status_repasse'] = 'pago'
-        df.loc[indices_pagos, 'data_pagamento'] = datetime.now()
-        
-        # Salva o arquivo atualizado
-        df.to_pickle(caminho_arquivo)
+        with Transacao() as tx:
+            tx.atualizar(
+                CAMINHO_MOVIMENTO_CLINICA, None, indices_pagos,
+                {'status_repasse': 'pago', 'data_pagamento': datetime.now()},
+                padroes={'status_repasse': 'a_pagar'}
+            )
         return True
         
     except Exception as e:
@@ -134,10 +126,12 @@ def carregar_historico_completo():
     Carrega todos os repasses médicos (pagos e pendentes) para relatórios.
     """
     try:
-        df = pd.read_pickle('data/movimento_clinica.pkl')
+        df = repositorio.ler_tabela(CAMINHO_MOVIMENTO_CLINICA)
         if df.empty:
             return pd.DataFrame()
         
+        df = inicializar_status_repasses(df)
+        
         # Garante que a coluna de data seja datetime
         if 'data_cadastro' in df.columns:
             df['data_cadastro'] = pd.to_datetime(df['data_cadastro'])
@@ -291,9 +285,10 @@ def show():
     tab_pendentes, tab_historico = st.tabs(["💰 Repasses Pendentes", "📊 Histórico Completo"])
     
     with tab_pendentes:
-        df_movimentos = carregar_movimentos_clinica()
+        # Limites do período vêm do manifesto das partições, sem ler os dados
+        intervalo = repositorio.intervalo_datas(CAMINHO_MOVIMENTO_CLINICA)
 
-        if df_movimentos.empty:
+        if intervalo is None:
             st.info("✅ Nenhum repasse médico pendente encontrado.")
             return
 
@@ -303,8 +298,8 @@ def show():
         
         with col_f1:
             # Filtro de período
-            data_min = df_movimentos['data_cadastro'].min().date()
-            data_max = df_movimentos['data_cadastro'].max().date()
+            data_min = intervalo[0].date()
+            data_max = intervalo[1].date()
             
             data_inicio = st.date_input(
                 "Data Início:",
@@ -322,6 +317,13 @@ def show():
                 key="data_fim_medicos"
             )
         
+        # Lê apenas os meses do período selecionado
+        df_movimentos = carregar_movimentos_clinica(data_inicio, data_fim)
+
+        if df_movimentos.empty:
+            st.info("✅ Nenhum repasse médico pendente encontrado no período.")
+            return
+
         with col_f2:
             # Filtro de paciente
             pacientes_disponiveis = ["Todos"] + sorted(list(df_movimentos['paciente'].unique()))
@@ -341,14 +343,9 @@ def show():
             servico_filtro = st.selectbox("Filtrar por Serviços:", servicos_disponiveis, key="servico_medicos")
 
         # --- Aplicar filtros ---
+        # O período já foi aplicado na leitura
         df_filtrado = df_movimentos.copy()
         
-        # Filtro de período
-        df_filtrado = df_filtrado[
-            (df_filtrado['data_cadastro'].dt.date >= data_inicio) &
-            (df_filtrado['data_cadastro'].dt.date <= data_fim)
-        ]
-        
         # Filtro de paciente
         if paciente_filtro != "Todos":
             df_filtrado = df_filtrado[df_filtrado['paciente'] == paciente_filtro]
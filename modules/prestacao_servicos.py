@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 from components.importacao import *
+from components.importacao import submeter_processamento, submeter_importacao
+from components import tarefas
 
 def _ajuda_pill(conteudo_md: str, titulo: str = "Ajuda"):
     """
@@ -58,6 +60,99 @@ AJUDA_GETNET = """**Sistema:** https://minhaconta.getnet.com.br
 **Nome padrão:** Recebivel_Completos_(...).xlsx"""
 
 
+# Intervalo entre as consultas ao andamento de uma tarefa em segundo plano (segundos)
+INTERVALO_ACOMPANHAMENTO = 1.0
+
+
+def _tarefa_em_andamento(chave, tipo):
+    """
+    Id da tarefa acompanhada pela sessão. Depois de recarregar o navegador a sessão
+    é nova: retoma a última tarefa do tipo cujo desfecho ainda não foi mostrado.
+    """
+    if chave not in st.session_state:
+        registro = tarefas.ultima(tipo)
+        if registro is None:
+            return None
+        st.session_state[chave] = registro['id']
+    return st.session_state[chave]
+
+
+def _acompanhar_tarefa(id_tarefa, titulo):
+    """
+    Mostra o andamento da tarefa. Enquanto ela roda, agenda um novo rerun e não
+    retorna; quando termina, devolve o registro final.
+    """
+    import time
+
+    registro = tarefas.obter(id_tarefa)
+    if registro is None or registro['estado'] in tarefas.FINAIS:
+        return registro or {'id': id_tarefa, 'estado': tarefas.INTERROMPIDA, 'erro': 'Tarefa não encontrada.'}
+
+    st.progress(registro.get('fracao') or 0.0, text=f"{titulo}: {registro.get('etapa', '')}")
+    pode_cancelar = registro['estado'] == tarefas.NA_FILA or registro.get('cancelavel', True)
+    if pode_cancelar and st.button("⏹️ Cancelar", key=f"cancelar_{id_tarefa}"):
+        tarefas.cancelar(id_tarefa)
+    time.sleep(INTERVALO_ACOMPANHAMENTO)
+    st.rerun()
+
+
+def _mostrar_falha_tarefa(registro, titulo):
+    if registro['estado'] == tarefas.CANCELADA:
+        st.warning(f"{titulo} cancelado.")
+    else:
+        st.error(f"Erro no {titulo.lower()}: {registro.get('erro') or 'Erro desconhecido'}")
+
+
+def _mostrar_resumo_importacao():
+    """Mensagens e métricas da última importação concluída nesta sessão."""
+    resultado_save = st.session_state.pop('resumo_importacao', None)
+    if resultado_save is None:
+        return
+    st.success("✅ Dados importados com sucesso!")
+
+    # Mostra débitos registrados automaticamente
+    if resultado_save.get('debitos_registrados', 0) > 0:
+        st.success(f"💳 {resultado_save['debitos_registrados']} pagamentos em débito foram registrados automaticamente nas contas:")
+        st.info("• Débito MULVI → Conta BANESE\n• Débito GETNET → Conta SANTANDER")
+    
+    # NOVO: Mostra resultado da consolidação IPES
+    consolidacao_ipes = resultado_save.get('consolidacao_ipes')
+    if consolidacao_ipes:
+        if consolidacao_ipes['sucesso']:
+            st.success(f"🏥 IPES: {consolidacao_ipes['mensagem']}")
+        else:
+            st.warning(f"⚠️ IPES: {consolidacao_ipes['mensagem']}")
+
+    recebimentos = resultado_save.get('recebimentos')
+    if recebimentos:
+        sucesso_recebimentos, msg_recebimentos = recebimentos
+        if sucesso_recebimentos:
+            st.success(f"💰 Recebimentos: {msg_recebimentos}")
+        else:
+            st.warning(f"⚠️ Recebimentos: {msg_recebimentos}")
+    
+    st.markdown("### 📊 Resumo da Importação")
+    col_res1, col_res2, col_res3, col_res4, col_res5, col_res6 = st.columns(6)
+    with col_res1:
+        if resultado_save.get('clinica_linhas', 0) > 0:
+            st.metric("Clínica", f"{resultado_save['clinica_linhas']} registros")
+    with col_res2:
+        if resultado_save.get('laboratorio_linhas', 0) > 0:
+            st.metric("Laboratório", f"{resultado_save['laboratorio_linhas']} registros")
+    with col_res3:
+        if resultado_save.get('convenio_detalhado_linhas', 0) > 0:
+            st.metric("Convênio Detalhado", f"{resultado_save['convenio_detalhado_linhas']} registros")
+    with col_res4:
+        if resultado_save.get('ipes_linhas', 0) > 0:
+            st.metric("Convênio IPES", f"{resultado_save['ipes_linhas']} registros")
+    with col_res5:
+        if resultado_save.get('mulvi_linhas', 0) > 0:
+            st.metric("MULVI", f"{resultado_save['mulvi_linhas']} registros")
+    with col_res6:
+        if resultado_save.get('getnet_linhas', 0) > 0:
+            st.metric("GETNET", f"{resultado_save['getnet_linhas']} registros")
+
+
 def show():
     """Página de Importações - antiga prestação de serviços."""
     st.header("📂 Importações")
@@ -110,39 +205,79 @@ def show():
     
     # Botão de processamento
     st.markdown("---")
-    if st.button("🔄 Processar Arquivos", use_container_width=True):
-        if any([arquivo_clinica, arquivo_laboratorio, arquivo_convenio_detalhado,arquivo_convenio_pdf, arquivo_mulvi, arquivo_getnet]):
-            with st.spinner("Processando arquivos..."):
-                resultado = processar_arquivos(arquivo_clinica, arquivo_laboratorio, arquivo_convenio_detalhado, arquivo_convenio_pdf, arquivo_mulvi, arquivo_getnet)
+    _mostrar_resumo_importacao()
 
-                if resultado['sucesso']:
-                    st.success("Arquivos processados. Verifique os resultados abaixo.")
-                    
-                    # Popula os dados processados na sessão
-                    dados_processados = {}
-                    if resultado.get('dados_clinica') is not None:
-                        dados_processados['clinica'] = resultado['dados_clinica']
-                    if resultado.get('dados_laboratorio') is not None:
-                        dados_processados['laboratorio'] = resultado['dados_laboratorio']
-                    if resultado.get('dados_convenio_detalhado') is not None:
-                        dados_processados['convenio_detalhado'] = resultado['dados_convenio_detalhado']
-                    if resultado.get('dados_convenios') is not None:
-                        dados_processados['convenio_ipes'] = resultado['dados_convenios']
-                    if resultado.get('dados_mulvi') is not None:
-                        dados_processados['mulvi'] = resultado['dados_mulvi']
-                    if resultado.get('dados_getnet') is not None:
-                        dados_processados['credito_getnet'] = resultado['dados_getnet']
-                    
-                    st.session_state.dados_processados = dados_processados
-                                        
-                    st.session_state.conflitos_data = resultado.get('conflitos', {})
-                    
-                    st.rerun() # Força a re-renderização para mostrar os resultados e a mensagem de conflito
-                else:
-                    st.error(f"Erro no processamento: {resultado.get('erro', 'Erro desconhecido')}")
+    tarefa_processamento = _tarefa_em_andamento('tarefa_processamento', 'processamento_importacao')
+    tarefa_importacao = _tarefa_em_andamento('tarefa_importacao', 'importacao')
+
+    if st.button("🔄 Processar Arquivos", use_container_width=True,
+                 disabled=tarefa_processamento is not None or tarefa_importacao is not None):
+        if any([arquivo_clinica, arquivo_laboratorio, arquivo_convenio_detalhado,arquivo_convenio_pdf, arquivo_mulvi, arquivo_getnet]):
+            # Roda em segundo plano: a página volta na hora e acompanha o andamento
+            st.session_state.tarefa_processamento = submeter_processamento({
+                'clinica': arquivo_clinica,
+                'laboratorio': arquivo_laboratorio,
+                'convenio_detalhado': arquivo_convenio_detalhado,
+                'ipes': arquivo_convenio_pdf,
+                'mulvi': arquivo_mulvi,
+                'getnet': arquivo_getnet,
+            })
+            st.rerun()
         else:
             st.warning("Por favor, envie pelo menos um arquivo.")
 
+    if tarefa_processamento is not None:
+        registro = _acompanhar_tarefa(tarefa_processamento, "Processando arquivos")
+        if registro is not None:
+            resultado = tarefas.resultado(registro['id'], entregar=True)
+            del st.session_state.tarefa_processamento
+            if registro['estado'] != tarefas.CONCLUIDA:
+                _mostrar_falha_tarefa(registro, "Processamento")
+            elif resultado['sucesso']:
+                st.success("Arquivos processados. Verifique os resultados abaixo.")
+                
+                # Popula os dados processados na sessão
+                dados_processados = {}
+                if resultado.get('dados_clinica') is not None:
+                    dados_processados['clinica'] = resultado['dados_clinica']
+                if resultado.get('dados_laboratorio') is not None:
+                    dados_processados['laboratorio'] = resultado['dados_laboratorio']
+                if resultado.get('dados_convenio_detalhado') is not None:
+                    dados_processados['convenio_detalhado'] = resultado['dados_convenio_detalhado']
+                if resultado.get('dados_convenios') is not None:
+                    dados_processados['convenio_ipes'] = resultado['dados_convenios']
+                if resultado.get('dados_mulvi') is not None:
+                    dados_processados['mulvi'] = resultado['dados_mulvi']
+                if resultado.get('dados_getnet') is not None:
+                    dados_processados['credito_getnet'] = resultado['dados_getnet']
+                
+                st.session_state.dados_processados = dados_processados
+                                    
+                st.session_state.conflitos_data = resultado.get('conflitos', {})
+                
+                st.rerun() # Força a re-renderização para mostrar os resultados e a mensagem de conflito
+            else:
+                st.error(f"Erro no processamento: {resultado.get('erro', 'Erro desconhecido')}")
+
+    if tarefa_importacao is not None:
+        registro = _acompanhar_tarefa(tarefa_importacao, "Salvando dados")
+        if registro is not None:
+            resultado_save = tarefas.resultado(registro['id'], entregar=True)
+            del st.session_state.tarefa_importacao
+            if registro['estado'] != tarefas.CONCLUIDA:
+                _mostrar_falha_tarefa(registro, "Importação")
+            elif resultado_save['sucesso']:
+                # O resumo é mostrado depois do rerun que limpa os uploads
+                st.session_state.resumo_importacao = resultado_save
+                st.session_state.pop('dados_processados', None)
+                st.session_state.pop('conflitos_data', None)
+                if 'upload_counter' not in st.session_state:
+                    st.session_state.upload_counter = 0
+                st.session_state.upload_counter += 1
+                st.rerun()
+            else:
+                st.error(f"❌ Erro ao salvar dados: {resultado_save['erro']}")
+
     # Seção de confirmação e salvamento
     if 'dados_processados' in st.session_state:
         st.markdown("---")
@@ -153,74 +288,10 @@ def show():
         # CASO 1: NÃO HÁ CONFLITOS
         if not conflitos:
             st.info("✅ Nenhuma data conflitante encontrada. Você pode realizar a importação.")
-            if st.button("🔴 Realizar Importação", type="primary", use_container_width=True):
-                with st.spinner("Salvando dados..."):
-                    df_clinica = st.session_state.dados_processados.get('clinica')
-                    df_laboratorio = st.session_state.dados_processados.get('laboratorio')
-                    df_convenio_detalhado = st.session_state.dados_processados.get('convenio_detalhado')
-                    df_convenio_ipes = st.session_state.dados_processados.get('convenio_ipes')
-                    df_mulvi = st.session_state.dados_processados.get('mulvi')
-                    df_getnet = st.session_state.dados_processados.get('credito_getnet')
-                    resultado_save = salvar_importacao(df_clinica, df_laboratorio, df_convenio_detalhado,
-                                                       df_convenio_ipes, df_mulvi, df_getnet)
-
-                    if resultado_save['sucesso']:
-                        st.success("✅ Dados importados com sucesso!")
-
-                        # Mostra débitos registrados automaticamente
-                        if resultado_save.get('debitos_registrados', 0) > 0:
-                            st.success(f"💳 {resultado_save['debitos_registrados']} pagamentos em débito foram registrados automaticamente nas contas:")
-                            st.info("• Débito MULVI → Conta BANESE\n• Débito GETNET → Conta SANTANDER")
-                        
-                        # NOVO: Mostra resultado da consolidação IPES
-                        consolidacao_ipes = resultado_save.get('consolidacao_ipes')
-                        if consolidacao_ipes:
-                            if consolidacao_ipes['sucesso']:
-                                st.success(f"🏥 IPES: {consolidacao_ipes['mensagem']}")
-                            else:
-                                st.warning(f"⚠️ IPES: {consolidacao_ipes['mensagem']}")
-                                                
-                        try:
-                            sucesso_recebimentos, msg_recebimentos = atualizar_recebimentos_pendentes()
-                            if sucesso_recebimentos:
-                                st.success(f"💰 Recebimentos: {msg_recebimentos}")
-                            else:
-                                st.warning(f"⚠️ Recebimentos: {msg_recebimentos}")
-                        except Exception as e:
-                            st.warning(f"⚠️ Problema ao atualizar recebimentos: {str(e)}")
-                        
-                        st.markdown("### 📊 Resumo da Importação")
-                        col_res1, col_res2, col_res3, col_res4, col_res5, col_res6 = st.columns(6)
-                        # ... (código das métricas, sem alterações)
-                        with col_res1:
-                            if resultado_save.get('clinica_linhas', 0) > 0:
-                                st.metric("Clínica", f"{resultado_save['clinica_linhas']} registros")
-                        with col_res2:
-                            if resultado_save.get('laboratorio_linhas', 0) > 0:
-                                st.metric("Laboratório", f"{resultado_save['laboratorio_linhas']} registros")
-                        with col_res3:
-                            if resultado_save.get('convenio_detalhado_linhas', 0) > 0:
-                                st.metric("Convênio Detalhado", f"{resultado_save['convenio_detalhado_linhas']} registros")
-                        with col_res4:
-                            if resultado_save.get('ipes_linhas', 0) > 0:
-                                st.metric("Convênio IPES", f"{resultado_save['ipes_linhas']} registros")
-                        with col_res5:
-                            if resultado_save.get('mulvi_linhas', 0) > 0:
-                                st.metric("MULVI", f"{resultado_save['mulvi_linhas']} registros")
-                        with col_res6:
-                            if resultado_save.get('getnet_linhas', 0) > 0:
-                                st.metric("GETNET", f"{resultado_save['getnet_linhas']} registros")
-
-                        del st.session_state.dados_processados
-                        if 'conflitos_data' in st.session_state:
-                            del st.session_state.conflitos_data
-                        if 'upload_counter' not in st.session_state:
-                            st.session_state.upload_counter = 0
-                        st.session_state.upload_counter += 1
-                        st.rerun()
-                        
-                    else:
-                        st.error(f"❌ Erro ao salvar dados: {resultado_save['erro']}")
+            if st.button("🔴 Realizar Importação", type="primary", use_container_width=True,
+                         disabled=tarefa_importacao is not None):
+                st.session_state.tarefa_importacao = submeter_importacao(st.session_state.dados_processados)
+                st.rerun()
         
         # CASO 2: HÁ CONFLITOS (NOVO BLOCO ELSE)
         else:
@@ -4,6 +4,7 @@ from datetime import date, datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from components.gestao_recebimentos import *
 from components.importacao import atualizar_recebimentos_pendentes
+from components import repositorio
 import os
 
 def _sanitize_valores_cols(df: pd.DataFrame, cols: list) -> pd.DataFrame:
@@ -879,32 +880,36 @@ def mostrar_aba_ipes():
             df_recebimentos_agrupado['paciente'].astype(str)
         )
     
-    df_pagamentos = obter_dados_ipes()
-
-    # Etapa 2: Cria coluna indice_paciente para pagamentos IPES
-    if not df_pagamentos.empty:
-        df_pagamentos['data_cadastro'] = pd.to_datetime(df_pagamentos['data_cadastro'], errors='coerce')
-        df_pagamentos['indice_paciente'] = (
-            df_pagamentos['data_cadastro'].dt.strftime('%Y-%m-%d') + '_' + 
-            df_pagamentos['paciente'].astype(str)
-        )
-    
     if df_recebimentos_agrupado.empty:
         st.info("Não há recebimentos pendentes do convênio IPES")
         return
     
-    if df_pagamentos.empty:
+    # Os pagamentos são carregados depois, só para o período filtrado
+    if repositorio.intervalo_datas('data/convenio_ipes.pkl') is None:
         st.warning("Não há pagamentos IPES importados. Importe o relatório IPES primeiro.")
         return
 
     modo_selecionado = st.pills("Selecione o modo de visualização:", ["Individual", "Agrupado"], key="modo_ipes")
 
     if modo_selecionado == "Individual":
-        mostrar_conciliacao_individual_ipes(df_recebimentos_agrupado, df_pagamentos)
+        mostrar_conciliacao_individual_ipes(df_recebimentos_agrupado)
     else:
         mostrar_conciliacao_automatizada_ipes()
 
-def mostrar_conciliacao_individual_ipes(df_recebimentos, df_pagamentos):
+def carregar_pagamentos_ipes(inicio, fim):
+    """Pagamentos IPES pendentes do período, com a coluna indice_paciente."""
+    df_pagamentos = obter_dados_ipes(inicio, fim)
+
+    # Etapa 2: Cria coluna indice_paciente para pagamentos IPES
+    if not df_pagamentos.empty:
+        df_pagamentos['data_cadastro'] = pd.to_datetime(df_pagamentos['data_cadastro'], errors='coerce')
+        df_pagamentos['indice_paciente'] = (
+            df_pagamentos['data_cadastro'].dt.strftime('%Y-%m-%d') + '_' + 
+            df_pagamentos['paciente'].astype(str)
+        )
+    return df_pagamentos
+
+def mostrar_conciliacao_individual_ipes(df_recebimentos):
 
     # --- SEÇÃO DE FILTROS ---
     st.markdown("#### 🔎 Filtros")
@@ -923,6 +928,9 @@ def mostrar_conciliacao_individual_ipes(df_recebimentos, df_pagamentos):
     with col_f3:
         filtro_data_fim = st.date_input("Data Fim:", value=data_max_rec, key="data_fim_ipes")
 
+    # Lê apenas os meses do período selecionado
+    df_pagamentos = carregar_pagamentos_ipes(filtro_data_inicio, filtro_data_fim)
+
     # Aplica filtros
     if filtro_paciente:
         df_recebimentos = df_recebimentos[df_recebimentos['paciente'].str.contains(filtro_paciente, case=False, na=False)]
@@ -934,12 +942,6 @@ def mostrar_conciliacao_individual_ipes(df_recebimentos, df_pagamentos):
         mask_rec = (df_recebimentos['data_cadastro'].dt.date >= filtro_data_inicio) & (df_recebimentos['data_cadastro'].dt.date <= filtro_data_fim)
         df_recebimentos = df_recebimentos[mask_rec]
 
-    # Filtro de data para pagamentos
-    if not df_pagamentos.empty:
-        df_pagamentos['data_cadastro'] = pd.to_datetime(df_pagamentos['data_cadastro'])
-        mask_pag = (df_pagamentos['data_cadastro'].dt.date >= filtro_data_inicio) & (df_pagamentos['data_cadastro'].dt.date <= filtro_data_fim)
-        df_pagamentos = df_pagamentos[mask_pag]
-
     if df_recebimentos.empty:
         st.warning("Nenhum recebimento pendente encontrado com os filtros aplicados.")
     
@@ -1116,11 +1118,11 @@ def mostrar_conciliacao_automatizada_ipes():
         # Usa dados consolidados ao invés de convenio_detalhado.pkl
         df_sistema = obter_recebimentos_ipes()  # Dados consolidados pendentes
         
-        if not os.path.exists('data/convenio_ipes.pkl'):
+        if not repositorio.existe('data/convenio_ipes.pkl'):
             st.warning("Arquivo convenio_ipes.pkl não encontrado. Importe relatório IPES primeiro.")
             return
         import pandas as pd
-        df_ipes = pd.read_pickle('data/convenio_ipes.pkl')
+        df_ipes = repositorio.ler_tabela('data/convenio_ipes.pkl')
         
     except Exception as e:
         st.error(f"Erro ao carregar arquivos: {e}")
@@ -1468,8 +1470,8 @@ def mostrar_detalhamento_convenios(rec_selecionados, pag_selecionados_agrupados)
     
     # Carrega dados detalhados do IPES (convenio_ipes.pkl)
     try:
-        if os.path.exists('data/convenio_ipes.pkl'):
-            df_ipes = pd.read_pickle('data/convenio_ipes.pkl')
+        if repositorio.existe('data/convenio_ipes.pkl'):
+            df_ipes = repositorio.ler_tabela('data/convenio_ipes.pkl')
             if 'indice_paciente' in df_ipes.columns:
                 df_ipes_filtrado = df_ipes[df_ipes['indice_paciente'].isin(indices_paciente_pag)].copy()
             else:
@@ -1707,7 +1709,7 @@ def salvar_inconsistencias_ipes_exportar(selecionados, rec_selecionados):
         
         if os.path.exists(caminho_arquivo):
             try:
-                df_existente = pd.read_pickle(caminho_arquivo)
+                df_existente = repositorio.ler_tabela(caminho_arquivo)
                 df_final = pd.concat([df_existente, df_novos], ignore_index=True)
             except Exception:
                 df_final = df_novos
@@ -1715,7 +1717,7 @@ def salvar_inconsistencias_ipes_exportar(selecionados, rec_selecionados):
             df_final = df_novos
         
         os.makedirs('data', exist_ok=True)
-        df_final.to_pickle(caminho_arquivo)
+        repositorio.salvar_tabela(df_final, caminho_arquivo)
         
         return True, f"{len(df_novos)} inconsistência(s) registradas em inconsistencias_ipes.pkl"
         
@@ -1769,7 +1771,7 @@ def salvar_inconsistencias_automatizada(selecionados):
         
         if os.path.exists(caminho_arquivo):
             try:
-                df_existente = pd.read_pickle(caminho_arquivo)
+                df_existente = repositorio.ler_tabela(caminho_arquivo)
                 # Concatena dados novos com existentes
                 df_final = pd.concat([df_existente, df_novos], ignore_index=True)
             except Exception:
@@ -1780,7 +1782,7 @@ def salvar_inconsistencias_automatizada(selecionados):
         
         # Salva o arquivo
         os.makedirs('data', exist_ok=True)
-        df_final.to_pickle(caminho_arquivo)
+        repositorio.salvar_tabela(df_final, caminho_arquivo)
         
         return True, f"{len(selecionados)} inconsistências registradas automaticamente (dados consolidados)"
         
@@ -1866,7 +1868,7 @@ def salvar_inconsistencias_automatizada_v2(selecionados):
         
         if os.path.exists(caminho_arquivo):
             try:
-                df_existente = pd.read_pickle(caminho_arquivo)
+                df_existente = repositorio.ler_tabela(caminho_arquivo)
                 df_final = pd.concat([df_existente, df_novos], ignore_index=True)
             except Exception:
                 df_final = df_novos
@@ -1874,7 +1876,7 @@ def salvar_inconsistencias_automatizada_v2(selecionados):
             df_final = df_novos
         
         os.makedirs('data', exist_ok=True)
-        df_final.to_pickle(caminho_arquivo)
+        repositorio.salvar_tabela(df_final, caminho_arquivo)
         
         return True, f"{len(df_novos)} inconsistência(s) registradas em inconsistencias_ipes.pkl"
         
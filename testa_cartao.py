@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 import re
 from datetime import datetime
+from components import planilhas
 
 # Colunas alvo (nomes canônicos esperados)
 COLS_DETALHADO_ORIGINAIS = [
@@ -39,16 +40,13 @@ def _converter_moeda_serie(s: pd.Series) -> pd.Series:
 def _detectar_linha_cabecalho(df_raw: pd.DataFrame, cols_alvo_upper:set):
     """
     Heurística: escolhe a linha que contém o MAIOR número de matches com os nomes alvo.
+    Só as primeiras planilhas.LINHAS_DETECCAO linhas são examinadas.
     """
-    melhor_idx = None
-    melhor_score = -1
-    for i, row in df_raw.iterrows():
-        valores = [_clean_text(x) for x in row.tolist()]
-        score = sum(1 for v in valores if v in cols_alvo_upper)
-        if score > melhor_score:
-            melhor_score = score
-            melhor_idx = i
-    return melhor_idx, melhor_score
+    inicio = df_raw.head(planilhas.LINHAS_DETECCAO)
+    linhas = (tuple(None if pd.isna(v) else v for v in linha)
+              for linha in inicio.itertuples(index=False, name=None))
+    posicao, score = planilhas.escolher_cabecalho(linhas, cols_alvo_upper)
+    return (inicio.index[posicao] if posicao is not None else None), score
 
 def processar_cartao_detalhado(arquivo, debug=False):
     """
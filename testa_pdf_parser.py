@@ -0,0 +1,155 @@
+"""
+Benchmark de components.pdf_parser.parse_row_buffer contra a implementação
+anterior (várias buscas de regex por linha), no mesmo corpus de buffers de
+linha do PDF IPES.
+
+O corpus é sintético (formatos de valor misturados, incluindo "R" e "$"
+separados) ou vem das linhas reais de um PDF, repetidas para medir melhor.
+Divergência é qualquer buffer em que os dois parsers devolvem campos diferentes.
+
+Uso:
+    python testa_pdf_parser.py [linhas | arquivo.pdf [repetições]]
+"""
+import re
+import sys
+import time
+import random
+from components import pdf_parser
+
+
+# ========== PARSER ANTIGO (referência) ==========
+
+def _antigo_parse_row_buffer(buf: str):
+    """parse_row_buffer anterior, com várias buscas de regex por linha."""
+    s = re.sub(r"\s+", " ", buf).strip() if buf else ""
+
+    # 1) Extrai seq, tabela, procedimento_codigo do início
+    m_inicio = re.match(r'^\s*(\d+)\s+(\d{2})\s+(\d{8})', s)
+    if not m_inicio:
+        return None
+    
+    seq = int(m_inicio.group(1))
+    tabela = m_inicio.group(2)
+    proc_cod = m_inicio.group(3)
+    
+    # 2) Tenta extrair valor normal primeiro (R$ junto)
+    m_valor = re.search(r'R\$\s*([\d\.,]+)', s)
+    if m_valor:
+        valor = float(m_valor.group(1).replace(".", "").replace(",", "."))
+        return {
+            "seq": seq,
+            "tabela": tabela,
+            "procedimento_codigo": proc_cod,
+            "valor_exec": valor,
+        }
+    
+    # 3) Se não achou "R$", procura por "$" isolado e reconstrói o valor
+    m_cifrao = re.search(r'\$', s)
+    if m_cifrao:
+        # Pega tudo após o "$"
+        parte_pos_cifrao = s[m_cifrao.end():]
+        
+        # Primeiro tenta encontrar vírgula e pegar números ao redor
+        if ',' in parte_pos_cifrao:
+            # Tem vírgula - pega números antes e depois da primeira vírgula
+            pos_virgula = parte_pos_cifrao.find(',')
+            antes_virgula = parte_pos_cifrao[:pos_virgula]
+            depois_virgula = parte_pos_cifrao[pos_virgula+1:]
+            
+            nums_antes = re.findall(r'(\d)', antes_virgula)
+            nums_depois = re.findall(r'(\d)', depois_virgula)
+            
+            if nums_antes and nums_depois:
+                # Junta números antes e depois da vírgula
+                parte_inteira = ''.join(nums_antes)
+                parte_decimal = ''.join(nums_depois[:2])  # máximo 2 casas decimais
+                valor_str = f"{parte_inteira},{parte_decimal}"
+                valor = float(valor_str.replace(",", "."))
+            else:
+                return None
+        else:
+            # Sem vírgula - pega todos os números e assume últimos 2 são centavos
+            nums = re.findall(r'(\d)', parte_pos_cifrao)
+            
+            if len(nums) >= 2:
+                # Assume que os últimos 2 dígitos são centavos
+                parte_inteira = ''.join(nums[:-2]) if len(nums) > 2 else '0'
+                parte_decimal = ''.join(nums[-2:])
+                valor_str = f"{parte_inteira},{parte_decimal}"
+                valor = float(valor_str.replace(",", "."))
+            elif len(nums) == 1:
+                # Apenas um número, assume centavos
+                valor = float("0.0" + nums[0])
+            else:
+                return None
+        
+        return {
+            "seq": seq,
+            "tabela": tabela,
+            "procedimento_codigo": proc_cod,
+            "valor_exec": valor,
+        }
+    
+    # Se não encontrou nem "R$" nem "$", falha
+    return None
+
+
+# ========== AMOSTRA ==========
+
+def _corpus_linhas(linhas):
+    """Buffers de linha no formato do PDF IPES, incluindo os casos com "$" separado."""
+    gerador = random.Random(0)
+    corpus = []
+    for i in range(linhas):
+        seq, tabela, codigo = i % 40 + 1, gerador.choice(['22', '98', '00']), f"{gerador.randrange(10**7, 10**8)}"
+        reais, centavos = gerador.randrange(0, 5000), gerador.randrange(0, 100)
+        descricao = f"{codigo[:4]} - HEMOGRAMA COMPLETO - Laboratório 1 UN"
+        formato = gerador.randrange(10)
+        if formato < 7:
+            valor = f"R$ {reais:,}".replace(',', '.') + f",{centavos:02d}"
+        elif formato == 7:
+            valor = f"R $ {reais} ,{centavos:02d}"
+        elif formato == 8:
+            valor = f"$ {' '.join(str(reais))} {centavos:02d}"
+        else:
+            valor = "$"
+        corpus.append(f"{seq} {tabela} {codigo} - {descricao} {valor}")
+    return corpus
+
+
+def _corpus_pdf(pdf_path):
+    """Buffers reais (linhas extraídas e falhas) de um PDF IPES."""
+    df, df_falhas = pdf_parser.parse_paginas_como_tabela(pdf_parser.textos_paginas(pdf_path))
+    corpus = list(df['_linha']) if '_linha' in df.columns else []
+    if 'linha' in df_falhas.columns:
+        corpus += list(df_falhas['linha'])
+    return corpus
+
+
+# ========== COMPARAÇÃO ==========
+
+def benchmark(linhas=100_000, pdf_path=None, repeticoes=1):
+    """Tempo dos dois parsers no mesmo corpus e quantidade de buffers divergentes."""
+    corpus = _corpus_pdf(pdf_path) * repeticoes if pdf_path else _corpus_linhas(linhas)
+
+    inicio = time.perf_counter()
+    antigo = [_antigo_parse_row_buffer(b) for b in corpus]
+    tempo_antigo = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    novo = [pdf_parser.parse_row_buffer(b, normalizado=True) for b in corpus]
+    tempo_novo = time.perf_counter() - inicio
+
+    return {'linhas': len(corpus), 'anterior_s': tempo_antigo, 'novo_s': tempo_novo,
+            'aceleracao': tempo_antigo / tempo_novo if tempo_novo else float('inf'),
+            'divergencias': sum(1 for a, b in zip(antigo, novo) if a != b)}
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    if argumentos and argumentos[0].lower().endswith('.pdf'):
+        r = benchmark(pdf_path=argumentos[0], repeticoes=int(argumentos[1]) if len(argumentos) > 1 else 20)
+    else:
+        r = benchmark(int(argumentos[0]) if argumentos else 100_000)
+    print(f"{r['linhas']} buffers: anterior {r['anterior_s']:.3f}s, novo {r['novo_s']:.3f}s "
+          f"({r['aceleracao']:.1f}x), divergências: {r['divergencias']}")
@@ -0,0 +1,83 @@
+"""
+Confere o leitor em blocos de components.planilhas com as planilhas de exemplo
+do repositório.
+
+Para cada amostra, a leitura em blocos tem de sair igual ao pd.read_excel com o
+mesmo cabeçalho (valores, tipos, nomes de colunas e índice). Depois, os
+importadores GETNET e convênio processam as mesmas planilhas e precisam devolver
+linhas.
+
+Uso:
+    python testa_planilhas.py
+"""
+import io
+import os
+import sys
+import tempfile
+import pandas as pd
+from components import planilhas
+
+AMOSTRA_GETNET = 'CVS_010856404_20250908_20250912_00000000023420558.xlsx'
+AMOSTRA_CONVENIO = 'relConvDetalhadoPorLinha_17_09_2025.xlsx'
+
+# (arquivo, opções de planilhas.ler_excel, opções equivalentes do pd.read_excel)
+LEITURAS = [
+    (AMOSTRA_GETNET, {'cabecalho': 7, 'aba': 'ANALITICO'},
+     {'header': 7, 'sheet_name': 'ANALITICO'}),
+    (AMOSTRA_GETNET, {'cabecalho': 7, 'aba': 'ANALITICO', 'como_texto': True},
+     {'header': 7, 'sheet_name': 'ANALITICO', 'dtype': str}),
+    (AMOSTRA_CONVENIO, {'cabecalho': 5}, {'header': 5}),
+]
+
+
+class Upload(io.BytesIO):
+    """Arquivo como o st.file_uploader entrega (bytes + nome)."""
+
+    def __init__(self, caminho):
+        with open(caminho, 'rb') as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(caminho)
+
+
+def conferir_leituras():
+    falhas = 0
+    for arquivo, opcoes, opcoes_pandas in LEITURAS:
+        esperado = pd.read_excel(arquivo, **opcoes_pandas)
+        lido = planilhas.ler_excel(arquivo, **opcoes)
+        try:
+            pd.testing.assert_frame_equal(lido, esperado)
+            print(f"ok     {arquivo} {opcoes}: {len(lido)} linhas, {len(lido.columns)} colunas")
+        except AssertionError as e:
+            falhas += 1
+            print(f"FALHOU {arquivo} {opcoes}:\n{e}")
+    return falhas
+
+
+def conferir_importadores():
+    from components import importacao
+
+    falhas = 0
+    df, mensagem = importacao.processar_cartao_detalhado_getnet(Upload(AMOSTRA_GETNET))
+    if df is None or df.empty:
+        falhas += 1
+        print(f"FALHOU GETNET: {mensagem}")
+    else:
+        print(f"ok     GETNET: {mensagem} Primeiro id: {df['id_unico'].iloc[0]}")
+
+    try:
+        df = importacao.processar_convenios_detalhados(Upload(AMOSTRA_CONVENIO))
+        if df.empty:
+            raise Exception("nenhuma linha IPES")
+        print(f"ok     convênio: {len(df)} linhas IPES. Primeiro id: {df['id_unico'].iloc[0]}")
+    except Exception as e:
+        falhas += 1
+        print(f"FALHOU convênio: {e}")
+    return falhas
+
+
+if __name__ == "__main__":
+    # Os cabeçalhos reconhecidos aqui não entram no cache de layouts do app
+    with tempfile.TemporaryDirectory() as pasta:
+        planilhas.CAMINHO_LAYOUTS = os.path.join(pasta, 'layouts_planilhas.json')
+        falhas = conferir_leituras() + conferir_importadores()
+    sys.exit(1 if falhas else 0)
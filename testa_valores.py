@@ -0,0 +1,172 @@
+"""
+Benchmark e comparação do conversor de components.valores com os conversores
+linha a linha que cada importador usava antes dele.
+
+Cada fonte é comparada com o seu conversor antigo na mesma amostra sintética
+(formatos misturados), e as divergências são separadas por formato do texto,
+para mostrar o que mudou de propósito em cada importador.
+
+Uso:
+    python testa_valores.py [linhas] [--distintos N]
+
+--distintos sorteia as linhas entre N valores diferentes, como nas planilhas
+reais, em que os mesmos preços se repetem (padrão: todos diferentes).
+"""
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+from components import valores
+
+
+# ========== CONVERSORES ANTIGOS (referência) ==========
+
+def _antigo_clinica(valor):
+    """processar_movimento_clinica: remove todos os pontos e troca a vírgula."""
+    if pd.isna(valor) or valor == '':
+        return 0.0
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    valor_str = str(valor).replace('R$', '').strip().replace('.', '').replace(',', '.')
+    try:
+        return float(valor_str)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _antigo_laboratorio(valor):
+    """processar_movimento_laboratorio: formato 'R$ 37,60', sem separador de milhar."""
+    if pd.isna(valor) or valor == '':
+        return 0.0
+    valor_limpo = re.sub(r'[R$\s]', '', str(valor)).replace(',', '.')
+    try:
+        return float(valor_limpo)
+    except ValueError:
+        return 0.0
+
+
+def _antigo_convenio(valor):
+    """processar_convenios_detalhados: separadores pela posição, sem tratar 'R$'."""
+    if pd.isna(valor) or valor == '':
+        return 0.0
+    valor_str = str(valor)
+    try:
+        if ',' not in valor_str and '.' not in valor_str:
+            return float(valor_str)
+        elif ',' in valor_str and '.' not in valor_str:
+            return float(valor_str.replace(',', '.'))
+        elif '.' in valor_str and ',' not in valor_str:
+            return float(valor_str)
+        elif valor_str.rfind(',') > valor_str.rfind('.'):
+            return float(valor_str.replace('.', '').replace(',', '.'))
+        else:
+            return float(valor_str.replace(',', ''))
+    except ValueError:
+        return 0.0
+
+
+def _antigo_cartao(serie):
+    """MULVI e GETNET: cadeia de str.replace e pd.to_numeric (inválidos viram NaN)."""
+    serie = (serie.astype(str)
+             .str.replace('R$', '', regex=False)
+             .str.replace(' ', '', regex=False)
+             .str.replace(',', '.', regex=False)
+             .replace('nan', pd.NA))
+    return pd.to_numeric(serie, errors='coerce')
+
+
+# Fonte -> (conversor antigo, aplicado por linha?, padrão dos inválidos no novo)
+FONTES = {
+    'clinica': (_antigo_clinica, True, 0.0),
+    'laboratorio': (_antigo_laboratorio, True, 0.0),
+    'convenio': (_antigo_convenio, True, 0.0),
+    'cartao': (_antigo_cartao, False, np.nan),
+}
+
+
+# ========== AMOSTRA ==========
+
+FORMATOS = ['R$ 1.234,56', '1.234,56', '1,234.56', '-', 'número', '37,60', '37.60', 'vazio']
+
+
+def amostra(linhas, distintos=None):
+    """(valores, formato de cada linha); com `distintos`, sorteados entre N valores."""
+    gerador = np.random.default_rng(0)
+    base = distintos or linhas
+    centavos_base = gerador.integers(-100_000_00, 100_000_00, base)
+    formatos = gerador.integers(0, len(FORMATOS), base)
+    textos = []
+    for c, f in zip(centavos_base, formatos):
+        sinal = '-' if c < 0 else ''
+        inteiro, dec = divmod(abs(int(c)), 100)
+        milhar = f"{inteiro:,}"
+        if f == 0:
+            textos.append(f"{sinal}R$ {milhar.replace(',', '.')},{dec:02d}")
+        elif f == 1:
+            textos.append(f"{sinal}{milhar.replace(',', '.')},{dec:02d}")
+        elif f == 2:
+            textos.append(f"{sinal}{milhar}.{dec:02d}")
+        elif f == 3:
+            textos.append('-')
+        elif f == 4:
+            textos.append(c / 100)
+        elif f == 5:
+            textos.append(f"{sinal}{inteiro},{dec:02d}")
+        elif f == 6:
+            textos.append(f"{sinal}{inteiro}.{dec:02d}")
+        else:
+            textos.append(None)
+    escolha = gerador.integers(0, base, linhas) if distintos else np.arange(linhas)
+    return (pd.Series(np.array(textos, dtype=object)[escolha], dtype=object),
+            pd.Series(formatos[escolha]))
+
+
+# ========== COMPARAÇÃO ==========
+
+def _iguais(antigo, novo):
+    a = np.round(antigo.to_numpy(dtype='float64') * 100)
+    b = np.round(novo.to_numpy(dtype='float64') * 100)
+    return (a == b) | (np.isnan(a) & np.isnan(b))
+
+
+def comparar(linhas=100_000, distintos=None):
+    """Tempo e divergências por fonte, com as divergências contadas por formato."""
+    serie, formatos = amostra(linhas, distintos)
+    resultados = {}
+    for fonte, (conversor, por_linha, padrao) in FONTES.items():
+        inicio = time.perf_counter()
+        antigo = serie.apply(conversor) if por_linha else conversor(serie)
+        tempo_antigo = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        novo = valores.reais(serie, padrao=padrao)
+        tempo_novo = time.perf_counter() - inicio
+
+        diferentes = ~_iguais(antigo, novo)
+        por_formato = {}
+        for f in np.unique(formatos[diferentes]):
+            posicoes = np.flatnonzero(diferentes & (formatos == f).to_numpy())
+            exemplo = posicoes[0]
+            por_formato[FORMATOS[f]] = (len(posicoes), serie.iloc[exemplo],
+                                        antigo.iloc[exemplo], novo.iloc[exemplo])
+        resultados[fonte] = {'antigo_s': tempo_antigo, 'novo_s': tempo_novo,
+                             'divergencias': int(diferentes.sum()), 'por_formato': por_formato}
+    return resultados
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    distintos = None
+    if '--distintos' in argumentos:
+        i = argumentos.index('--distintos')
+        distintos = int(argumentos[i + 1])
+        del argumentos[i:i + 2]
+    linhas = int(argumentos[0]) if argumentos else 100_000
+
+    print(f"{linhas} linhas" + (f", {distintos} valores distintos" if distintos else ""))
+    for fonte, r in comparar(linhas, distintos).items():
+        print(f"{fonte:<12} antigo {r['antigo_s']:.3f}s, novo {r['novo_s']:.3f}s "
+              f"({r['antigo_s'] / r['novo_s']:.1f}x), divergências: {r['divergencias']}")
+        for formato, (quantidade, texto, antigo, novo) in r['por_formato'].items():
+            print(f"    {formato:<12} {quantidade:>7}  ex.: {texto!r}: {antigo} -> {novo}")